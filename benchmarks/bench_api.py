@@ -0,0 +1,349 @@
+"""Load and latency baseline for the whole API, as JSON to diff between releases.
+
+Boots main:app in-process behind httpx's ASGI transport, against a database
+filled with synthetic users and contacts, with fakeredis standing in for
+Redis. Each scenario drives one route with ``--requests`` calls and
+``--concurrency`` in flight, after ``--warmup`` unmeasured calls, and reports
+throughput and p50/p95/p99 latency. Rate limiting is switched off and avatars
+go to a temporary LocalStorage.
+
+    python benchmarks/bench_api.py --users 100 --contacts 1000000 --concurrency 32 --output before.json
+
+On SQLite the schema is created by the script. On Postgres run ``alembic upgrade head``
+first; the generated rows are removed afterwards. The same ``--seed`` produces
+the same data and the same request sequence.
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import fakeredis  # noqa: E402
+import httpx  # noqa: E402
+from PIL import Image  # noqa: E402
+from sqlalchemy import delete, insert, select, update  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  # noqa: E402
+
+from main import app  # noqa: E402
+from src.database.db import get_db  # noqa: E402
+from src.database.models import Base, Contact, EmailOutbox, User, birthday_md  # noqa: E402
+from src.routes import users as users_routes  # noqa: E402
+from src.services.auth import auth_service  # noqa: E402
+from src.services.autocomplete import autocomplete_service  # noqa: E402
+from src.services.avatar_cache import AvatarCache  # noqa: E402
+from src.services.password_hasher import PasswordHasher  # noqa: E402
+from src.services.rate_limit import rate_limiter  # noqa: E402
+from src.services.token_cache import token_cache  # noqa: E402
+from src.services.upload_avatar import LocalStorage, UploadService  # noqa: E402
+from src.services.user_cache import user_cache_service  # noqa: E402
+
+PASSWORD = "bench-pass"
+FIRST_NAMES = ["John", "Anna", "Peter", "Maria", "Oleksandr", "Iryna", "Michael", "Sofia", "Andrii", "Kateryna"]
+LAST_NAMES = ["Smith", "Johnson", "Shevchenko", "Kovalenko", "Bondarenko", "Williams", "Brown", "Melnyk"]
+
+
+def jpeg(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.radial_gradient("L").resize((width, height)).convert("RGB").save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+@dataclass
+class Owner:
+    id: int
+    email: str
+    headers: dict
+    contact_ids: List[int]
+
+
+class Context:
+    """Seeded data plus a deterministic source of request parameters."""
+
+    def __init__(self, owners: List[Owner], seed: int, avatar: bytes):
+        self.owners = owners
+        self.rnd = random.Random(seed)
+        self.avatar = avatar
+        self.counter = 0
+
+    def owner(self) -> Owner:
+        return self.rnd.choice(self.owners)
+
+    def unique(self) -> int:
+        self.counter += 1
+        return self.counter
+
+    def take_contact(self, owner: Owner) -> int:
+        # deleted contacts are not handed out again
+        return owner.contact_ids.pop(self.rnd.randrange(len(owner.contact_ids)))
+
+
+Request = Tuple[str, str, dict, Tuple[int, ...]]
+
+
+def login(ctx: Context) -> Request:
+    return "POST", "/auth/login", {"data": {"username": ctx.owner().email, "password": PASSWORD}}, (200,)
+
+
+def signup(ctx: Context) -> Request:
+    n = ctx.unique()
+    return "POST", "/auth/signup", {"json": {"username": f"signup{n:06d}", "email": f"signup{n}@example.com",
+                                             "password": PASSWORD}}, (201,)
+
+
+def list_contacts(ctx: Context) -> Request:
+    return "GET", "/contacts/", {"params": {"limit": 100}, "headers": ctx.owner().headers}, (200,)
+
+
+def read_contact(ctx: Context) -> Request:
+    owner = ctx.owner()
+    return "GET", f"/contacts/{ctx.rnd.choice(owner.contact_ids)}", {"headers": owner.headers}, (200,)
+
+
+def create_contact(ctx: Context) -> Request:
+    n = ctx.unique()
+    body = {"first_name": f"New{n}", "last_name": "Contact", "email": f"new{n}@example.com", "phone": "0670000000"}
+    return "POST", "/contacts/", {"json": body, "headers": ctx.owner().headers}, (200,)
+
+
+def upsert_contact(ctx: Context) -> Request:
+    body = {"first_name": "Upsert", "last_name": "Contact", "email": f"upsert{ctx.rnd.randrange(100)}@example.com",
+            "notes": f"note {ctx.unique()}"}
+    return "PUT", "/contacts/upsert", {"json": body, "headers": ctx.owner().headers}, (200, 201)
+
+
+def update_contact(ctx: Context) -> Request:
+    owner = ctx.owner()
+    contact_id = ctx.rnd.choice(owner.contact_ids)
+    body = {"id": contact_id, "first_name": "Updated", "last_name": "Contact", "notes": f"note {ctx.unique()}"}
+    return "PUT", f"/contacts/{contact_id}", {"json": body, "headers": owner.headers}, (200,)
+
+
+def delete_contact(ctx: Context) -> Request:
+    owner = ctx.owner()
+    return "DELETE", f"/contacts/{ctx.take_contact(owner)}", {"headers": owner.headers}, (200,)
+
+
+def birthdays(ctx: Context) -> Request:
+    return "GET", f"/contacts/birthdays/{ctx.rnd.choice([7, 30])}", {"headers": ctx.owner().headers}, (200, 404)
+
+
+def search(ctx: Context) -> Request:
+    query = ctx.rnd.choice(FIRST_NAMES + LAST_NAMES)[:ctx.rnd.randrange(3, 6)].lower()
+    return "GET", "/contacts/search", {"params": {"search": query}, "headers": ctx.owner().headers}, (200,)
+
+
+def autocomplete(ctx: Context) -> Request:
+    query = ctx.rnd.choice(FIRST_NAMES)[:2].lower()
+    return "GET", "/contacts/autocomplete", {"params": {"q": query}, "headers": ctx.owner().headers}, (200,)
+
+
+def read_avatar(ctx: Context) -> Request:
+    return "GET", f"/api/users/{ctx.owner().id}/avatar", {"params": {"size": ctx.rnd.choice([32, 64, 128])}}, (200,)
+
+
+def upload_avatar(ctx: Context) -> Request:
+    files = {"file": ("avatar.jpg", ctx.avatar, "image/jpeg")}
+    return "PATCH", "/api/users/avatar", {"files": files, "headers": ctx.owner().headers}, (200,)
+
+
+# run in this order: writes come last so reads see the seeded data
+SCENARIOS: Dict[str, Callable[[Context], Request]] = {
+    "auth:login": login,
+    "auth:signup": signup,
+    "contacts:list": list_contacts,
+    "contacts:read": read_contact,
+    "contacts:search": search,
+    "contacts:autocomplete": autocomplete,
+    "contacts:birthdays": birthdays,
+    "users:avatar": read_avatar,
+    "contacts:create": create_contact,
+    "contacts:upsert": upsert_contact,
+    "contacts:update": update_contact,
+    "contacts:delete": delete_contact,
+    "users:avatar_upload": upload_avatar,
+}
+
+
+def summarize(latencies: List[float], statuses: Dict[int, int], errors: int, elapsed: float) -> dict:
+    samples = sorted(latencies)
+
+    def pct(q: float) -> float:
+        return round(samples[min(len(samples) - 1, int(len(samples) * q))] * 1000, 2)
+
+    return {
+        "requests": len(samples), "errors": errors, "statuses": statuses, "seconds": round(elapsed, 3),
+        "rps": round(len(samples) / elapsed, 1),
+        "p50_ms": round(statistics.median(samples) * 1000, 2), "p95_ms": pct(0.95), "p99_ms": pct(0.99),
+        "max_ms": round(samples[-1] * 1000, 2),
+    }
+
+
+async def drive(client: httpx.AsyncClient, ctx: Context, scenario: Callable, requests: int,
+                concurrency: int) -> dict:
+    latencies, statuses, errors = [], {}, 0
+    pending = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in pending:
+            method, url, kwargs, expected = scenario(ctx)
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            errors += response.status_code not in expected
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, statuses, errors, time.perf_counter() - start)
+
+
+async def seed(session_local, users: int, contacts: int, rnd: random.Random, avatar_url: str) -> List[Owner]:
+    password = await auth_service.get_password_hash(PASSWORD)
+    async with session_local() as db:
+        await db.execute(insert(User), [{"username": f"bench_user{i}", "email": f"bench{i}@example.com",
+                                         "password": password, "confirmed": True, "avatar": avatar_url}
+                                        for i in range(users)])
+        rows = (await db.execute(select(User.id, User.email).filter(User.username.like("bench_user%"))
+                                 .order_by(User.id))).all()
+        owners = [Owner(row.id, row.email, {"Authorization": "Bearer " + await auth_service.create_access_token(
+            data={"sub": row.email}, expires_delta=24 * 3600)}, []) for row in rows]
+        batch = []
+        for i in range(contacts):
+            first, last = rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES)
+            birthday = date(rnd.randrange(1950, 2010), rnd.randrange(1, 13), rnd.randrange(1, 29))
+            batch.append({"first_name": f"{first}{i % 97 or ''}", "last_name": last, "owner_id": owners[i % users].id,
+                          "email": f"{first.lower()}.{last.lower()}{i}@example.com",
+                          "phone": f"067{rnd.randrange(10 ** 7):07d}", "birthday": birthday,
+                          "birthday_md": birthday_md(birthday)})
+            if len(batch) == 5000 or i == contacts - 1:
+                await db.execute(insert(Contact), batch)
+                batch = []
+        for owner in owners:
+            owner.contact_ids = list((await db.scalars(select(Contact.id).filter(Contact.owner_id == owner.id))).all())
+            await db.execute(update(User).filter(User.id == owner.id).values(contacts_count=len(owner.contact_ids)))
+        await db.commit()
+    return owners
+
+
+async def cleanup(session_local):
+    async with session_local() as db:
+        bench_users = select(User.id).filter(User.username.like("bench_user%") | User.username.like("signup%"))
+        await db.execute(delete(Contact).filter(Contact.owner_id.in_(bench_users)))
+        await db.execute(delete(EmailOutbox).filter(EmailOutbox.recipient.in_(
+            select(User.email).filter(User.id.in_(bench_users)))))
+        await db.execute(delete(User).filter(User.id.in_(bench_users)))
+        await db.commit()
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent).stdout.strip()
+    except OSError:
+        return ""
+
+
+async def run(args) -> dict:
+    engine = create_async_engine(args.url)
+    session_local = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    sqlite = engine.dialect.name == "sqlite"
+    if sqlite:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+    async def override_get_db():
+        async with session_local() as db:
+            yield db
+
+    redis = fakeredis.FakeAsyncRedis()
+    user_cache_service.r = token_cache.r = rate_limiter.r = redis
+    rate_limiter.enabled = False
+    auth_service.hasher = PasswordHasher(args.rounds, args.workers, args.queue)
+    app.dependency_overrides[get_db] = override_get_db
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        storage = LocalStorage(f"{workdir}/avatars", "/media/avatars")
+        UploadService.storage = storage
+        users_routes.avatar_cache = AvatarCache(f"{workdir}/cache", 256 * 1024 * 1024)
+        storage.path("bench").parent.mkdir(parents=True)
+        storage.path("bench").write_bytes(jpeg(1024, 1024))
+
+        rnd = random.Random(args.seed)
+        start = time.perf_counter()
+        owners = await seed(session_local, args.users, args.contacts, rnd, "/media/avatars/bench.jpg")
+        seed_seconds = time.perf_counter() - start
+        ctx = Context(owners, args.seed, jpeg(800, 600))
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            for name, scenario in SCENARIOS.items():
+                if args.scenarios and name not in args.scenarios:
+                    continue
+                if args.warmup:
+                    await drive(client, ctx, scenario, args.warmup, args.concurrency)
+                results[name] = await drive(client, ctx, scenario, args.requests, args.concurrency)
+                logging.info("%s: %s", name, results[name])
+
+    app.dependency_overrides.pop(get_db)
+    auth_service.hasher.shutdown()
+    autocomplete_service.clear()
+    if sqlite:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+    else:
+        await cleanup(session_local)
+    await engine.dispose()
+    await redis.close()
+    return {
+        "meta": {"revision": git_revision(), "python": platform.python_version(), "dialect": engine.dialect.name,
+                 "users": args.users, "contacts": args.contacts, "requests": args.requests,
+                 "concurrency": args.concurrency, "warmup": args.warmup, "bcrypt_rounds": args.rounds,
+                 "seed": args.seed, "seed_seconds": round(seed_seconds, 1)},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="sqlite+aiosqlite:///./bench.db")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--contacts", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), help="default: all of them")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format="%(message)s")
+    logging.getLogger("src").setLevel(logging.ERROR)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    report = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.output:
+        Path(args.output).write_text(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
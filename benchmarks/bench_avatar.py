@@ -0,0 +1,86 @@
+"""Avatar pipeline: bytes sent to storage and event-loop stalls while processing.
+
+"inline" processes on the event loop, which is what running cloudinary.uploader
+directly in the route amounted to. "executor" goes through
+UploadService.upload_avatar into a LocalStorage. Meanwhile a ticker measures how
+late a 5 ms sleep wakes up.
+
+    python benchmarks/bench_avatar.py --width 4000 --height 3000 --uploads 10
+"""
+import argparse
+import asyncio
+import io
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from PIL import Image  # noqa: E402
+
+from src.services.upload_avatar import LocalStorage, UploadService, process_avatar  # noqa: E402
+
+
+class Upload:
+    def __init__(self, data: bytes):
+        self.file = io.BytesIO(data)
+
+
+def photo(width: int, height: int) -> bytes:
+    # gradients plus sensor-like noise land near a real photo's size (3-5 MB at 12 MP)
+    gradient = Image.radial_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 24)
+    image = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.FLIP_LEFT_RIGHT)))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+async def measure(mode: str, data: bytes, uploads: int, root: str) -> dict:
+    lags, done = [], asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - start - 0.005)
+
+    UploadService.storage = LocalStorage(root, "/media/avatars")
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    sizes = []
+    for i in range(uploads):
+        if mode == "inline":
+            with tempfile.TemporaryDirectory() as workdir:
+                sizes.append(process_avatar(io.BytesIO(data), Path(workdir), 250, len(data)).stat().st_size)
+                await asyncio.sleep(0)
+        else:
+            await UploadService.upload_avatar(Upload(data), f"bench{i}@example.com")
+            sizes.append(max(p.stat().st_size for p in Path(root).rglob("*.jpg")))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await tick
+    return {"ms_per_upload": round(elapsed / uploads * 1000, 1), "bytes_stored": sizes[-1],
+            "max_loop_stall_ms": round(max(lags) * 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--uploads", type=int, default=5)
+    args = parser.parse_args()
+
+    data = photo(args.width, args.height)
+    results = {}
+    for mode in ("inline", "executor"):
+        with tempfile.TemporaryDirectory() as root:
+            results[mode] = asyncio.run(measure(mode, data, args.uploads, root))
+    print(json.dumps({"original_bytes": len(data), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
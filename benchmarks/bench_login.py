@@ -0,0 +1,131 @@
+"""Login latency under a login storm, and what it costs the rest of the API.
+
+``--logins`` POST /auth/login calls are fired with ``--concurrency`` in flight
+while a probe requests GET / every 10 ms on the same worker; the probe
+latency is counted from when each request was due. Both run in-process
+through httpx's ASGI transport.
+
+The "inline" mode reproduces the old behaviour, with bcrypt running on the event
+loop. The "executor" mode uses src.services.password_hasher, where bcrypt runs
+in the worker pool and calls are rejected with 503 once the queue is full.
+
+    python benchmarks/bench_login.py --logins 200 --concurrency 50 --rounds 12
+
+Redis is expected on settings.redis_host. Without it, the user-cache
+invalidation in update_token fails fast and is only logged.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  # noqa: E402
+
+from main import app  # noqa: E402
+from src.database.db import get_db  # noqa: E402
+from src.database.models import Base, User  # noqa: E402
+from src.services.auth import auth_service  # noqa: E402
+from src.services.password_hasher import PasswordHasher  # noqa: E402
+
+PASSWORD = "bench-password"
+
+
+class InlineHasher(PasswordHasher):
+    async def _run(self, func, *args):
+        return func(*args)
+
+
+def percentiles(samples: list) -> dict:
+    if not samples:
+        return {}
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 1),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 1),
+        "max_ms": round(samples[-1] * 1000, 1),
+    }
+
+
+async def run(mode: str, url: str, args) -> dict:
+    engine = create_async_engine(url)
+    session_local = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    hasher_class = InlineHasher if mode == "inline" else PasswordHasher
+    auth_service.hasher = hasher_class(args.rounds, args.workers, args.queue)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_local() as db:
+        db.add(User(username="bench_user", email="bench@example.com", confirmed=True,
+                    password=await auth_service.get_password_hash(PASSWORD)))
+        await db.commit()
+
+    async def override_get_db():
+        async with session_local() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    logins, probes, statuses = [], [], {}
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def probe():
+            # measured from when the probe was due, so time spent waiting for a blocked loop counts
+            due = time.perf_counter()
+            while not done.is_set():
+                await client.get("/")
+                probes.append(time.perf_counter() - due)
+                due = time.perf_counter() + 0.01
+                await asyncio.sleep(0.01)
+
+        async def login():
+            start = time.perf_counter()
+            response = await client.post("/auth/login", data={"username": "bench@example.com", "password": PASSWORD})
+            logins.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def limited_login():
+            async with semaphore:
+                await login()
+
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(limited_login() for _ in range(args.logins)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    app.dependency_overrides.pop(get_db)
+    auth_service.hasher.shutdown()
+    await engine.dispose()
+    return {"seconds": round(elapsed, 2), "statuses": statuses,
+            "login": percentiles(logins), "probe_GET_/": percentiles(probes)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="sqlite+aiosqlite:///./bench.db")
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue", type=int, default=16)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    results = {mode: asyncio.run(run(mode, args.url, args)) for mode in ("inline", "executor")}
+    print(json.dumps({"logins": args.logins, "concurrency": args.concurrency, "rounds": args.rounds,
+                      "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
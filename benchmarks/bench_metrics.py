@@ -0,0 +1,94 @@
+"""Per-request cost of src.services.metrics and src.services.query_log.
+
+"middleware" calls a minimal ASGI app directly, bare and wrapped in
+MetricsMiddleware, and reports the difference per request. "db_hooks" runs
+``SELECT 1`` on in-memory SQLite engines with and without instrument_engine and
+reports the difference per statement. Both are measured without an HTTP client
+or server, so the figures are only the instrumentation's overhead.
+
+    python benchmarks/bench_metrics.py --requests 200000 --queries 50000
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from src.services.metrics import Metrics, MetricsMiddleware, RequestMetrics, current_request  # noqa: E402
+from src.services.query_log import instrument_engine  # noqa: E402
+
+
+class Route:
+    path = "/contacts/{contact_id}"
+
+
+async def endpoint(scope, receive, send):
+    scope["route"] = Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+async def per_request(app, requests: int) -> float:
+    scope = {"type": "http", "method": "GET", "path": "/contacts/1"}
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / requests
+
+
+def per_query(instrumented: bool, queries: int) -> float:
+    engine = create_engine("sqlite://")
+    if instrumented:
+        instrument_engine(engine)
+    token = current_request.set(RequestMetrics())
+    with engine.connect() as conn:
+        statement = text("SELECT 1")
+        conn.execute(statement)
+        start = time.perf_counter()
+        for _ in range(queries):
+            conn.execute(statement)
+        elapsed = time.perf_counter() - start
+    current_request.reset(token)
+    engine.dispose()
+    return elapsed / queries
+
+
+def best(measure, repeat: int) -> float:
+    return min(measure() for _ in range(repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    wrapped = MetricsMiddleware(endpoint, Metrics())
+    bare_request = best(lambda: asyncio.run(per_request(endpoint, args.requests)), args.repeat)
+    metrics_request = best(lambda: asyncio.run(per_request(wrapped, args.requests)), args.repeat)
+    bare_query = best(lambda: per_query(False, args.queries), args.repeat)
+    hooked_query = best(lambda: per_query(True, args.queries), args.repeat)
+    print(json.dumps({
+        "middleware": {"bare_us": round(bare_request * 1e6, 2), "instrumented_us": round(metrics_request * 1e6, 2),
+                       "overhead_us": round((metrics_request - bare_request) * 1e6, 2)},
+        "db_hooks": {"bare_us": round(bare_query * 1e6, 2), "instrumented_us": round(hooked_query * 1e6, 2),
+                     "overhead_us": round((hooked_query - bare_query) * 1e6, 2)},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""CPU cost of serializing a GET /contacts page, with and without settings.fast_list_responses.
+
+    python benchmarks/bench_serialization.py --sizes 100 1000 10000
+
+"orm" is the default path: ORM instances validated through the ContactList
+response model (orm_mode) and rendered by JSONResponse, the way FastAPI does it
+for the route. "rows" is the fast path: plain dicts from Core rows encoded by
+ORJSONResponse. Only serialization is timed; the query itself is not.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from src.database.models import Contact  # noqa: E402
+from src.schemas import ContactList  # noqa: E402
+
+
+def make_rows(size: int) -> list:
+    # the shape of repository_contacts.select_contact_rows()
+    return [{"id": i, "first_name": f"First{i}", "last_name": "Last", "email": f"user{i}@example.com",
+             "phone": f"067{i:07d}", "birthday": date(1990, 1 + i % 12, 1 + i % 28), "notes": "note " * (i % 5)}
+            for i in range(1, size + 1)]
+
+
+async def orm_page(field, contacts: list) -> bytes:
+    content = await serialize_response(field=field, response_content={"contacts": contacts, "total": len(contacts),
+                                                                        "next_cursor": None})
+    return JSONResponse(content).body
+
+
+async def rows_page(rows: list) -> bytes:
+    return ORJSONResponse({"contacts": rows, "total": len(rows), "next_cursor": None}).body
+
+
+async def measure(fn, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {"p50_ms": round(statistics.median(timings), 3), "max_ms": round(timings[-1], 3)}
+
+
+async def run(sizes: list, repeat: int) -> dict:
+    field = create_response_field(name="ContactList", type_=ContactList)
+    results = {}
+    for size in sizes:
+        rows = make_rows(size)
+        contacts = [Contact(**row) for row in rows]
+        assert json.loads(await orm_page(field, contacts)) == json.loads(await rows_page(rows))
+        orm = await measure(lambda: orm_page(field, contacts), repeat)
+        fast = await measure(lambda: rows_page(rows), repeat)
+        results[size] = {"orm": orm, "rows": fast, "speedup": round(orm["p50_ms"] / fast["p50_ms"], 1)}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.sizes, args.repeat)), indent=2))
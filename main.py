@@ -1,18 +1,30 @@
 import asyncio
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.staticfiles import StaticFiles
 from starlette.middleware.cors import CORSMiddleware
 import uvicorn
-import redis.asyncio as redis
-from fastapi_limiter import FastAPILimiter
 from pathlib import Path
 
-from src.routes import contacts, auth, users
+from src.conf.config import settings
+from src.routes import contacts, auth, users, internal
+from src.database.redis_client import close_redis
+from src.services.metrics import MetricsMiddleware, metrics
+from src.services.password_hasher import password_hasher
+from src.services.rate_limit import rate_limiter
+from src.services.token_cache import token_cache
+from src.services.upload_avatar import UploadService
+from src.services.user_cache import user_cache_service
 
 app = FastAPI(title='Contacts')
 
 app.include_router(contacts.router)
 app.include_router(auth.router)
 app.include_router(users.router, prefix='/api')
+app.include_router(internal.router)
+if settings.avatar_storage == "local":
+    app.mount(settings.avatar_local_url, StaticFiles(directory=settings.avatar_local_dir, check_dir=False),
+              name="avatars")
 
 origins = [
     "http://localhost:8000",
@@ -25,14 +37,27 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# outermost, so the latency includes the other middleware
+app.add_middleware(MetricsMiddleware)
 
 BASE_DIR = Path(__file__).parent
 
 
 @app.on_event("startup")
 async def startup():
-    r = await redis.Redis(host='localhost', port=6379, db=0)
-    await FastAPILimiter.init(r)
+    app.state.user_cache_listener = asyncio.create_task(user_cache_service.listen())
+    app.state.token_cache_listener = asyncio.create_task(token_cache.listen())
+    app.state.rate_limit_sync = asyncio.create_task(rate_limiter.run())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.user_cache_listener.cancel()
+    app.state.token_cache_listener.cancel()
+    app.state.rate_limit_sync.cancel()
+    password_hasher.shutdown()
+    UploadService.executor.shutdown(wait=False, cancel_futures=True)
+    await close_redis()
 
 
 @app.get('/')
@@ -40,6 +65,11 @@ async def root():
     return {'message': 'Contacts'}
 
 
+@app.get('/metrics', include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 async def start_app():
     config = uvicorn.Config("main:app", port=8000, log_level="info")
     server = uvicorn.Server(config)
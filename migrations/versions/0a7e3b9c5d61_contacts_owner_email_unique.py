@@ -0,0 +1,28 @@
+"""Contacts email unique per owner
+
+Revision ID: 0a7e3b9c5d61
+Revises: f1c4d8a2b6e9
+Create Date: 2026-10-18 17:48:52.113907
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0a7e3b9c5d61'
+down_revision = 'f1c4d8a2b6e9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ux_contacts_owner_id_email', 'contacts', ['owner_id', 'email'], unique=True)
+    op.drop_index('ix_contacts_email', table_name='contacts')
+    op.create_index('ix_contacts_email', 'contacts', ['email'], unique=False)
+
+
+def downgrade() -> None:
+    # fails if two owners now hold the same email
+    op.drop_index('ix_contacts_email', table_name='contacts')
+    op.create_index('ix_contacts_email', 'contacts', ['email'], unique=True)
+    op.drop_index('ux_contacts_owner_id_email', table_name='contacts')
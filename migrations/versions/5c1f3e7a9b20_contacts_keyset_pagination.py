@@ -0,0 +1,30 @@
+"""Contacts keyset pagination
+
+Revision ID: 5c1f3e7a9b20
+Revises: 2a15fb85b89e
+Create Date: 2026-10-18 10:12:41.503118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1f3e7a9b20'
+down_revision = '2a15fb85b89e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_contacts_owner_id_id', 'contacts', ['owner_id', 'id'], unique=False)
+    op.add_column('users', sa.Column('contacts_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        "UPDATE users SET contacts_count = "
+        "(SELECT count(*) FROM contacts WHERE contacts.owner_id = users.id)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'contacts_count')
+    op.drop_index('ix_contacts_owner_id_id', table_name='contacts')
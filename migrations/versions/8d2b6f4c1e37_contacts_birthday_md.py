@@ -0,0 +1,30 @@
+"""Contacts birthday month-day
+
+Revision ID: 8d2b6f4c1e37
+Revises: 5c1f3e7a9b20
+Create Date: 2026-10-18 11:40:07.216954
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2b6f4c1e37'
+down_revision = '5c1f3e7a9b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('birthday_md', sa.SmallInteger(), nullable=True))
+    op.execute(
+        "UPDATE contacts SET birthday_md = EXTRACT(MONTH FROM birthday) * 100 + EXTRACT(DAY FROM birthday) "
+        "WHERE birthday IS NOT NULL"
+    )
+    op.create_index('ix_contacts_owner_id_birthday_md', 'contacts', ['owner_id', 'birthday_md'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_owner_id_birthday_md', table_name='contacts')
+    op.drop_column('contacts', 'birthday_md')
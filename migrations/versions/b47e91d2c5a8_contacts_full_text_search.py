@@ -0,0 +1,42 @@
+"""Contacts full-text search
+
+Revision ID: b47e91d2c5a8
+Revises: 8d2b6f4c1e37
+Create Date: 2026-10-18 13:05:52.840311
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b47e91d2c5a8'
+down_revision = '8d2b6f4c1e37'
+branch_labels = None
+depends_on = None
+
+# must stay identical to SEARCH_TEXT_SQL in src/repository/contacts.py for the index to be used
+SEARCH_TEXT_SQL = ("(coalesce(first_name, '') || ' ' || coalesce(last_name, '') || ' ' || "
+                   "coalesce(email, '') || ' ' || coalesce(phone, ''))")
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+    op.execute(
+        "ALTER TABLE contacts ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('simple', coalesce(first_name, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(last_name, '')), 'A') || "
+        "setweight(to_tsvector('simple', regexp_replace(coalesce(email, ''), '[@._+-]', ' ', 'g')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(phone, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(notes, '')), 'C')"
+        ") STORED"
+    )
+    op.execute("CREATE INDEX ix_contacts_owner_id_search_vector ON contacts USING gin (owner_id, search_vector)")
+    op.execute(f"CREATE INDEX ix_contacts_owner_id_search_trgm ON contacts "
+               f"USING gin (owner_id, {SEARCH_TEXT_SQL} gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_contacts_owner_id_search_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_contacts_owner_id_search_vector")
+    op.drop_column('contacts', 'search_vector')
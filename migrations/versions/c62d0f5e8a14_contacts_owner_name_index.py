@@ -0,0 +1,28 @@
+"""Contacts owner name index
+
+Revision ID: c62d0f5e8a14
+Revises: 0a7e3b9c5d61
+Create Date: 2026-10-18 18:21:05.338410
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c62d0f5e8a14'
+down_revision = '0a7e3b9c5d61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY keeps contacts writable while the index builds; it cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index('ix_contacts_owner_id_last_name_first_name', 'contacts',
+                        ['owner_id', 'last_name', 'first_name'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_contacts_owner_id_last_name_first_name', table_name='contacts',
+                      postgresql_concurrently=True)
@@ -0,0 +1,26 @@
+"""Users contacts version
+
+Revision ID: f1c4d8a2b6e9
+Revises: e3a8c5d17f42
+Create Date: 2026-10-18 17:03:21.640215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c4d8a2b6e9'
+down_revision = 'e3a8c5d17f42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('contacts_version', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('contacts_updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'contacts_updated_at')
+    op.drop_column('users', 'contacts_version')
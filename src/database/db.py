@@ -1,26 +1,35 @@
-from sqlalchemy.engine import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.exc import DatabaseError
 
 from src.conf.config import settings
+from src.database.pool import InstrumentedAsyncPool
+from src.services.query_log import instrument_engine
 
-print("+++++++++++++++++++++++++++", settings.sqlalchemy_database_url)
 SQLALCHEMY_DATABASE_URL = settings.sqlalchemy_database_url
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(
+engine = create_async_engine(
+    SQLALCHEMY_DATABASE_URL,
+    echo=settings.db_echo,
+    poolclass=InstrumentedAsyncPool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    pool_timeout=settings.db_pool_timeout,
+)
+instrument_engine(engine.sync_engine)
+SessionLocal = async_sessionmaker(
     bind=engine,
-    autocommit=False,
+    class_=AsyncSession,
     autoflush=False,
+    expire_on_commit=False,
 )
 
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    except DatabaseError: # noqa
-        db.rollback()
-    finally:
-        db.close()
+async def get_db():
+    async with SessionLocal() as db:
+        try:
+            yield db
+        except DatabaseError: # noqa
+            await db.rollback()
@@ -1,24 +1,72 @@
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Date, func
-from sqlalchemy.orm import declarative_base, relationship
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import (JSON, Boolean, Column, DDL, DateTime, ForeignKey, Index, Integer, SmallInteger, String, Date,
+                        event, func)
+from sqlalchemy.orm import declarative_base, relationship, validates
 
 Base = declarative_base()
 
+
+def birthday_md(birthday: Optional[date]) -> Optional[int]:
+    # month * 100 + day, e.g. 229 for 29 February: sorts in calendar order within a year
+    return birthday.month * 100 + birthday.day if birthday else None
+
+
 class Contact(Base):
     __tablename__ = "contacts"
 
     id = Column(Integer, primary_key=True, index=True)
     first_name = Column(String(50), index=True)
     last_name = Column(String(50), index=True)
-    email = Column(String(320), unique=True, index=True)
+    email = Column(String(320), index=True)
     phone = Column(String(20), index=True)
     birthday = Column(Date)
+    birthday_md = Column(SmallInteger)
     notes = Column(String(255))
     created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    # set in Python (UTC, microseconds) rather than by now(): it is the basis of the contact's ETag
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     owner_id = Column(Integer, ForeignKey("users.id"))
 
     owner = relationship("User", back_populates="contacts")
 
+    __table_args__ = (
+        Index("ix_contacts_owner_id_id", "owner_id", "id"),
+        Index("ix_contacts_owner_id_last_name_first_name", "owner_id", "last_name", "first_name"),
+        Index("ix_contacts_owner_id_birthday_md", "owner_id", "birthday_md"),
+        # an email is unique within one address book; the conflict target of imports and upserts
+        Index("ux_contacts_owner_id_email", "owner_id", "email", unique=True),
+    )
+
+    @validates("birthday")
+    def _set_birthday_md(self, key, value):
+        self.birthday_md = birthday_md(value)
+        return value
+
+
+# SQLite fallback for full-text search; on Postgres the search_vector column and the
+# trigram indexes are created by migrations
+SQLITE_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5("
+    "first_name, last_name, email, phone, notes, content='contacts', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email, phone, notes) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email, new.phone, new.notes); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email, phone, notes) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone, old.notes); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email, phone, notes) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone, old.notes); "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email, phone, notes) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email, new.phone, new.notes); END",
+)
+
+for statement in SQLITE_FTS_DDL:
+    event.listen(Contact.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(Contact.__table__, "before_drop", DDL("DROP TABLE IF EXISTS contacts_fts").execute_if(dialect="sqlite"))
+
 
 class User(Base):
     __tablename__ = "users"
@@ -29,5 +77,27 @@ class User(Base):
     avatar = Column(String(255), nullable=True)
     refresh_token = Column(String(255), nullable=True)
     confirmed = Column(Boolean, default=False)
+    contacts_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # bumped on every change to the user's contacts; versions the collection for conditional GETs
+    contacts_version = Column(Integer, nullable=False, default=0, server_default="0")
+    contacts_updated_at = Column(DateTime)
     
-    contacts = relationship("Contact", back_populates="owner")
\ No newline at end of file
+    contacts = relationship("Contact", back_populates="owner")
+
+
+class EmailOutbox(Base):
+    """Queued emails, drained by src.services.email_dispatcher.
+
+    ``next_attempt_at`` is cleared once a message is sent or given up on, so only pending rows stay in its index.
+    """
+    __tablename__ = "email_outbox"
+    id = Column(Integer, primary_key=True)
+    recipient = Column(String(320), nullable=False)
+    subject = Column(String(255), nullable=False)
+    template = Column(String(100), nullable=False)
+    context = Column(JSON, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_error = Column(String(255))
+    sent_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,68 @@
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+@dataclass
+class PoolStats:
+    checkouts: int = 0
+    wait_time_total: float = 0.0
+    wait_time_max: float = 0.0
+    overflow_events: int = 0
+    timeouts: int = 0
+
+    def reset(self):
+        self.checkouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.overflow_events = 0
+        self.timeouts = 0
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records checkout wait time, overflow connections and timeouts."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            pool_stats.timeouts += 1
+            raise
+        wait = time.perf_counter() - start
+        pool_stats.checkouts += 1
+        pool_stats.wait_time_total += wait
+        if wait > pool_stats.wait_time_max:
+            pool_stats.wait_time_max = wait
+        return conn
+
+    def _create_connection(self):
+        if self._overflow > 0:
+            pool_stats.overflow_events += 1
+        return super()._create_connection()
+
+
+def get_pool_status(pool) -> dict:
+    status = {
+        "pool_class": type(pool).__name__,
+        "checkouts": pool_stats.checkouts,
+        "wait_time_total_ms": round(pool_stats.wait_time_total * 1000, 3),
+        "wait_time_avg_ms": round(pool_stats.wait_time_total * 1000 / pool_stats.checkouts, 3)
+        if pool_stats.checkouts else 0.0,
+        "wait_time_max_ms": round(pool_stats.wait_time_max * 1000, 3),
+        "overflow_events": pool_stats.overflow_events,
+        "timeouts": pool_stats.timeouts,
+    }
+    if hasattr(pool, "checkedout"):
+        status.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+        })
+    return status
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import time
+from typing import Callable
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.services.metrics import record_redis_call
+
+logger = logging.getLogger(__name__)
+
+redis_pool = redis.ConnectionPool(
+    host=settings.redis_host,
+    port=settings.redis_port,
+    db=0,
+    max_connections=settings.redis_max_connections,
+    socket_timeout=settings.redis_timeout,
+    socket_connect_timeout=settings.redis_timeout,
+)
+redis_client = redis.Redis(connection_pool=redis_pool)
+
+
+async def close_redis():
+    await redis_client.close()
+    await redis_pool.disconnect()
+
+
+async def redis_call(coro):
+    # a slow or unavailable Redis degrades to a cache miss instead of stalling the request
+    start = time.perf_counter()
+    try:
+        return await asyncio.wait_for(coro, timeout=settings.redis_timeout)
+    except (RedisError, OSError, asyncio.TimeoutError) as err:
+        logger.warning("Redis call failed: %r", err)
+        return None
+    finally:
+        record_redis_call(time.perf_counter() - start)
+
+
+def pubsub_client() -> redis.Redis:
+    # a subscriber waits indefinitely for messages, so it must not inherit the socket timeout
+    return redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0,
+                       socket_connect_timeout=settings.redis_timeout)
+
+
+async def subscribe(channel: str, on_message: Callable[[str], None], on_reset: Callable[[], None]):
+    """Call ``on_message`` for every message published on ``channel``, reconnecting forever.
+
+    ``on_reset`` runs after the subscription is lost, since messages may have been missed meanwhile.
+    """
+    while True:
+        client = pubsub_client()
+        try:
+            async with client.pubsub() as pubsub:
+                await pubsub.subscribe(channel)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        on_message(message["data"].decode(errors="replace"))
+        except (RedisError, OSError) as err:
+            logger.warning("Subscription to %s failed: %r", channel, err)
+            on_reset()
+            await asyncio.sleep(1)
+        finally:
+            await client.close()
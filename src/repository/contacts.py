@@ -1,85 +1,292 @@
-from datetime import date, timedelta
-from typing import List, Optional
+import re
+from calendar import isleap
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, List, Optional, Tuple, Union
 
-from sqlalchemy import and_, or_, func, text
-from sqlalchemy.orm import Session
+from sqlalchemy import Integer, Select, and_, any_, bindparam, delete, func, or_, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import Contact
-from src.schemas import ContactBase as ContactModel
+from src.database.models import Contact, User, birthday_md
+from src.schemas import ContactBase as ContactModel, ContactMatch
+from src.services.autocomplete import autocomplete_service
 
 
-async def get_contacts(db: Session, owner_id: int) -> List[Contact]:
-    contacts = db.query(Contact).filter_by(owner_id=owner_id).all()
-    return contacts
+async def get_contacts(db: AsyncSession, owner_id: int) -> List[Contact]:
+    contacts = await db.scalars(select(Contact).filter_by(owner_id=owner_id))
+    return contacts.all()
 
 
-async def get_contact(contact_id: int, db: Session, owner_id: int) -> Contact:
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.owner_id == owner_id)).first()
-    return contact
+EXPORT_COLUMNS = ("id", "first_name", "last_name", "email", "phone", "birthday", "notes")
+
+
+def select_contact_rows() -> Select:
+    # just the response fields, as Core rows: no ORM identity map or instance state per contact
+    return select(*(getattr(Contact, name) for name in EXPORT_COLUMNS))
+
+
+async def fetch_rows(db: AsyncSession, query: Select) -> List[dict]:
+    return [dict(row) for row in (await db.execute(query)).mappings()]
+
+
+async def get_contacts_page(
+        db: AsyncSession,
+        owner_id: int,
+        limit: int = 100,
+        after_id: Optional[int] = None,
+        skip: int = 0,
+        as_rows: bool = False,
+) -> Tuple[Union[List[Contact], List[dict]], Optional[int]]:
+    query = (select_contact_rows() if as_rows else select(Contact)).filter(Contact.owner_id == owner_id)
+    if after_id is not None:
+        query = query.filter(Contact.id > after_id)
+    elif skip:
+        query = query.offset(skip)
+    query = query.order_by(Contact.owner_id, Contact.id).limit(limit + 1)
+    contacts = await fetch_rows(db, query) if as_rows else (await db.scalars(query)).all()
+    if len(contacts) > limit:
+        contacts = contacts[:limit]
+        return contacts, contacts[-1]["id"] if as_rows else contacts[-1].id
+    return contacts, None
+
+
+async def stream_contacts(db: AsyncSession, owner_id: int, batch_size: int = 1000) -> AsyncIterator[List[dict]]:
+    query = select_contact_rows().filter(Contact.owner_id == owner_id)
+    result = await db.stream(query.order_by(Contact.owner_id, Contact.id).execution_options(yield_per=batch_size))
+    async for partition in result.mappings().partitions():
+        yield partition
+
+
+async def count_contacts(db: AsyncSession, owner_id: int) -> int:
+    total = await db.scalar(select(User.contacts_count).filter(User.id == owner_id))
+    return total or 0
+
 
+async def record_contacts_change(db: AsyncSession, owner_id: int, count_delta: int = 0) -> None:
+    await db.execute(update(User).filter(User.id == owner_id).values(
+        contacts_count=User.contacts_count + count_delta,
+        contacts_version=User.contacts_version + 1,
+        contacts_updated_at=datetime.utcnow(),
+    ))
 
-async def create_contact(body: ContactModel, db: Session, owner_id: int) -> Contact:
-    contact = Contact(**body.dict())
-    contact.owner_id = owner_id
-    db.add(contact)
-    db.commit()
-    db.refresh(contact)
+
+async def get_contacts_version(db: AsyncSession, owner_id: int) -> Tuple[int, Optional[datetime]]:
+    row = (await db.execute(
+        select(User.contacts_version, User.contacts_updated_at).filter(User.id == owner_id)
+    )).first()
+    return (row.contacts_version, row.contacts_updated_at) if row else (0, None)
+
+
+async def get_contact(contact_id: int, db: AsyncSession, owner_id: int) -> Contact:
+    contact = await db.scalars(select(Contact).filter(and_(Contact.id == contact_id, Contact.owner_id == owner_id)))
+    return contact.first()
+
+
+OWNER_EMAIL = [Contact.owner_id, Contact.email]
+# on a merge, fields the request leaves empty keep their stored value
+MERGE_COLUMNS = ("first_name", "last_name", "phone", "birthday", "birthday_md", "notes")
+
+
+def dialect_insert(db: AsyncSession):
+    return postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+
+
+def contact_values(body: ContactModel, owner_id: int) -> dict:
+    # Core inserts bypass the birthday validator on the model
+    return {**body.dict(), "birthday_md": birthday_md(body.birthday), "owner_id": owner_id}
+
+
+async def create_contact(body: ContactModel, db: AsyncSession, owner_id: int) -> Optional[Contact]:
+    """Returns None, without inserting, when the owner already has a contact with this email."""
+    stmt = (dialect_insert(db)(Contact).values(**contact_values(body, owner_id))
+            .on_conflict_do_nothing(index_elements=OWNER_EMAIL).returning(Contact))
+    contact = await db.scalar(stmt)
+    if contact is None:
+        return None
+    await record_contacts_change(db, owner_id, 1)
+    await db.commit()
+    autocomplete_service.contact_saved(contact)
     return contact
 
 
-async def update_contact(body: ContactModel, contact_id: int, db: Session, owner_id: int) -> Contact:
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.owner_id == owner_id)).first()
+async def upsert_contact(body: ContactModel, db: AsyncSession, owner_id: int) -> Tuple[Contact, bool]:
+    """Creates the contact, or merges it into the owner's contact with the same email. Returns (contact, created)."""
+    now = datetime.utcnow()
+    stmt = dialect_insert(db)(Contact).values(**contact_values(body, owner_id), created_at=now, updated_at=now)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=OWNER_EMAIL,
+        set_={**{name: func.coalesce(stmt.excluded[name], getattr(Contact, name)) for name in MERGE_COLUMNS},
+              "updated_at": stmt.excluded.updated_at},
+    ).returning(Contact)
+    contact = await db.scalar(stmt, execution_options={"populate_existing": True})
+    # both timestamps come from ``now`` only when the row was inserted; a merge keeps the old created_at
+    created = contact.created_at == contact.updated_at
+    await record_contacts_change(db, owner_id, 1 if created else 0)
+    await db.commit()
+    autocomplete_service.contact_saved(contact)
+    return contact, created
+
+
+async def insert_contacts(rows: List[dict], db: AsyncSession, owner_id: int) -> int:
+    stmt = dialect_insert(db)(Contact).on_conflict_do_nothing(index_elements=OWNER_EMAIL).returning(Contact.id)
+    # executemany with RETURNING is sent as multi-row INSERT ... VALUES batches ("insertmanyvalues")
+    result = await db.execute(stmt, [{**row, "birthday_md": birthday_md(row.get("birthday")), "owner_id": owner_id}
+                                     for row in rows])
+    inserted = len(result.all())
+    if inserted:
+        await record_contacts_change(db, owner_id, inserted)
+    await db.commit()
+    if inserted:
+        autocomplete_service.invalidate(owner_id)
+    return inserted
+
+
+async def update_contact(body: ContactModel, contact_id: int, db: AsyncSession, owner_id: int) -> Contact:
+    contact = await get_contact(contact_id, db, owner_id)
     if contact:
         contact.email = body.email
         contact.phone = body.phone
         contact.birthday = body.birthday
         contact.notes = body.notes
-        db.commit()
+        await record_contacts_change(db, owner_id)
+        await db.commit()
+        autocomplete_service.contact_saved(contact)
     return contact
 
 
-async def delete_contact(contact_id: int, db: Session, owner_id: int) -> Contact:
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.owner_id == owner_id)).first()
+async def delete_contact(contact_id: int, db: AsyncSession, owner_id: int) -> Contact:
+    contact = await get_contact(contact_id, db, owner_id)
     if contact:
-        db.delete(contact)
-        db.commit()
+        await db.delete(contact)
+        await record_contacts_change(db, owner_id, -1)
+        await db.commit()
+        autocomplete_service.contact_deleted(contact)
     return contact
 
 
+def select_owned(db: AsyncSession, owner_id: int, ids: Optional[List[int]] = None,
+                 match: Optional[ContactMatch] = None) -> list:
+    criteria = [Contact.owner_id == owner_id]
+    if ids is not None:
+        if db.bind.dialect.name == "postgresql":
+            # a single array parameter: the statement is the same however many ids are sent
+            criteria.append(Contact.id == any_(bindparam("ids", ids, type_=postgresql.ARRAY(Integer))))
+        else:
+            criteria.append(Contact.id.in_(ids))
+    if match is not None:
+        criteria.extend(getattr(Contact, name) == value for name, value in match.dict(exclude_none=True).items())
+    return criteria
+
+
+async def bulk_update_contacts(db: AsyncSession, owner_id: int, changes: dict, ids: Optional[List[int]] = None,
+                               match: Optional[ContactMatch] = None) -> List[int]:
+    if "birthday" in changes:
+        changes["birthday_md"] = birthday_md(changes["birthday"])
+    stmt = update(Contact).where(*select_owned(db, owner_id, ids, match)).values(**changes).returning(Contact.id)
+    updated = (await db.execute(stmt, execution_options={"synchronize_session": False})).scalars().all()
+    if updated:
+        await record_contacts_change(db, owner_id)
+    await db.commit()
+    if updated and ("first_name" in changes or "last_name" in changes):
+        autocomplete_service.invalidate(owner_id)
+    return updated
+
+
+async def bulk_delete_contacts(db: AsyncSession, owner_id: int, ids: Optional[List[int]] = None,
+                               match: Optional[ContactMatch] = None) -> List[int]:
+    stmt = delete(Contact).where(*select_owned(db, owner_id, ids, match)).returning(Contact.id)
+    deleted = (await db.execute(stmt, execution_options={"synchronize_session": False})).scalars().all()
+    if deleted:
+        await record_contacts_change(db, owner_id, -len(deleted))
+    await db.commit()
+    if deleted:
+        autocomplete_service.invalidate(owner_id)
+    return deleted
+
+
 async def search_contact(
-        db: Session,
+        db: AsyncSession,
         owner_id: int,
         first_name: Optional[str] = None,
         last_name: Optional[str] = None,
         email: Optional[str] = None,
 ) -> List[Contact]:
-    contact = db.query(Contact).filter(
+    contact = await db.scalars(select(Contact).filter(
         and_(
             or_(Contact.first_name == first_name, first_name is None),
             or_(Contact.last_name == last_name, last_name is None),
             or_(Contact.email == email, email is None),
             Contact.owner_id == owner_id,
         )
-    ).all()
+    ))
 
-    return contact
+    return contact.all()
 
 
-async def search_birthday_contact(db: Session, owner_id: int, days: int = 7) -> List[Contact]:
-    date_from = date.today()
-    date_to = date.today() + timedelta(days=days)
-    this_year = date_from.year
-    next_year = date_from.year + 1
-    contact = db.query(Contact).filter(
-        and_(
-            Contact.owner_id == owner_id,
-        )).filter(
-        or_(
-            func.to_date(func.concat(func.to_char(Contact.birthday, "DDMM"), this_year), "DDMMYYYY").between(date_from,
-                                                                                                             date_to),
-            func.to_date(func.concat(func.to_char(Contact.birthday, "DDMM"), next_year), "DDMMYYYY").between(date_from,
-                                                                                                             date_to),
-        )
-    ).all()
+SEARCH_TEXT_SQL = ("(coalesce(contacts.first_name, '') || ' ' || coalesce(contacts.last_name, '') || ' ' || "
+                   "coalesce(contacts.email, '') || ' ' || coalesce(contacts.phone, ''))")
 
-    return contact
+CONTACT_COLUMNS_SQL = ", ".join(f"contacts.{column.name}" for column in Contact.__table__.columns)
+
+POSTGRES_SEARCH_SQL = f"""
+SELECT {CONTACT_COLUMNS_SQL} FROM contacts
+WHERE contacts.owner_id = :owner_id
+  AND (contacts.search_vector @@ to_tsquery('simple', :tsquery) OR :query <% {SEARCH_TEXT_SQL})
+ORDER BY ts_rank(contacts.search_vector, to_tsquery('simple', :tsquery))
+         + word_similarity(:query, {SEARCH_TEXT_SQL}) DESC, contacts.id
+LIMIT :limit OFFSET :skip
+"""
+
+SQLITE_SEARCH_SQL = f"""
+SELECT {CONTACT_COLUMNS_SQL} FROM contacts JOIN contacts_fts ON contacts_fts.rowid = contacts.id
+WHERE contacts_fts MATCH :match AND contacts.owner_id = :owner_id
+ORDER BY contacts_fts.rank, contacts.id
+LIMIT :limit OFFSET :skip
+"""
+
+
+def search_terms(query: str) -> List[str]:
+    return re.findall(r"[^\W_]+", query.lower())
+
+
+async def full_text_search(db: AsyncSession, owner_id: int, query: str, limit: int = 20,
+                           skip: int = 0) -> List[Contact]:
+    terms = search_terms(query)
+    if not terms:
+        return []
+    params = {"owner_id": owner_id, "limit": limit, "skip": skip}
+    if db.bind.dialect.name == "postgresql":
+        sql = POSTGRES_SEARCH_SQL
+        params.update(query=" ".join(terms), tsquery=" & ".join(f"{term}:*" for term in terms))
+    else:
+        sql = SQLITE_SEARCH_SQL
+        params.update(match=" ".join(f'"{term}"*' for term in terms))
+    contacts = await db.scalars(select(Contact).from_statement(text(sql)), params)
+    return contacts.all()
+
+
+def birthday_window(date_from: date, days: int) -> Tuple[int, int]:
+    date_to = date_from + timedelta(days=days)
+    from_md, to_md = birthday_md(date_from), birthday_md(date_to)
+    # 29 February is celebrated on 1 March in non-leap years
+    if from_md == 301 and not isleap(date_from.year):
+        from_md = 229
+    return from_md, to_md
+
+
+async def search_birthday_contact(db: AsyncSession, owner_id: int, days: int = 7, today: Optional[date] = None,
+                                  as_rows: bool = False) -> Union[List[Contact], List[dict]]:
+    query = (select_contact_rows() if as_rows else select(Contact)).filter(Contact.owner_id == owner_id,
+                                                                           Contact.birthday_md.is_not(None))
+    if days < 365:
+        from_md, to_md = birthday_window(today or date.today(), days)
+        if from_md <= to_md:
+            query = query.filter(Contact.birthday_md.between(from_md, to_md))
+        else:
+            # the window wraps over New Year: two range scans on (owner_id, birthday_md)
+            query = query.filter(or_(Contact.birthday_md >= from_md, Contact.birthday_md <= to_md))
+    if as_rows:
+        return await fetch_rows(db, query)
+    contact = await db.scalars(query)
+
+    return contact.all()
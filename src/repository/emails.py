@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import EmailOutbox
+
+
+async def enqueue_email(recipient: str, subject: str, template: str, context: dict, db: AsyncSession,
+                        commit: bool = True) -> EmailOutbox:
+    # commit=False leaves the row in the caller's transaction, to be committed with the change it announces
+    email = EmailOutbox(recipient=recipient, subject=subject, template=template, context=context)
+    db.add(email)
+    if commit:
+        await db.commit()
+    return email
+
+
+async def claim_due_emails(db: AsyncSession, limit: int, lease: int) -> List[EmailOutbox]:
+    # claimed rows are pushed ``lease`` seconds into the future, so another dispatcher skips them
+    # and a dispatcher that dies mid-batch has them picked up again once the lease runs out
+    now = datetime.utcnow()
+    emails = await db.scalars(
+        select(EmailOutbox)
+        .filter(EmailOutbox.next_attempt_at <= now)
+        .order_by(EmailOutbox.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    emails = emails.all()
+    for email in emails:
+        email.next_attempt_at = now + timedelta(seconds=lease)
+    await db.commit()
+    return emails
+
+
+async def record_delivery(db: AsyncSession, sent: List[EmailOutbox],
+                          failed: List[Tuple[EmailOutbox, str, Optional[datetime]]]) -> None:
+    now = datetime.utcnow()
+    for email in sent:
+        email.attempts += 1
+        email.sent_at = now
+        email.next_attempt_at = None
+    for email, error, retry_at in failed:
+        email.attempts += 1
+        email.last_error = error[:255]
+        email.next_attempt_at = retry_at
+    await db.commit()
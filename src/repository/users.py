@@ -1,15 +1,23 @@
 from libgravatar import Gravatar
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User
 from src.schemas import UserDb
+from src.services.user_cache import user_cache_service
 
 
-async def get_user_by_email(email: str, db: Session) -> User:
-    return db.query(User).filter(User.email == email).first()
+async def get_user_by_email(email: str, db: AsyncSession) -> User:
+    user = await db.scalars(select(User).filter(User.email == email))
+    return user.first()
 
 
-async def create_user(body: UserDb, db: Session) -> User:
+async def get_user_by_id(user_id: int, db: AsyncSession) -> User:
+    user = await db.scalars(select(User).filter(User.id == user_id))
+    return user.first()
+
+
+async def create_user(body: UserDb, db: AsyncSession) -> User:
     avatar = None
     try:
         g = Gravatar(body.email)
@@ -18,24 +26,27 @@ async def create_user(body: UserDb, db: Session) -> User:
         print(e)
     new_user = User(**body.dict(), avatar=avatar)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
-async def update_token(user: User, token: str | None, db: Session) -> None:
+async def update_token(user: User, token: str | None, db: AsyncSession) -> None:
     user.refresh_token = token
-    db.commit()
+    await db.commit()
+    await user_cache_service.invalidate(user.email)
 
 
-async def confirmed_email(email: str, db: Session) -> None:
+async def confirmed_email(email: str, db: AsyncSession) -> None:
     user = await get_user_by_email(email, db)
     user.confirmed = True
-    db.commit()
+    await db.commit()
+    await user_cache_service.invalidate(email)
 
 
-async def update_avatar(email, url: str, db: Session) -> User:
+async def update_avatar(email, url: str, db: AsyncSession) -> User:
     user = await get_user_by_email(email, db)
     user.avatar = url
-    db.commit()
+    await db.commit()
+    await user_cache_service.invalidate(email)
     return user
@@ -1,79 +1,205 @@
-from typing import List
+import hashlib
+from typing import List, Optional
 
-from fastapi import Depends, HTTPException, APIRouter, status
-from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+from fastapi import Depends, Header, HTTPException, APIRouter, Path, Query, Request, Response, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..database.db import get_db
-from ..database.models import Contact, User
-from ..schemas import ContactCreate, ContactResponse, ContactUpdate
+from ..database.models import User
+from ..schemas import (ContactBulkResult, ContactBulkUpdate, ContactCreate, ContactFilter, ContactList, ContactResponse,
+                       ContactSelection, ContactSuggestion, ContactUpdate, ContactUpsert)
+from src.conf.config import settings
 from src.services.auth import auth_service
+from src.services.rate_limit import RateLimit
 from src.repository import contacts as repository_contacts
+from src.services.pagination import encode_cursor, decode_cursor
+from src.services.contacts_import import import_contacts
+from src.services.contacts_export import EXPORT_FORMATS, export_contacts
+from src.services.autocomplete import autocomplete_service
+from src.services.http_cache import PRIVATE_REVALIDATE, http_date, not_modified
 
 router = APIRouter(prefix='/contacts', tags=['/contact'])
 
 
-@router.post("/", dependencies=[Depends(RateLimiter(times=1, seconds=10))], description='One request per 10 seconds')
-async def create_contact(contact: ContactCreate, db: Session = Depends(get_db), status_code=status.HTTP_201_CREATED,
+@router.post("/", dependencies=[Depends(RateLimit("contacts:create"))], description='One request per 10 seconds')
+async def create_contact(contact: ContactCreate, db: AsyncSession = Depends(get_db),
+                         status_code=status.HTTP_201_CREATED,
                          current_user: User = Depends(auth_service.get_current_user)):
-    contact_email = await repository_contacts.search_contact(owner_id=current_user.id, email=contact.email, db=db)
-    if contact_email:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Email is exists')
     contact = await repository_contacts.create_contact(owner_id=current_user.id, body=contact, db=db)
+    if contact is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Email is exists')
     return contact
 
 
-@router.get("/", response_model=List[ContactResponse], dependencies=[Depends(RateLimiter(times=1, seconds=10))],
-            description='One request per 10 seconds')
-def read_contacts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db),
-                  current_user: User = Depends(auth_service.get_current_user)):
-    contacts = db.query(Contact).offset(skip).limit(limit).all()
-    return contacts
+@router.put("/upsert", response_model=ContactResponse, dependencies=[Depends(RateLimit("contacts:create"))],
+            responses={201: {"model": ContactResponse}},
+            description='Create a contact, or merge it into the contact with the same email: 201 when created, '
+                        '200 when merged. Empty fields keep their stored value. One request per 10 seconds')
+async def upsert_contact(contact: ContactUpsert, response: Response, db: AsyncSession = Depends(get_db),
+                         current_user: User = Depends(auth_service.get_current_user)):
+    contact, created = await repository_contacts.upsert_contact(contact, db, current_user.id)
+    if created:
+        response.status_code = status.HTTP_201_CREATED
+    return contact
+
+
+@router.post("/import", dependencies=[Depends(RateLimit("contacts:import"))],
+             description='Bulk import from a streamed CSV (with header row) or NDJSON body. One request per 10 seconds')
+async def import_contacts_bulk(request: Request, format: str = Query('ndjson', regex='^(ndjson|csv)$'),
+                               db: AsyncSession = Depends(get_db),
+                               current_user: User = Depends(auth_service.get_current_user)):
+    return await import_contacts(request.stream(), format, db, current_user.id)
+
+
+@router.get("/export", dependencies=[Depends(RateLimit("contacts:export"))],
+            description='Stream the whole address book as NDJSON or CSV. One request per 10 seconds')
+async def export_contacts_stream(format: str = Query('ndjson', regex='^(ndjson|csv)$'),
+                                 db: AsyncSession = Depends(get_db),
+                                 current_user: User = Depends(auth_service.get_current_user)):
+    return StreamingResponse(export_contacts(format, db, current_user.id), media_type=EXPORT_FORMATS[format],
+                             headers={"Content-Disposition": f'attachment; filename="contacts.{format}"'})
+
+
+def bulk_outcomes(ids: Optional[List[int]], affected: List[int], done: str) -> dict:
+    if ids is None:
+        results = [{"id": contact_id, "status": done} for contact_id in affected]
+    else:
+        affected = set(affected)
+        # ids that do not exist and ids owned by someone else look the same
+        results = [{"id": contact_id, "status": done if contact_id in affected else "not_found"}
+                   for contact_id in dict.fromkeys(ids)]
+    return {"matched": len(affected), "results": results}
+
 
+@router.patch("/bulk", response_model=ContactBulkResult, dependencies=[Depends(RateLimit("contacts:bulk"))],
+              description='Apply the same changes to up to 1000 contacts, or to every contact matching a filter, '
+                          'in one statement. One request per 10 seconds, shared with bulk delete')
+async def bulk_update_contacts(body: ContactBulkUpdate, db: AsyncSession = Depends(get_db),
+                               current_user: User = Depends(auth_service.get_current_user)):
+    updated = await repository_contacts.bulk_update_contacts(db, current_user.id, body.changes.dict(exclude_none=True),
+                                                              body.ids, body.filter)
+    return bulk_outcomes(body.ids, updated, "updated")
 
-@router.get("/{contact_id}", response_model=ContactResponse, dependencies=[Depends(RateLimiter(times=1, seconds=10))],
+
+@router.post("/bulk/delete", response_model=ContactBulkResult, dependencies=[Depends(RateLimit("contacts:bulk"))],
+             description='Delete up to 1000 contacts, or every contact matching a filter, in one statement. '
+                         'One request per 10 seconds, shared with bulk update')
+async def bulk_delete_contacts(body: ContactSelection, db: AsyncSession = Depends(get_db),
+                               current_user: User = Depends(auth_service.get_current_user)):
+    deleted = await repository_contacts.bulk_delete_contacts(db, current_user.id, body.ids, body.filter)
+    return bulk_outcomes(body.ids, deleted, "deleted")
+
+
+@router.get("/autocomplete", response_model=List[ContactSuggestion],
+            description='Name prefix suggestions served from an in-process index, not rate limited')
+async def autocomplete_contacts(q: str = Query(..., min_length=1, max_length=50), limit: int = Query(10, ge=1, le=50),
+                                db: AsyncSession = Depends(get_db),
+                                current_user: User = Depends(auth_service.get_current_user)):
+    return await autocomplete_service.search(db, current_user.id, q, limit)
+
+
+@router.get("/search", response_model=List[ContactResponse], dependencies=[Depends(RateLimit("contacts:search"))],
+            description='Ranked, typo-tolerant search over names, email, phone and notes')
+async def search_contacts(filters: ContactFilter = Depends(), db: AsyncSession = Depends(get_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    if not filters.search or not filters.search.strip():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Search query is empty")
+    return await repository_contacts.full_text_search(db, current_user.id, filters.search, filters.limit, filters.skip)
+
+
+@router.get("/", response_model=ContactList, dependencies=[Depends(RateLimit("contacts:list"))],
+            description='One request per 10 seconds. Pass next_cursor back as cursor to get the next page')
+async def read_contacts(response: Response, skip: int = 0, limit: int = Query(100, ge=1, le=1000),
+                        cursor: Optional[str] = None, if_none_match: Optional[str] = Header(None),
+                        if_modified_since: Optional[str] = Header(None), db: AsyncSession = Depends(get_db),
+                        current_user: User = Depends(auth_service.get_current_user)):
+    version, updated_at = await repository_contacts.get_contacts_version(db, current_user.id)
+    page = hashlib.sha256(f"{skip}:{limit}:{cursor}".encode()).hexdigest()[:16]
+    headers = {"ETag": f'"{current_user.id}-{version}-{page}"', "Cache-Control": PRIVATE_REVALIDATE}
+    if updated_at:
+        headers["Last-Modified"] = http_date(updated_at)
+    if not_modified(if_none_match, if_modified_since, headers["ETag"], updated_at):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+
+    after_id = None
+    if cursor:
+        try:
+            owner_id, after_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        if owner_id != current_user.id:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    fast = settings.fast_list_responses
+    contacts, last_id = await repository_contacts.get_contacts_page(db, current_user.id, limit, after_id, skip,
+                                                                    as_rows=fast)
+    total = await repository_contacts.count_contacts(db, current_user.id)
+    next_cursor = encode_cursor(current_user.id, last_id) if last_id is not None else None
+    page = {"contacts": contacts, "total": total, "next_cursor": next_cursor}
+    # a returned Response skips response_model validation, and the headers set on ``response`` with it
+    return ORJSONResponse(page, headers=headers) if fast else page
+
+
+@router.get("/{contact_id}", response_model=ContactResponse, dependencies=[Depends(RateLimit("contacts:read"))],
             description='One request per 10 seconds')
-def read_contact(contact_id: int, db: Session = Depends(get_db),
-                 current_user: User = Depends(auth_service.get_current_user)):
-    db_contact = db.query(Contact).filter(Contact.id == contact_id).first()
+async def read_contact(contact_id: int, response: Response, if_none_match: Optional[str] = Header(None),
+                       if_modified_since: Optional[str] = Header(None), db: AsyncSession = Depends(get_db),
+                       current_user: User = Depends(auth_service.get_current_user)):
+    # one owner-scoped read: someone else's contact is a 404 whatever validators the request sends
+    db_contact = await repository_contacts.get_contact(contact_id, db, current_user.id)
     if not db_contact:
         raise HTTPException(status_code=404, detail="Contact not found!")
+    updated_at = db_contact.updated_at
+    headers = {"ETag": f'"{contact_id}-{updated_at:%Y%m%d%H%M%S%f}"' if updated_at else f'"{contact_id}"',
+               "Cache-Control": PRIVATE_REVALIDATE}
+    if updated_at:
+        headers["Last-Modified"] = http_date(updated_at)
+    if not_modified(if_none_match, if_modified_since, headers["ETag"], updated_at):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
     return db_contact
 
 
-@router.put("/{contact_id}", response_model=ContactResponse, dependencies=[Depends(RateLimiter(times=1, seconds=10))],
+@router.put("/{contact_id}", response_model=ContactResponse, dependencies=[Depends(RateLimit("contacts:update"))],
             description='One request per 10 seconds')
-def update_contact(contact_id: int, contact: ContactUpdate, db: Session = Depends(get_db),
-                   current_user: User = Depends(auth_service.get_current_user)):
-    db_contact = db.query(Contact).filter(Contact.id == contact_id).first()
+async def update_contact(contact_id: int, contact: ContactUpdate, db: AsyncSession = Depends(get_db),
+                         current_user: User = Depends(auth_service.get_current_user)):
+    db_contact = await repository_contacts.get_contact(contact_id, db, current_user.id)
     if not db_contact:
         raise HTTPException(status_code=404, detail="Contact not found!")
     for var, value in vars(contact).items():
         if value is not None:
             setattr(db_contact, var, value)
-    db.commit()
-    db.refresh(db_contact)
+    await repository_contacts.record_contacts_change(db, current_user.id)
+    await db.commit()
+    await db.refresh(db_contact)
+    autocomplete_service.contact_saved(db_contact)
     return db_contact
 
 
-@router.delete("/{contact_id}", dependencies=[Depends(RateLimiter(times=1, seconds=10))],
+@router.delete("/{contact_id}", dependencies=[Depends(RateLimit("contacts:delete"))],
                description='One request per 10 seconds')
-def delete_contact(contact_id: int, db: Session = Depends(get_db),
-                   current_user: User = Depends(auth_service.get_current_user)):
-    db_contact = db.query(Contact).filter(Contact.id == contact_id).first()
+async def delete_contact(contact_id: int, db: AsyncSession = Depends(get_db),
+                         current_user: User = Depends(auth_service.get_current_user)):
+    db_contact = await repository_contacts.get_contact(contact_id, db, current_user.id)
     if not db_contact:
         raise HTTPException(status_code=404, detail="Contact not found!")
-    db.delete(db_contact)
-    db.commit()
+    await db.delete(db_contact)
+    await repository_contacts.record_contacts_change(db, current_user.id, -1)
+    await db.commit()
+    autocomplete_service.contact_deleted(db_contact)
     return {"message": "Contact deleted"}
 
 
 @router.get('/birthdays/{days}', response_model=List[ContactResponse],
-            dependencies=[Depends(RateLimiter(times=1, seconds=1))])
-async def upcoming_birthdays_list(days: int, db: Session = Depends(get_db),
+            dependencies=[Depends(RateLimit("contacts:birthdays"))])
+async def upcoming_birthdays_list(days: int = Path(..., ge=0), db: AsyncSession = Depends(get_db),
                                   current_user: User = Depends(auth_service.get_current_user)):
-    birthdays = await repository_contacts.search_birthday_contact(owner_id=current_user.id, db=db, days=days)
+    fast = settings.fast_list_responses
+    birthdays = await repository_contacts.search_birthday_contact(owner_id=current_user.id, db=db, days=days,
+                                                                  as_rows=fast)
     if len(birthdays) == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f'There are no birthdays')
-    return birthdays
+    return ORJSONResponse(birthdays) if fast else birthdays
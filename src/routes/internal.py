@@ -0,0 +1,61 @@
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+
+from src.conf.config import settings
+from src.database.db import engine
+from src.database.pool import get_pool_status
+from src.services.avatar_cache import avatar_cache
+from src.services.password_hasher import password_hasher
+from src.services.rate_limit import rate_limiter
+from src.services.token_cache import token_cache
+from src.services.user_cache import user_cache_service
+
+
+async def require_internal_token(x_internal_token: Optional[str] = Header(None)):
+    """
+    Admits requests carrying the ``internal_token`` setting in the X-Internal-Token header.
+
+    The endpoints are mounted on the public app, so with no token configured they are refused to everyone.
+
+    :param x_internal_token: The X-Internal-Token request header.
+    :type x_internal_token: str | None
+    """
+    if not settings.internal_token or x_internal_token is None \
+            or not secrets.compare_digest(x_internal_token.encode(), settings.internal_token.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+
+
+router = APIRouter(prefix='/internal', tags=['internal'], include_in_schema=False,
+                   dependencies=[Depends(require_internal_token)])
+
+
+@router.get('/db/pool')
+async def db_pool_status():
+    return get_pool_status(engine.pool)
+
+
+@router.get('/auth/cache')
+async def auth_cache_stats():
+    return user_cache_service.stats()
+
+
+@router.get('/auth/tokens')
+async def auth_token_cache_stats():
+    return token_cache.stats()
+
+
+@router.get('/auth/hasher')
+async def password_hasher_stats():
+    return password_hasher.stats()
+
+
+@router.get('/avatars/cache')
+async def avatar_cache_stats():
+    return avatar_cache.stats()
+
+
+@router.get('/rate_limit')
+async def rate_limit_stats():
+    return rate_limiter.stats()
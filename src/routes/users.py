@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Depends, status, UploadFile, File
-from sqlalchemy.orm import Session
-import cloudinary
-import cloudinary.uploader
+from typing import Optional
+
+import httpx
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status, UploadFile, File
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
 from src.database.models import User
 from src.repository import users as repository_users
 from src.services.auth import auth_service
+from src.services.avatar_cache import PinnedFileResponse, avatar_cache, variant_version
+from src.services.http_cache import IMMUTABLE, REVALIDATE, etag_matches
 from src.services.upload_avatar import UploadService
 from src.conf.config import settings
 from src.schemas import UserResponse
@@ -21,11 +25,35 @@ async def read_users_me(current_user: User = Depends(auth_service.get_current_us
 
 @router.patch('/avatar', response_model=UserResponse)
 async def update_avatar_user(file: UploadFile = File(), current_user: User = Depends(auth_service.get_current_user),
-                             db: Session = Depends(get_db)):
-    public_id = UploadService.create_name_avatar(current_user.email, "contacts_base")
-
-    r = UploadService.upload(file.file, public_id)
-
-    src_url = UploadService.get_url_avatar(public_id, r.get('version'))
+                             db: AsyncSession = Depends(get_db)):
+    src_url = await UploadService.upload_avatar(file, current_user.email)
     user = await repository_users.update_avatar(current_user.email, src_url, db)
-    return user
+    return {"user": user, "detail": "Avatar updated"}
+
+
+@router.get('/{user_id}/avatar', response_class=FileResponse)
+async def read_avatar(user_id: int, request: Request, size: int = Query(250), v: Optional[str] = None,
+                      if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_db)):
+    if size not in settings.avatar_variant_sizes:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Size must be one of {settings.avatar_variant_sizes}")
+    user = await repository_users.get_user_by_id(user_id, db)
+    if user is None or not user.avatar:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Avatar not found")
+
+    version = variant_version(user.avatar, size)
+    headers = {
+        "ETag": f'"{version}"',
+        # the versioned URL never changes content; the bare one has to be revalidated
+        "Cache-Control": IMMUTABLE if v == version else REVALIDATE,
+        "Content-Location": f"{request.url.path}?size={size}&v={version}",
+    }
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    try:
+        path = await avatar_cache.get(user.avatar, size, pin=True)
+    except httpx.HTTPError:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Avatar source unavailable")
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Avatar not found")
+    return PinnedFileResponse(avatar_cache, path, media_type="image/jpeg", headers=headers)
@@ -1,6 +1,6 @@
 from datetime import date, datetime
 from typing import List, Optional
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, conlist, root_validator
 
 
 class ContactBase(BaseModel):
@@ -16,6 +16,10 @@ class ContactCreate(ContactBase):
     pass
 
 
+class ContactUpsert(ContactBase):
+    email: EmailStr
+
+
 class ContactUpdate(ContactBase):
     id: int
 
@@ -30,6 +34,13 @@ class Contact(ContactBase):
 class ContactList(BaseModel):
     contacts: List[Contact]
     total: int
+    next_cursor: Optional[str] = None
+
+
+class ContactSuggestion(BaseModel):
+    id: int
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
 
 
 class ContactFilter(BaseModel):
@@ -38,6 +49,59 @@ class ContactFilter(BaseModel):
     limit: int = 100
 
 
+class ContactMatch(BaseModel):
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    email: Optional[str] = None
+
+    @root_validator
+    def not_empty(cls, values):
+        if not any(value is not None for value in values.values()):
+            raise ValueError("filter must set at least one field")
+        return values
+
+
+class ContactSelection(BaseModel):
+    """The owner's contacts to act on: listed by id, or every contact matching ``filter``."""
+    ids: Optional[conlist(int, min_items=1, max_items=1000)] = None
+    filter: Optional[ContactMatch] = None
+
+    @root_validator
+    def ids_or_filter(cls, values):
+        if (values.get("ids") is None) == (values.get("filter") is None):
+            raise ValueError("pass either ids or filter")
+        return values
+
+
+class ContactChanges(BaseModel):
+    # no email: it is unique per contact, so it cannot be set on many at once
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    phone: Optional[str] = None
+    birthday: Optional[date] = None
+    notes: Optional[str] = None
+
+    @root_validator
+    def not_empty(cls, values):
+        if not any(value is not None for value in values.values()):
+            raise ValueError("changes must set at least one field")
+        return values
+
+
+class ContactBulkUpdate(ContactSelection):
+    changes: ContactChanges
+
+
+class ContactOutcome(BaseModel):
+    id: int
+    status: str
+
+
+class ContactBulkResult(BaseModel):
+    matched: int
+    results: List[ContactOutcome]
+
+
 class ContactResponse(ContactBase):
     id: int
 
@@ -55,7 +119,8 @@ class UserDb(BaseModel):
     id: int
     username: str
     email: str
-    avatar: str
+    avatar: Optional[str] = None
+    confirmed: bool = False
 
     class Config:
         orm_mode = True
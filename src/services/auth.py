@@ -1,31 +1,36 @@
-import pickle
 from typing import Optional
 
 from jose import JWTError, jwt
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
-import redis
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
 from src.repository import users as repository_users
 from src.conf.config import settings
+from src.schemas import UserDb
+from src.services.password_hasher import password_hasher
+from src.services.token_cache import token_cache, token_digest
+from src.services.user_cache import user_cache_service
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    hasher = password_hasher
     SECRET_KEY = settings.secret_key
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-    r = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
 
-    def verify_password(self, plain_password, hashed_password):
-        return self.pwd_context.verify(plain_password, hashed_password)
+    async def verify_password(self, plain_password, hashed_password):
+        valid, _ = await self.hasher.verify_and_update(plain_password, hashed_password)
+        return valid
 
-    def get_password_hash(self, password: str):
-        return self.pwd_context.hash(password)
+    async def verify_and_update_password(self, plain_password, hashed_password):
+        # new_hash is set when the stored hash was made with other bcrypt cost settings
+        return await self.hasher.verify_and_update(plain_password, hashed_password)
+
+    async def get_password_hash(self, password: str):
+        return await self.hasher.hash(password)
 
     # define a function to generate a new access token
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
@@ -59,33 +64,52 @@ class Auth:
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    async def decode_access_token(self, token: str) -> dict:
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+        # a token already verified by this worker skips the signature check until it expires
+        digest = token_digest(token)
+        payload = token_cache.get(digest)
+        if payload is not None:
+            return payload
         try:
             # Decode JWT
             payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload['scope'] == 'access_token':
-                email = payload["sub"]
-                if email is None:
-                    raise credentials_exception
-            else:
-                raise credentials_exception
-        except JWTError as e:
+        except JWTError:
             raise credentials_exception
-        user = self.r.get(f"user:{email}")
+        if payload.get('scope') != 'access_token' or payload.get('sub') is None:
+            raise credentials_exception
+        revoked = await token_cache.is_revoked(digest)
+        if revoked:
+            raise credentials_exception
+        # unknown while Redis is unavailable: accepted, but checked again on the next request
+        if revoked is not None:
+            token_cache.set(digest, payload)
+        return payload
+
+    async def revoke_access_token(self, token: str):
+        payload = await self.decode_access_token(token)
+        await token_cache.revoke(token_digest(token), payload["exp"])
+
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+        credentials_exception = HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+        email = (await self.decode_access_token(token))["sub"]
+        user = await user_cache_service.get(email)
         if user is None:
-            user = await repository_users.get_user_by_email(email, db)
-            if user is None:
+            db_user = await repository_users.get_user_by_email(email, db)
+            if db_user is None:
                 raise credentials_exception
-            self.r.set(f"user:{email}", pickle.dumps(user))
-            self.r.expire(f"user:{email}", 900)
-        else:
-            user = pickle.loads(user)
+            user = UserDb.from_orm(db_user)
+            await user_cache_service.set(user)
         return user
 
     def create_email_token(self, data: dict):
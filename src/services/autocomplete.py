@@ -0,0 +1,165 @@
+import asyncio
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database.models import Contact
+
+# owners with more contacts have their index built in a worker thread rather than on the event loop
+INLINE_BUILD_ROWS = 2000
+
+
+def normalize(value: Optional[str]) -> str:
+    value = unicodedata.normalize("NFKD", value or "")
+    return " ".join("".join(ch for ch in value if not unicodedata.combining(ch)).casefold().split())
+
+
+class OwnerNameIndex:
+    """Sorted array of (normalized name, contact id) for one owner, searched with bisect."""
+
+    def __init__(self):
+        self.keys: List[Tuple[str, int]] = []
+        self.names: Dict[int, Tuple[str, str]] = {}
+        self.built_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def build(cls, rows) -> "OwnerNameIndex":
+        """Index of ``(contact id, first name, last name)`` rows, sorted once rather than insorted per key."""
+        index = cls()
+        for contact_id, first_name, last_name in rows:
+            index.names[contact_id] = (first_name, last_name)
+            index.keys.extend((key, contact_id) for key in cls._keys_for(first_name, last_name))
+        index.keys.sort()
+        return index
+
+    @staticmethod
+    def _keys_for(first_name: str, last_name: str) -> set:
+        first, last = normalize(first_name), normalize(last_name)
+        return {key for key in (first, last, f"{first} {last}".strip()) if key}
+
+    def add(self, contact_id: int, first_name: str, last_name: str):
+        self.remove(contact_id)
+        self.names[contact_id] = (first_name, last_name)
+        for key in self._keys_for(first_name, last_name):
+            insort(self.keys, (key, contact_id))
+
+    def remove(self, contact_id: int):
+        names = self.names.pop(contact_id, None)
+        if names is None:
+            return
+        for key in self._keys_for(*names):
+            i = bisect_left(self.keys, (key, contact_id))
+            if i < len(self.keys) and self.keys[i] == (key, contact_id):
+                del self.keys[i]
+
+    def search(self, prefix: str, limit: int) -> List[dict]:
+        prefix = normalize(prefix)
+        found = {}
+        i = bisect_left(self.keys, (prefix,))
+        while i < len(self.keys) and len(found) < limit:
+            key, contact_id = self.keys[i]
+            if not key.startswith(prefix):
+                break
+            if contact_id not in found:
+                first_name, last_name = self.names[contact_id]
+                found[contact_id] = {"id": contact_id, "first_name": first_name, "last_name": last_name}
+            i += 1
+        return list(found.values())
+
+
+class AutocompleteService:
+    """Per-owner name indexes built lazily from the contacts table, LRU-evicted by total entry count.
+
+    Writes in this process are applied incrementally; writes made by other workers are
+    picked up when the owner's index is rebuilt after ``autocomplete_ttl`` seconds.
+    """
+
+    def __init__(self, max_entries: int = None, ttl: float = None):
+        self.max_entries = max_entries if max_entries is not None else settings.autocomplete_max_entries
+        self.ttl = ttl if ttl is not None else settings.autocomplete_ttl
+        self.indexes: "OrderedDict[int, OwnerNameIndex]" = OrderedDict()
+        self.entries = 0
+        # one buffer per build in progress, so concurrent builds for an owner each see every write
+        self._building: Dict[int, List[list]] = {}
+
+    def clear(self):
+        self.indexes.clear()
+        self.entries = 0
+        self._building.clear()
+
+    async def search(self, db: AsyncSession, owner_id: int, prefix: str, limit: int = 10) -> List[dict]:
+        index = await self._get_index(db, owner_id)
+        return index.search(prefix, limit)
+
+    async def _get_index(self, db: AsyncSession, owner_id: int) -> OwnerNameIndex:
+        index = self.indexes.get(owner_id)
+        if index is not None and time.monotonic() - index.built_at < self.ttl:
+            self.indexes.move_to_end(owner_id)
+            return index
+        pending = []
+        self._building.setdefault(owner_id, []).append(pending)
+        try:
+            rows = (await db.execute(select(Contact.id, Contact.first_name, Contact.last_name)
+                                     .filter(Contact.owner_id == owner_id))).all()
+            if len(rows) < INLINE_BUILD_ROWS:
+                index = OwnerNameIndex.build(rows)
+            else:
+                index = await asyncio.get_running_loop().run_in_executor(None, OwnerNameIndex.build, rows)
+            # writes committed while the snapshot was loading
+            for op, args in pending:
+                if op != "invalidate":
+                    getattr(index, op)(*args)
+        finally:
+            # by identity: buffers of concurrent builds compare equal while empty
+            builds = [buffer for buffer in self._building[owner_id] if buffer is not pending]
+            if builds:
+                self._building[owner_id] = builds
+            else:
+                del self._building[owner_id]
+        if ("invalidate", ()) not in pending:
+            self._store(owner_id, index)
+        return index
+
+    def _store(self, owner_id: int, index: OwnerNameIndex):
+        old = self.indexes.pop(owner_id, None)
+        if old is not None:
+            self.entries -= len(old)
+        self.indexes[owner_id] = index
+        self.entries += len(index)
+        while self.entries > self.max_entries and len(self.indexes) > 1:
+            _, evicted = self.indexes.popitem(last=False)
+            self.entries -= len(evicted)
+
+    def _apply(self, owner_id: int, op: str, *args):
+        for pending in self._building.get(owner_id, ()):
+            pending.append((op, args))
+        index = self.indexes.get(owner_id)
+        if index is not None:
+            before = len(index)
+            getattr(index, op)(*args)
+            self.entries += len(index) - before
+
+    def contact_saved(self, contact: Contact):
+        self._apply(contact.owner_id, "add", contact.id, contact.first_name, contact.last_name)
+
+    def contact_deleted(self, contact: Contact):
+        self._apply(contact.owner_id, "remove", contact.id)
+
+    def invalidate(self, owner_id: int):
+        for pending in self._building.get(owner_id, ()):
+            pending.append(("invalidate", ()))
+        index = self.indexes.pop(owner_id, None)
+        if index is not None:
+            self.entries -= len(index)
+
+
+autocomplete_service = AutocompleteService()
@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+from fastapi.responses import FileResponse
+
+from src.conf.config import settings
+from src.services.upload_avatar import UploadService, resize_image
+
+# bump when resize_image output changes, so cached variants and ETags are replaced
+VARIANT_VERSION = 1
+
+
+def variant_version(url: str, size: int) -> str:
+    return hashlib.sha256(f"{VARIANT_VERSION}|{size}|{url}".encode()).hexdigest()[:32]
+
+
+class AvatarCache:
+    """Avatar variants generated on first request and kept on disk.
+
+    Files are evicted least recently used first once they take more than ``max_bytes``;
+    originals fetched from remote storage are cached alongside and count towards the limit.
+    A variant returned with ``pin=True`` is not evicted until it is released, so it cannot
+    disappear between the lookup and the response opening the file.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.transport = transport
+        self.files: "OrderedDict[str, int]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.pins: Dict[str, int] = {}
+        # per-name lock and the number of coroutines holding or waiting for it
+        self._locks: Dict[str, List] = {}
+        self._load()
+
+    def _load(self):
+        # after a restart, modification time stands in for last use
+        if not self.directory.is_dir():
+            return
+        for path in sorted(self.directory.iterdir(), key=lambda p: p.stat().st_mtime):
+            if path.suffix in (".jpg", ".src"):
+                self._add(path.name, path.stat().st_size)
+            else:
+                path.unlink(missing_ok=True)
+
+    def _add(self, name: str, size: int):
+        # a name can be stored again, e.g. an original re-fetched after its variants were evicted
+        self.total_bytes += size - self.files.pop(name, 0)
+        self.files[name] = size
+        if self.total_bytes > self.max_bytes:
+            self._evict(keep=name)
+
+    def _evict(self, keep: Optional[str] = None):
+        for evicted in list(self.files):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if evicted == keep or evicted in self.pins:
+                continue
+            self.total_bytes -= self.files.pop(evicted)
+            self.evictions += 1
+            (self.directory / evicted).unlink(missing_ok=True)
+
+    def _touch(self, name: str) -> bool:
+        if name not in self.files:
+            return False
+        self.files.move_to_end(name)
+        return True
+
+    async def get(self, url: str, size: int, pin: bool = False) -> Path:
+        """Path of the variant, generated on a miss; with ``pin`` it is kept until ``release``."""
+        name = f"{variant_version(url, size)}.jpg"
+        if self._touch(name):
+            self.hits += 1
+        else:
+            # concurrent requests for the same variant wait for a single generation
+            async with self._locked(name):
+                if self._touch(name):
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                    await self._generate(url, name, size)
+        if pin:
+            self._pin(name)
+        return self.directory / name
+
+    @asynccontextmanager
+    async def _locked(self, name: str):
+        entry = self._locks.setdefault(name, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            # dropped only once nobody waits on it, or a newcomer would generate alongside a waiter
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[name]
+
+    async def _generate(self, url: str, name: str, size: int):
+        source = UploadService.storage.local_path(url)
+        if source is not None:
+            self._add(name, await self._run(self._resize, source, name, size))
+            return
+        source = await self._download(url)
+        # the original must outlive the resize, whatever other requests add meanwhile
+        self._pin(source.name)
+        try:
+            resized = await self._run(self._resize, source, name, size)
+        finally:
+            self._unpin(source.name)
+        self._add(name, resized)
+
+    def _pin(self, name: str):
+        self.pins[name] = self.pins.get(name, 0) + 1
+
+    def _unpin(self, name: str):
+        pins = self.pins.pop(name, 0) - 1
+        if pins > 0:
+            self.pins[name] = pins
+
+    def release(self, path: Path):
+        self._unpin(Path(path).name)
+        if self.total_bytes > self.max_bytes:
+            self._evict()
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(UploadService.executor, func, *args)
+
+    # _resize and _store run in the executor; the bookkeeping in _add stays on the event loop
+    def _resize(self, source: Path, name: str, size: int) -> int:
+        target = self.directory / name
+        tmp = target.with_suffix(".tmp")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        resize_image(source, tmp, size)
+        os.replace(tmp, target)
+        return target.stat().st_size
+
+    async def _download(self, url: str) -> Path:
+        name = f"{hashlib.sha256(url.encode()).hexdigest()[:32]}.src"
+        # different sizes of one avatar share the original, so it is fetched once for all of them
+        async with self._locked(name):
+            if not self._touch(name):
+                self._add(name, await self._run(self._store, name, await self._fetch(url)))
+        return self.directory / name
+
+    async def _fetch(self, url: str) -> bytes:
+        limit = settings.avatar_max_bytes
+        chunks = []
+        received = 0
+        async with httpx.AsyncClient(transport=self.transport, timeout=10, follow_redirects=True) as client:
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+                if int(response.headers.get("Content-Length") or 0) > limit:
+                    raise ValueError("Image is too large")
+                # the declared length may be missing or wrong, so the body is counted as it arrives
+                async for chunk in response.aiter_bytes():
+                    received += len(chunk)
+                    if received > limit:
+                        raise ValueError("Image is too large")
+                    chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _store(self, name: str, content: bytes) -> int:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = (self.directory / name).with_suffix(".tmp")
+        tmp.write_bytes(content)
+        os.replace(tmp, self.directory / name)
+        return len(content)
+
+    def stats(self) -> dict:
+        return {"files": len(self.files), "bytes": self.total_bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class PinnedFileResponse(FileResponse):
+    """FileResponse for a variant got with ``pin=True``, released once it is sent or the send fails."""
+
+    def __init__(self, cache: AvatarCache, path: Path, **kwargs):
+        super().__init__(path, **kwargs)
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.cache.release(self.path)
+
+
+avatar_cache = AvatarCache(settings.avatar_cache_dir, settings.avatar_cache_max_bytes)
@@ -0,0 +1,32 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.repository import contacts as repository_contacts
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def rows_to_ndjson(rows: List[dict]) -> str:
+    return "".join(json.dumps(dict(row), default=str) + "\n" for row in rows)
+
+
+def rows_to_csv(rows: List[dict], header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(repository_contacts.EXPORT_COLUMNS)
+    writer.writerows([row[name] for name in repository_contacts.EXPORT_COLUMNS] for row in rows)
+    return buffer.getvalue()
+
+
+async def export_contacts(fmt: str, db: AsyncSession, owner_id: int, batch_size: int = None) -> AsyncIterator[str]:
+    batch_size = batch_size or settings.export_batch_size
+    if fmt == "csv":
+        yield rows_to_csv([], header=True)
+    async for rows in repository_contacts.stream_contacts(db, owner_id, batch_size):
+        yield rows_to_csv(rows) if fmt == "csv" else rows_to_ndjson(rows)
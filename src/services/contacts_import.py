@@ -0,0 +1,161 @@
+import csv
+import json
+from collections import deque
+from typing import AsyncIterator, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import String
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database.models import Contact
+from src.repository import contacts as repository_contacts
+from src.schemas import ContactCreate
+
+IMPORT_FORMATS = ("ndjson", "csv")
+# one value over its column's length would fail the whole batch INSERT on Postgres
+COLUMN_LENGTHS = {column.name: column.type.length for column in Contact.__table__.columns
+                  if isinstance(column.type, String) and column.type.length}
+
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, str]]:
+    buffer = b""
+    line_no = 0
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            yield line_no, _decode(line, line_no)
+    if buffer:
+        line_no += 1
+        yield line_no, _decode(buffer, line_no)
+
+
+def _decode(line: bytes, line_no: int) -> str:
+    return line.decode("utf-8-sig" if line_no == 1 else "utf-8", errors="replace").rstrip("\r")
+
+
+class _PendingLines:
+    """The lines of one CSV record, handed to a long-lived csv.reader as it asks for them."""
+
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+async def iter_csv_rows(stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, List[str] | None, str | None]]:
+    """
+    Parses CSV with one reader for the whole stream, so quoted fields may span lines.
+
+    Lines are held back until their quotes balance, which is when a record is complete in RFC 4180 CSV;
+    rows are numbered by the line they start on.
+    """
+    pending = _PendingLines()
+    reader = csv.reader(pending)
+    record: List[str] = []
+    start = quotes = 0
+    async for line_no, line in iter_lines(stream):
+        if not record:
+            if not line.strip():
+                continue
+            start = line_no
+        record.append(line + "\n")
+        quotes += line.count('"')
+        if quotes % 2:
+            continue
+        pending.lines.extend(record)
+        record, quotes = [], 0
+        try:
+            yield start, next(reader), None
+        except csv.Error as err:
+            pending.lines.clear()
+            yield start, None, f"Invalid CSV: {err}"
+    if record:
+        yield start, None, "Invalid CSV: unterminated quoted field"
+
+
+async def iter_records(stream: AsyncIterator[bytes], fmt: str) -> AsyncIterator[Tuple[int, dict | None, str | None]]:
+    if fmt == "csv":
+        header = None
+        async for line_no, values, error in iter_csv_rows(stream):
+            if error is not None:
+                yield line_no, None, error
+            elif header is None:
+                header = [name.strip() for name in values]
+            elif len(values) != len(header):
+                yield line_no, None, f"Expected {len(header)} columns, got {len(values)}"
+            else:
+                yield line_no, {name: value or None for name, value in zip(header, values)}, None
+        return
+    async for line_no, line in iter_lines(stream):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as err:
+            yield line_no, None, f"Invalid JSON: {err}"
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, "Expected a JSON object"
+            continue
+        yield line_no, record, None
+
+
+def too_long(row: dict) -> str | None:
+    return "; ".join(f"{name}: ensure this value has at most {length} characters"
+                     for name, length in COLUMN_LENGTHS.items()
+                     if isinstance(row.get(name), str) and len(row[name]) > length) or None
+
+
+async def import_contacts(stream: AsyncIterator[bytes], fmt: str, db: AsyncSession, owner_id: int,
+                          batch_size: int = None) -> dict:
+    batch_size = batch_size or settings.import_batch_size
+    summary = {"received": 0, "inserted": 0, "duplicates": 0, "invalid": 0, "batches": []}
+    rows: List[dict] = []
+    errors: List[dict] = []
+    received = 0
+
+    async def flush():
+        nonlocal rows, errors, received
+        inserted = await repository_contacts.insert_contacts(rows, db, owner_id) if rows else 0
+        report = {
+            "batch": len(summary["batches"]) + 1,
+            "received": received,
+            "inserted": inserted,
+            "duplicates": len(rows) - inserted,
+            "invalid": len(errors),
+            "errors": errors[:settings.import_max_errors],
+        }
+        summary["batches"].append(report)
+        summary["received"] += received
+        summary["inserted"] += inserted
+        summary["duplicates"] += report["duplicates"]
+        summary["invalid"] += len(errors)
+        rows, errors, received = [], [], 0
+
+    async for line_no, record, error in iter_records(stream, fmt):
+        received += 1
+        if error is None:
+            try:
+                row = ContactCreate(**record).dict()
+            except ValidationError as err:
+                error = "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in err.errors())
+            else:
+                error = too_long(row)
+                if error is None:
+                    rows.append(row)
+        if error is not None:
+            errors.append({"line": line_no, "error": error})
+        if received >= batch_size:
+            await flush()
+    if received or not summary["batches"]:
+        await flush()
+    return summary
@@ -1,39 +1,40 @@
+from email.message import EmailMessage
+from email.utils import formataddr
 from pathlib import Path
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+from jinja2 import Environment, FileSystemLoader, select_autoescape
 from pydantic import EmailStr
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.services.auth import auth_service
 from src.conf.config import settings
+from src.database.models import EmailOutbox
+from src.repository import emails as repository_emails
+from src.services.auth import auth_service
+
+TEMPLATE_FOLDER = Path(__file__).parent / 'templates'
+
+environment = Environment(loader=FileSystemLoader(TEMPLATE_FOLDER), autoescape=select_autoescape())
+# compiled once at import instead of on every message
+templates = {path.name: environment.get_template(path.name) for path in TEMPLATE_FOLDER.glob("*.html")}
+
+
+def render_email(email: EmailOutbox) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = formataddr((settings.mail_from_name, settings.mail_from))
+    message["To"] = email.recipient
+    message["Subject"] = email.subject
+    message.set_content(templates[email.template].render(**email.context), subtype="html")
+    return message
+
 
+async def send_email(email: EmailStr, username: str, host: str, db: AsyncSession,
+                     commit: bool = True) -> EmailOutbox:
+    """Queues the confirmation email in the outbox; src.services.email_dispatcher delivers it.
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=EmailStr(settings.mail_from),
-    MAIL_PORT=settings.mail_port,
-    MAIL_SERVER=settings.mail_server,
-    MAIL_FROM_NAME="From name",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
-)
-
-
-async def send_email(email: EmailStr, username: str, host: str):
-    try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email!",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
-
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
-    except ConnectionErrors as err:
-        print(err)
+    With ``commit=False`` the row joins the session's open transaction and is committed by the caller.
+    """
+    token_verification = auth_service.create_email_token({"sub": email})
+    return await repository_emails.enqueue_email(
+        email, "Confirm your email!", "email_template.html",
+        {"host": host, "username": username, "token": token_verification}, db, commit=commit,
+    )
@@ -0,0 +1,169 @@
+"""Delivers the email outbox: ``python -m src.services.email_dispatcher``.
+
+Runs as its own process, next to the API workers. Due messages are claimed in
+batches, split across a pool of SMTP connections that stay open between
+batches, and retried with exponential backoff when delivery fails.
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+import aiosmtplib
+from aiosmtplib import SMTPException, SMTPRecipientsRefused, SMTPResponseException, SMTPServerDisconnected
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.conf.config import settings
+from src.database.db import SessionLocal, engine
+from src.database.models import EmailOutbox
+from src.repository import emails as repository_emails
+from src.services.email import render_email
+
+logger = logging.getLogger(__name__)
+
+
+def smtp_factory() -> aiosmtplib.SMTP:
+    credentials = settings.mail_use_credentials
+    return aiosmtplib.SMTP(
+        hostname=settings.mail_server,
+        port=settings.mail_port,
+        username=settings.mail_username if credentials else None,
+        password=settings.mail_password if credentials else None,
+        use_tls=settings.mail_ssl_tls,
+        start_tls=settings.mail_starttls,
+        timeout=settings.mail_timeout,
+    )
+
+
+class SMTPPool:
+    """Up to ``size`` SMTP connections, opened on first use and kept open between batches."""
+
+    def __init__(self, size: int, factory: Callable[[], aiosmtplib.SMTP] = smtp_factory):
+        self.size = size
+        self._idle = asyncio.LifoQueue()
+        for _ in range(size):
+            self._idle.put_nowait(factory())
+
+    @asynccontextmanager
+    async def connection(self):
+        smtp = await self._idle.get()
+        try:
+            if not smtp.is_connected:
+                await smtp.connect()
+            yield smtp
+        except (SMTPException, OSError, asyncio.TimeoutError):
+            # reconnect on next use rather than reuse a connection in an unknown state
+            smtp.close()
+            raise
+        finally:
+            self._idle.put_nowait(smtp)
+
+    async def close(self):
+        while not self._idle.empty():
+            smtp = self._idle.get_nowait()
+            if smtp.is_connected:
+                try:
+                    await smtp.quit()
+                except (SMTPException, OSError, asyncio.TimeoutError):
+                    smtp.close()
+
+
+class EmailDispatcher:
+    def __init__(self, session_local: async_sessionmaker, pool: SMTPPool,
+                 batch_size: int = settings.email_batch_size, lease: int = settings.email_lease,
+                 max_attempts: int = settings.email_max_attempts, retry_base: float = settings.email_retry_base,
+                 retry_max: float = settings.email_retry_max):
+        self.session_local = session_local
+        self.pool = pool
+        self.batch_size = batch_size
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+
+    def retry_at(self, email: EmailOutbox, error: Exception) -> Optional[datetime]:
+        # a 5xx reply is permanent; anything else is retried until max_attempts
+        if isinstance(error, SMTPRecipientsRefused):
+            permanent = all(refused.code >= 500 for refused in error.recipients)
+        else:
+            permanent = isinstance(error, SMTPResponseException) and error.code >= 500
+        if permanent or email.attempts + 1 >= self.max_attempts:
+            return None
+        delay = min(self.retry_base * 2 ** email.attempts, self.retry_max)
+        return datetime.utcnow() + timedelta(seconds=delay)
+
+    async def _send_batch(self, emails: List[EmailOutbox]) -> Tuple[list, list]:
+        sent, failed = [], []
+        pending = list(emails)
+        try:
+            async with self.pool.connection() as smtp:
+                while pending:
+                    try:
+                        await self._send(smtp, pending[0])
+                        sent.append(pending[0])
+                    except (SMTPResponseException, SMTPRecipientsRefused) as err:
+                        # the server refused this message; the connection is still usable
+                        failed.append((pending[0], err))
+                    except (SMTPException, OSError, asyncio.TimeoutError):
+                        raise
+                    except Exception as err:  # noqa
+                        # a message that cannot be rendered or built is recorded like any other failure,
+                        # so it runs out of attempts instead of being claimed again after every lease
+                        failed.append((pending[0], err))
+                    pending.pop(0)
+        except (SMTPException, OSError, asyncio.TimeoutError) as err:
+            # the connection is gone: whatever was not attempted waits for a retry
+            failed.extend((email, err) for email in pending)
+        return sent, failed
+
+    @staticmethod
+    async def _send(smtp: aiosmtplib.SMTP, email: EmailOutbox):
+        message = render_email(email)
+        try:
+            await smtp.send_message(message)
+        except SMTPServerDisconnected:
+            # the server may have closed the connection while it sat idle between batches
+            smtp.close()
+            await smtp.connect()
+            await smtp.send_message(message)
+
+    async def drain_once(self) -> int:
+        async with self.session_local() as db:
+            emails = await repository_emails.claim_due_emails(db, self.batch_size, self.lease)
+            if not emails:
+                return 0
+            batches = [emails[i::self.pool.size] for i in range(self.pool.size)]
+            results = await asyncio.gather(*(self._send_batch(batch) for batch in batches if batch))
+            sent = [email for batch_sent, _ in results for email in batch_sent]
+            failed = [(email, repr(err), self.retry_at(email, err)) for _, batch_failed in results
+                      for email, err in batch_failed]
+            for email, error, retry_at in failed:
+                logger.warning("Email %s to %s failed (%s), %s", email.id, email.recipient, error,
+                               f"retrying at {retry_at}" if retry_at else "giving up")
+            await repository_emails.record_delivery(db, sent, failed)
+            return len(emails)
+
+    async def run(self, poll_interval: float = settings.email_poll_interval):
+        while True:
+            try:
+                claimed = await self.drain_once()
+            except Exception:  # noqa
+                logger.exception("Email outbox drain failed")
+                claimed = 0
+            if claimed < self.batch_size:
+                await asyncio.sleep(poll_interval)
+
+
+async def main():
+    pool = SMTPPool(settings.email_pool_size)
+    try:
+        await EmailDispatcher(SessionLocal, pool).run()
+    finally:
+        await pool.close()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
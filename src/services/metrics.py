@@ -0,0 +1,167 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+# seconds; Prometheus' default buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# queries per request
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # one slot per bucket plus +Inf; made cumulative only when rendered
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class RequestMetrics:
+    """Work done on behalf of one request, filled in by the engine and Redis hooks."""
+    __slots__ = ("scope", "db_queries", "db_seconds", "redis_calls", "redis_seconds", "shapes")
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.scope = scope if scope is not None else {}
+        # statement count per normalized SQL, for N+1 detection
+        self.shapes: Dict[str, int] = {}
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.redis_calls = 0
+        self.redis_seconds = 0.0
+
+
+current_request: ContextVar[Optional[RequestMetrics]] = ContextVar("current_request", default=None)
+
+
+def labels(**values) -> str:
+    return ",".join(f'{name}="{value}"' for name, value in values.items())
+
+
+class Metrics:
+    """Per-route request metrics, rendered in the Prometheus text exposition format.
+
+    Everything is plain counters updated on the event loop: no locks, and a few
+    dictionary lookups per request. Routes are labelled by their path template,
+    so label cardinality is bounded by the number of routes.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self.durations: Dict[Tuple[str, str], Histogram] = {}
+        self.responses: Dict[Tuple[str, str, int], int] = {}
+        self.db_queries: Dict[Tuple[str, str], Histogram] = {}
+        self.db_seconds: Dict[Tuple[str, str], Histogram] = {}
+        self.redis_calls: Dict[Tuple[str, str], int] = {}
+        self.redis_seconds: Dict[Tuple[str, str], float] = {}
+
+    def observe(self, method: str, route: str, status: int, seconds: float, request: RequestMetrics):
+        key = (method, route)
+        durations = self.durations.get(key)
+        if durations is None:
+            durations = self.durations[key] = Histogram(LATENCY_BUCKETS)
+            self.db_queries[key] = Histogram(QUERY_BUCKETS)
+            self.db_seconds[key] = Histogram(LATENCY_BUCKETS)
+            self.redis_calls[key] = 0
+            self.redis_seconds[key] = 0.0
+        durations.observe(seconds)
+        self.db_queries[key].observe(request.db_queries)
+        self.db_seconds[key].observe(request.db_seconds)
+        self.redis_calls[key] += request.redis_calls
+        self.redis_seconds[key] += request.redis_seconds
+        response = (method, route, status)
+        self.responses[response] = self.responses.get(response, 0) + 1
+
+    def clear(self):
+        self.__init__()
+
+    @staticmethod
+    def _histogram(lines: list, name: str, histograms: Dict[Tuple[str, str], Histogram]):
+        for (method, route), histogram in histograms.items():
+            common = labels(method=method, route=route)
+            total = 0
+            for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                total += count
+                lines.append(f'{name}_bucket{{{common},le="{bound}"}} {total}')
+            lines.append(f"{name}_sum{{{common}}} {histogram.sum}")
+            lines.append(f"{name}_count{{{common}}} {total}")
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_requests_in_flight Requests being handled.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_responses_total Responses by route and status code.",
+            "# TYPE http_responses_total counter",
+        ]
+        for (method, route, status), count in self.responses.items():
+            lines.append(f"http_responses_total{{{labels(method=method, route=route, status=status)}}} {count}")
+        lines += ["# HELP http_request_duration_seconds Request latency by route.",
+                  "# TYPE http_request_duration_seconds histogram"]
+        self._histogram(lines, "http_request_duration_seconds", self.durations)
+        lines += ["# HELP http_request_db_queries SQL statements executed per request.",
+                  "# TYPE http_request_db_queries histogram"]
+        self._histogram(lines, "http_request_db_queries", self.db_queries)
+        lines += ["# HELP http_request_db_seconds Time spent in SQL statements per request.",
+                  "# TYPE http_request_db_seconds histogram"]
+        self._histogram(lines, "http_request_db_seconds", self.db_seconds)
+        lines += ["# HELP http_request_redis_calls_total Redis calls made by requests.",
+                  "# TYPE http_request_redis_calls_total counter"]
+        for (method, route), count in self.redis_calls.items():
+            lines.append(f"http_request_redis_calls_total{{{labels(method=method, route=route)}}} {count}")
+        lines += ["# HELP http_request_redis_seconds_total Time spent in Redis calls by requests.",
+                  "# TYPE http_request_redis_seconds_total counter"]
+        for (method, route), seconds in self.redis_seconds.items():
+            lines.append(f"http_request_redis_seconds_total{{{labels(method=method, route=route)}}} {seconds}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: BaseHTTPMiddleware would cost more than everything measured here."""
+
+    def __init__(self, app, registry: Metrics = metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request = RequestMetrics(scope)
+        token = current_request.set(request)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        registry = self.registry
+        registry.in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            seconds = time.perf_counter() - start
+            registry.in_flight -= 1
+            current_request.reset(token)
+            # the matched route's path template, set on the scope by the router
+            route = scope.get("route")
+            registry.observe(scope["method"], route.path if route is not None else "unmatched", status, seconds,
+                             request)
+
+
+def record_redis_call(seconds: float):
+    request = current_request.get()
+    if request is not None:
+        request.redis_calls += 1
+        request.redis_seconds += seconds
@@ -0,0 +1,53 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from src.conf.config import settings
+
+
+class PasswordHasher:
+    """bcrypt off the event loop: a fixed pool of worker threads behind a bounded queue.
+
+    bcrypt releases the GIL while hashing, so threads run in parallel. When all workers
+    are busy and ``queue_size`` calls are already waiting, further calls are rejected
+    with 503 straight away instead of piling up behind a login storm.
+    """
+
+    def __init__(self, rounds: int, workers: int, queue_size: int):
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.capacity = workers + queue_size
+        self.pending = 0
+        self.rejected = 0
+
+    async def _run(self, func, *args):
+        if self.pending >= self.capacity:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Too many authentication requests, try again later",
+                                headers={"Retry-After": "1"})
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        # the new hash is returned when ``hashed`` was made with other cost parameters
+        return await self._run(self.context.verify_and_update, password, hashed)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {"capacity": self.capacity, "pending": self.pending, "rejected": self.rejected}
+
+
+password_hasher = PasswordHasher(settings.bcrypt_rounds, settings.password_hash_workers,
+                                 settings.password_hash_queue)
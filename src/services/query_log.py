@@ -0,0 +1,94 @@
+"""SQL instrumentation on engine events: per-request attribution, slow-query log and N+1 detection."""
+import logging
+import re
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import List
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.conf.config import settings
+from src.services.metrics import current_request
+
+logger = logging.getLogger(__name__)
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|\$\d+(?:::[\w\[\]]+)?|%\(\w+\)s|%s|(?<!:):\w+")
+_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_ROWS = re.compile(r"(\(\?\.\.\.\))(?:\s*,\s*\(\?\.\.\.\))+")
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(statement: str) -> str:
+    """The statement's shape: literals and placeholders become ``?`` and lists of them collapse.
+
+    ``WHERE id IN (?, ?, ?)`` and a multi-row ``VALUES (...), (...)`` have the same shape whatever their length.
+    """
+    sql = " ".join(_LITERAL.sub("?", statement).split())
+    return _ROWS.sub(r"\1", _LIST.sub("(?...)", sql))
+
+
+def _route(request) -> str:
+    if request is None:
+        return "-"
+    route = request.scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info.pop("query_start")
+    request = current_request.get()
+    if request is not None:
+        request.db_queries += 1
+        request.db_seconds += seconds
+        shape = normalize_sql(statement)
+        repeated = request.shapes[shape] = request.shapes.get(shape, 0) + 1
+        # reported once per request and shape, when the count reaches the threshold
+        if repeated == settings.db_repeated_query_threshold:
+            logger.warning("repeated query count=%d route=%s sql=%s", repeated, _route(request), shape,
+                           extra={"count": repeated, "route": _route(request), "sql": shape})
+    if seconds * 1000 >= settings.db_slow_query_ms:
+        duration_ms = round(seconds * 1000, 1)
+        shape = normalize_sql(statement)
+        extra = {"duration_ms": duration_ms, "route": _route(request), "sql": shape}
+        # rowcount is only meaningful for DML; for a SELECT it is -1 or whatever the driver happens to report
+        if context is not None and (context.isinsert or context.isupdate or context.isdelete):
+            extra["rows"] = cursor.rowcount
+            logger.warning("slow query duration_ms=%.1f rows=%d route=%s sql=%s", duration_ms, cursor.rowcount,
+                           extra["route"], shape, extra=extra)
+        else:
+            logger.warning("slow query duration_ms=%.1f route=%s sql=%s", duration_ms, extra["route"], shape,
+                           extra=extra)
+
+
+def instrument_engine(engine: Engine):
+    """Hooks ``engine`` (the sync engine of an AsyncEngine) into the query log and the request metrics."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def assert_max_queries(engine: Engine, limit: int):
+    """Test helper: fails when the block executes more than ``limit`` statements on ``engine``.
+
+        with assert_max_queries(async_engine.sync_engine, 3):
+            client.get("/contacts/")
+    """
+    statements: List[str] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(normalize_sql(statement))
+
+    event.listen(engine, "after_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "after_cursor_execute", record)
+    if len(statements) > limit:
+        raise AssertionError(f"{len(statements)} queries executed, at most {limit} expected:\n"
+                             + "\n".join(statements))
@@ -0,0 +1,225 @@
+import asyncio
+import math
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+
+from src.conf.config import settings
+from src.database.redis_client import redis_client, redis_call
+from src.services.auth import auth_service
+from src.services.cache import TTLCache
+
+
+def parse_limit(limit: str) -> Tuple[int, float]:
+    times, seconds = limit.split("/")
+    return int(times), float(seconds)
+
+
+class LimitState:
+    __slots__ = ("window", "current", "previous", "tokens", "updated", "pending", "known", "unconfirmed", "unsent")
+
+    def __init__(self, window: int, tokens: float, now: float):
+        self.window = window
+        self.current = 0
+        self.previous = 0
+        self.tokens = tokens
+        self.updated = now
+        # admissions not pushed to Redis yet, and the global count for ``window`` as of the last sync
+        self.pending = 0
+        self.known = 0
+        # admissions in a push that failed or timed out: Redis may or may not have counted them
+        self.unconfirmed = 0
+        # (window, admissions) left unsynced when the window rolled over, pushed by the next sync
+        self.unsent: Optional[List[Tuple[int, int]]] = None
+
+
+class Algorithm(ABC):
+    def __init__(self, times: int, seconds: float):
+        self.times = times
+        self.seconds = seconds
+
+    def window(self, now: float) -> int:
+        # wall-clock windows line up across workers, so they can share one Redis counter per window
+        return int(now // self.seconds)
+
+    def new_state(self, now: float) -> LimitState:
+        return LimitState(self.window(now), self.times, now)
+
+    def roll(self, state: LimitState, now: float):
+        window = self.window(now)
+        if window != state.window:
+            if state.pending:
+                state.unsent = (state.unsent or []) + [(state.window, state.pending)]
+            state.previous = state.current if window == state.window + 1 else 0
+            state.current = 0
+            state.window = window
+            state.pending = 0
+            state.known = 0
+            state.unconfirmed = 0
+
+    @abstractmethod
+    def admit(self, state: LimitState, now: float) -> float:
+        """Counts the request and returns 0, or returns the seconds to wait before retrying."""
+
+    @abstractmethod
+    def apply_remote(self, state: LimitState, admitted: int):
+        """Accounts for requests admitted by other workers in the current window."""
+
+
+class SlidingWindow(Algorithm):
+    """Sliding-window counter: the current window plus the previous one weighted by how much of it still overlaps."""
+
+    def admit(self, state: LimitState, now: float) -> float:
+        self.roll(state, now)
+        elapsed = now % self.seconds
+        if state.previous * (1 - elapsed / self.seconds) + state.current >= self.times:
+            return self.seconds - elapsed
+        state.current += 1
+        return 0
+
+    def apply_remote(self, state: LimitState, admitted: int):
+        state.current += admitted
+
+
+class TokenBucket(Algorithm):
+    """``times`` tokens, refilled continuously over ``seconds``; allows bursts up to ``times``."""
+
+    def admit(self, state: LimitState, now: float) -> float:
+        self.roll(state, now)
+        rate = self.times / self.seconds
+        state.tokens = min(self.times, state.tokens + (now - state.updated) * rate)
+        state.updated = now
+        if state.tokens < 1:
+            return (1 - state.tokens) / rate
+        state.tokens -= 1
+        return 0
+
+    def apply_remote(self, state: LimitState, admitted: int):
+        state.tokens = max(state.tokens - admitted, 0)
+
+
+ALGORITHMS = {"sliding_window": SlidingWindow, "token_bucket": TokenBucket}
+
+
+class RateLimiter:
+    """Admission is decided from process-local state; global counts are reconciled with Redis in the background.
+
+    Every ``rate_limit_sync_interval`` each active key's admissions are pushed in pipelined batches of
+    up to ``rate_limit_sync_batch`` keys (an INCRBY per key and window), and what other workers
+    admitted in the same window is folded into the local state. A push that fails is not retried.
+    Between syncs a client spread over N workers can briefly get up to N times its limit. When Redis
+    is unavailable the limits still hold per worker: the limiter fails open.
+    """
+
+    r = redis_client
+
+    def __init__(self, algorithm: str = settings.rate_limit_algorithm, limits: Optional[Dict[str, str]] = None):
+        self.enabled = settings.rate_limit_enabled
+        self.limits = {name: ALGORITHMS[algorithm](*parse_limit(limit))
+                       for name, limit in (limits or settings.rate_limits).items()}
+        self.states = TTLCache(settings.rate_limit_max_keys, ttl=0)
+        self.allowed = 0
+        self.rejected = 0
+
+    @staticmethod
+    def key(name: str, identity: str, window: int) -> str:
+        return f"rl:{name}:{identity}:{window}"
+
+    def check(self, name: str, identity: str, now: Optional[float] = None) -> float:
+        """Returns 0 when the request is admitted, otherwise the seconds until it may be retried."""
+        limit = self.limits[name]
+        now = time.time() if now is None else now
+        state = self.states.get((name, identity))
+        if state is None:
+            state = limit.new_state(now)
+        retry_after = limit.admit(state, now)
+        # idle keys expire once neither window can affect a decision any more
+        self.states.set((name, identity), state, ttl=2 * limit.seconds)
+        if retry_after:
+            self.rejected += 1
+            return retry_after
+        self.allowed += 1
+        state.pending += 1
+        return 0
+
+    async def sync(self, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        batch = []
+        for (name, identity), state in self.states.items():
+            limit = self.limits[name]
+            unsent, state.unsent = state.unsent, None
+            for window, admitted in unsent or ():
+                batch.append((limit, None, window, admitted, self.key(name, identity, window)))
+            if state.window == limit.window(now):
+                batch.append((limit, state, state.window, state.pending, self.key(name, identity, state.window)))
+                # in flight from here on: admitted meanwhile counts towards the next sync
+                state.pending = 0
+        size = settings.rate_limit_sync_batch
+        for start in range(0, len(batch), size):
+            await self._push(batch[start:start + size])
+
+    async def _push(self, batch: list):
+        pipe = self.r.pipeline(transaction=False)
+        for limit, state, window, pending, key in batch:
+            pipe.incrby(key, pending)
+            pipe.expire(key, math.ceil(2 * limit.seconds))
+        results = await redis_call(pipe.execute())
+        if results is None:
+            # a timed-out pipeline may still have been applied; resending it could count the same
+            # admissions twice and throttle clients for requests that never happened, so it is dropped
+            for limit, state, window, pending, key in batch:
+                if state is not None and state.window == window:
+                    state.unconfirmed += pending
+            return
+        for (limit, state, window, pending, key), total in zip(batch, results[::2]):
+            if state is None or state.window != window:
+                continue
+            remote = total - state.known - pending - state.unconfirmed
+            if remote > 0:
+                limit.apply_remote(state, remote)
+            state.known = total
+            state.unconfirmed = 0
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(settings.rate_limit_sync_interval)
+            await self.sync()
+
+    def clear(self):
+        self.states.clear()
+
+    def stats(self) -> dict:
+        return {"keys": len(self.states), "allowed": self.allowed, "rejected": self.rejected}
+
+
+rate_limiter = RateLimiter()
+
+
+async def client_identity(request: Request) -> str:
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            # answered from the verified-token cache for any token the route itself will accept
+            return "user:" + (await auth_service.decode_access_token(token))["sub"]
+        except HTTPException:
+            pass
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+
+class RateLimit:
+    """Route dependency enforcing ``settings.rate_limits[name]`` per user."""
+
+    def __init__(self, name: str):
+        if name not in rate_limiter.limits:
+            raise ValueError(f"No rate limit configured for {name!r}")
+        self.name = name
+
+    async def __call__(self, request: Request):
+        if not rate_limiter.enabled:
+            return
+        retry_after = rate_limiter.check(self.name, await client_identity(request))
+        if retry_after:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too Many Requests",
+                                headers={"Retry-After": str(math.ceil(retry_after))})
@@ -0,0 +1,93 @@
+import hashlib
+import logging
+import time
+from typing import Optional
+
+from src.conf.config import settings
+from src.database.redis_client import redis_client, redis_call, subscribe
+from src.services.cache import TTLCache
+
+REVOCATION_CHANNEL = "token-revoke"
+
+logger = logging.getLogger(__name__)
+
+
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+class TokenCache:
+    """Verified access-token claims keyed by token digest, each kept until the token's ``exp``.
+
+    Revoked digests are kept in a Redis denylist that is checked once per token per worker,
+    before its claims are cached; a revocation is also published on REVOCATION_CHANNEL so
+    every worker drops the claims it already holds.
+
+    When Redis cannot be reached the denylist is unknown. Tokens revoked through this worker,
+    or dropped by it on a revocation message, are remembered locally and still refused; any
+    other token is accepted, since failing closed would log everyone out for the length of a
+    Redis outage, but its claims are not cached, so the denylist is consulted again on its
+    next request. A token revoked on another worker while Redis is down is thus honoured
+    only once Redis is back, bounded by the token's own expiry.
+    """
+
+    r = redis_client
+
+    def __init__(self):
+        self.claims = TTLCache(settings.token_cache_size, ttl=0)
+        # digests known here to be revoked, each until its token's exp
+        self.denied = TTLCache(settings.token_cache_size, ttl=0)
+        self.revoked = 0
+
+    @staticmethod
+    def key(digest: bytes) -> str:
+        return f"revoked:{digest.hex()}"
+
+    def get(self, digest: bytes) -> Optional[dict]:
+        return self.claims.get(digest)
+
+    def set(self, digest: bytes, claims: dict):
+        ttl = claims["exp"] - time.time()
+        if ttl > 0:
+            self.claims.set(digest, claims, ttl=ttl)
+
+    async def is_revoked(self, digest: bytes) -> Optional[bool]:
+        """True or False from the denylist, or None when Redis is unavailable and the token is not known locally."""
+        if self.denied.get(digest) is not None:
+            return True
+        found = await redis_call(self.r.exists(self.key(digest)))
+        return None if found is None else bool(found)
+
+    def _deny(self, digest: bytes, exp: float):
+        self.claims.pop(digest)
+        ttl = exp - time.time()
+        if ttl > 0:
+            self.denied.set(digest, True, ttl=ttl)
+
+    async def revoke(self, digest: bytes, exp: int):
+        self._deny(digest, exp)
+        self.revoked += 1
+        ttl = int(exp - time.time()) + 1
+        if ttl > 0:
+            await redis_call(self.r.set(self.key(digest), 1, ex=ttl))
+            await redis_call(self.r.publish(REVOCATION_CHANNEL, digest.hex()))
+
+    def _drop(self, digest_hex: str):
+        try:
+            digest = bytes.fromhex(digest_hex)
+        except ValueError:
+            # raising would end the subscription, and with it every later revocation
+            logger.warning("Ignoring malformed revocation message: %r", digest_hex)
+            return
+        claims = self.claims.get(digest)
+        if claims is not None:
+            self._deny(digest, claims["exp"])
+
+    async def listen(self):
+        await subscribe(REVOCATION_CHANNEL, self._drop, self.claims.clear)
+
+    def stats(self) -> dict:
+        return {"claims": self.claims.stats(), "denied": len(self.denied), "revoked": self.revoked}
+
+
+token_cache = TokenCache()
@@ -1,10 +1,101 @@
+import asyncio
 import hashlib
+import shutil
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import BinaryIO, Optional
 
 import cloudinary
 import cloudinary.uploader
+from fastapi import HTTPException, UploadFile, status
+from PIL import Image, ImageOps, UnidentifiedImageError
 
 from src.conf.config import settings
 
+CHUNK_SIZE = 1024 * 1024
+
+
+def process_avatar(source: BinaryIO, workdir: Path, size: int, max_bytes: int) -> Path:
+    """Copies the upload to ``workdir`` and writes a ``size`` x ``size`` JPEG next to it.
+
+    Blocking: meant to run in UploadService.executor. Raises ValueError for oversized or unreadable images.
+    """
+    original = workdir / "original"
+    copied = 0
+    with open(original, "wb") as out:
+        while chunk := source.read(CHUNK_SIZE):
+            copied += len(chunk)
+            if copied > max_bytes:
+                raise ValueError("Image is too large")
+            out.write(chunk)
+
+    processed = workdir / "avatar.jpg"
+    resize_image(original, processed, size)
+    return processed
+
+
+def resize_image(source: Path, target: Path, size: int):
+    """Writes ``source`` cropped to a ``size`` x ``size`` JPEG; blocking. Raises ValueError for unreadable images."""
+    try:
+        with Image.open(source) as image:
+            # JPEGs are decoded straight at a reduced scale instead of at full resolution
+            image.draft("RGB", (size * 2, size * 2))
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            avatar = ImageOps.fit(image, (size, size), Image.LANCZOS)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise ValueError("Invalid image")
+    avatar.save(target, "JPEG", quality=85, optimize=True, progressive=True)
+
+
+class AvatarStorage(ABC):
+    """Keeps processed avatars; ``save`` is blocking and returns the public URL."""
+
+    @abstractmethod
+    def save(self, path: Path, public_id: str) -> str:
+        pass
+
+    def local_path(self, url: str) -> Optional[Path]:
+        """The file behind ``url`` when this backend keeps it on local disk."""
+        return None
+
+
+class CloudinaryStorage(AvatarStorage):
+    def save(self, path: Path, public_id: str) -> str:
+        r = UploadService.upload(str(path), public_id)
+        return UploadService.get_url_avatar(public_id, r.get('version'))
+
+
+class LocalStorage(AvatarStorage):
+    def __init__(self, root: str, base_url: str):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+
+    def path(self, public_id: str) -> Path:
+        return self.root / f"{public_id}.jpg"
+
+    def save(self, path: Path, public_id: str) -> str:
+        target = self.path(public_id)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(path, target)
+        # the version busts caches, as Cloudinary's does
+        return f"{self.base_url}/{public_id}.jpg?v={int(time.time())}"
+
+    def local_path(self, url: str) -> Optional[Path]:
+        if not url.startswith(self.base_url + "/"):
+            return None
+        path = (self.root / url[len(self.base_url) + 1:].split("?")[0]).resolve()
+        return path if path.is_relative_to(self.root.resolve()) and path.is_file() else None
+
+
+def create_storage() -> AvatarStorage:
+    if settings.avatar_storage == "local":
+        return LocalStorage(settings.avatar_local_dir, settings.avatar_local_url)
+    return CloudinaryStorage()
+
+
 class UploadService:
     cloudinary.config(
         cloud_name = settings.cloudinary_name,
@@ -12,7 +103,9 @@ class UploadService:
         api_secret = settings.cloudinary_api_secret,
         secure=True,
     )
-    
+    storage: AvatarStorage = create_storage()
+    executor = ThreadPoolExecutor(max_workers=settings.avatar_workers, thread_name_prefix="avatar")
+
     @staticmethod
     def create_name_avatar(email: str, prefix: str):
         name = hashlib.sha256(email.encode()).hexdigest()[:12]
@@ -26,4 +119,17 @@ class UploadService:
     @staticmethod
     def get_url_avatar(public_id, version):
         scr_url = cloudinary.CloudinaryImage(public_id).build_url(width=250, height=250, crop='fill', version=version)
-        return scr_url
\ No newline at end of file
+        return scr_url
+
+    @classmethod
+    async def upload_avatar(cls, file: UploadFile, email: str) -> str:
+        """Resizes the upload and stores it; decoding, encoding and the upload all run in the executor."""
+        public_id = cls.create_name_avatar(email, "contacts_base")
+        loop = asyncio.get_running_loop()
+        with TemporaryDirectory() as workdir:
+            try:
+                processed = await loop.run_in_executor(cls.executor, process_avatar, file.file, Path(workdir),
+                                                       settings.avatar_size, settings.avatar_max_bytes)
+            except ValueError as err:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+            return await loop.run_in_executor(cls.executor, cls.storage.save, processed, public_id)
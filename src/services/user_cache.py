@@ -0,0 +1,92 @@
+import asyncio
+import json
+from typing import Optional, Set
+
+from src.conf.config import settings
+from src.database.redis_client import redis_client, redis_call, subscribe
+from src.schemas import UserDb
+from src.services.cache import TTLCache
+
+USER_CACHE_VERSION = b"u1:"
+INVALIDATION_CHANNEL = "user-cache-invalidate"
+
+
+def serialize_user(user: UserDb) -> bytes:
+    return USER_CACHE_VERSION + json.dumps(
+        [user.id, user.email, user.username, user.avatar, user.confirmed], separators=(",", ":")
+    ).encode()
+
+
+def deserialize_user(data: bytes) -> Optional[UserDb]:
+    # entries written by another version (or the old pickled ORM objects) count as a miss
+    if not data.startswith(USER_CACHE_VERSION):
+        return None
+    user_id, email, username, avatar, confirmed = json.loads(data[len(USER_CACHE_VERSION):])
+    return UserDb(id=user_id, email=email, username=username, avatar=avatar, confirmed=confirmed)
+
+
+class UserCacheService:
+    """Users by email: a process-local LRU/TTL tier in front of Redis.
+
+    Every user mutation deletes the Redis entry and publishes the email on
+    INVALIDATION_CHANNEL, so all workers drop their local copy at once. The
+    same is done again ``user_cache_invalidate_delay`` seconds later: a request
+    that read the user from the database before the change may write that
+    stale copy back after the first invalidation.
+    """
+
+    r = redis_client
+
+    def __init__(self):
+        self.local = TTLCache(settings.user_cache_local_size, settings.user_cache_local_ttl)
+        self.redis_hits = 0
+        self.redis_misses = 0
+        self._delayed: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def key(email: str) -> str:
+        return f"user:{email}"
+
+    async def get(self, email: str) -> Optional[UserDb]:
+        user = self.local.get(email)
+        if user is not None:
+            return user
+        cached = await redis_call(self.r.get(self.key(email)))
+        user = deserialize_user(cached) if cached else None
+        if user is None:
+            self.redis_misses += 1
+            return None
+        self.redis_hits += 1
+        self.local.set(email, user)
+        return user
+
+    async def set(self, user: UserDb):
+        await redis_call(self.r.set(self.key(user.email), serialize_user(user), ex=settings.user_cache_ttl))
+        self.local.set(user.email, user)
+
+    async def invalidate(self, email: str):
+        await self._invalidate(email)
+        task = asyncio.create_task(self._invalidate_later(email))
+        self._delayed.add(task)
+        task.add_done_callback(self._delayed.discard)
+
+    async def _invalidate(self, email: str):
+        self.local.pop(email)
+        await redis_call(self.r.delete(self.key(email)))
+        await redis_call(self.r.publish(INVALIDATION_CHANNEL, email))
+
+    async def _invalidate_later(self, email: str):
+        await asyncio.sleep(settings.user_cache_invalidate_delay)
+        await self._invalidate(email)
+
+    async def listen(self):
+        await subscribe(INVALIDATION_CHANNEL, self.local.pop, self.local.clear)
+
+    def stats(self) -> dict:
+        return {
+            "local": self.local.stats(),
+            "redis": {"hits": self.redis_hits, "misses": self.redis_misses},
+        }
+
+
+user_cache_service = UserCacheService()
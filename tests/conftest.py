@@ -1,19 +1,35 @@
+from functools import partial
+from unittest.mock import AsyncMock
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from sqlalchemy.exc import DatabaseError
 
 from main import app
 from src.database.models import Base
 from src.database.db import get_db
+from src.services.autocomplete import autocomplete_service
+from src.services.query_log import assert_max_queries
+from src.services.rate_limit import rate_limiter
+from src.services.token_cache import token_cache
+from src.services.user_cache import user_cache_service
 
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+ASYNC_SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# TestClient runs every request on its own event loop, so async connections must not be pooled
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+AsyncTestingSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False,
+                                              expire_on_commit=False)
+
 
 @pytest.fixture(scope="module")
 def session():
@@ -30,20 +46,40 @@ def session():
         db.close()
 
 
+@pytest.fixture(autouse=True)
+def redis_stub(monkeypatch):
+    redis_mock = AsyncMock()
+    redis_mock.get.return_value = None
+    redis_mock.exists.return_value = 0
+    monkeypatch.setattr(user_cache_service, "r", redis_mock)
+    monkeypatch.setattr(token_cache, "r", redis_mock)
+    return redis_mock
+
+
 @pytest.fixture(scope="module")
 def client(session):
 
-    def override_get_db():
-        try:
-            yield session
-        finally:
-            session.close()
+    async def override_get_db():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
 
     app.dependency_overrides[get_db] = override_get_db
+    autocomplete_service.clear()
+    user_cache_service.local.clear()
+    token_cache.claims.clear()
+    # the contacts routes allow one request per 10 seconds; tests that exercise limiting enable it
+    rate_limiter.enabled = False
+    rate_limiter.clear()
 
     yield TestClient(app)
 
 
+@pytest.fixture()
+def max_queries():
+    """``with max_queries(n):`` fails when the block runs more than ``n`` statements against the test database."""
+    return partial(assert_max_queries, async_engine.sync_engine)
+
+
 @pytest.fixture(scope="module")
 def user():
-    return {"username": "test_user", "email": "test_user@gmail.com", "password": "12345678", 'confirmed': False}
\ No newline at end of file
+    return {"username": "test_user", "email": "test_user@gmail.com", "password": "12345678", 'confirmed': False}
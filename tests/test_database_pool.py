@@ -0,0 +1,41 @@
+import unittest
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.database.pool import InstrumentedAsyncPool, get_pool_status, pool_stats
+
+
+class TestInstrumentedAsyncPool(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        pool_stats.reset()
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=InstrumentedAsyncPool,
+                                          pool_size=1, max_overflow=1, pool_timeout=0.1)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+        pool_stats.reset()
+
+    async def test_checkout_is_counted(self):
+        async with self.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            status = get_pool_status(self.engine.pool)
+            self.assertEqual(status["checked_out"], 1)
+        status = get_pool_status(self.engine.pool)
+        self.assertEqual(status["checkouts"], 1)
+        self.assertEqual(status["checked_out"], 0)
+        self.assertEqual(status["overflow_events"], 0)
+
+    async def test_overflow_and_timeout(self):
+        async with self.engine.connect() as first, self.engine.connect() as second:
+            await first.execute(text("SELECT 1"))
+            await second.execute(text("SELECT 1"))
+            self.assertEqual(pool_stats.overflow_events, 1)
+            with self.assertRaises(Exception):
+                async with self.engine.connect() as third:
+                    await third.execute(text("SELECT 1"))
+        self.assertEqual(pool_stats.timeouts, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 from fastapi.testclient import TestClient
 
 from main import app
+from src.conf.config import settings
 
 
 client = TestClient(app)
@@ -9,3 +10,31 @@ client = TestClient(app)
 def test_read_main():
     response = client.get("/")
     assert response.status_code == 200
+
+
+def test_internal_requires_token(monkeypatch):
+    assert client.get("/internal/db/pool").status_code == 403
+    monkeypatch.setattr(settings, "internal_token", "internal-secret")
+    assert client.get("/internal/db/pool").status_code == 403
+    response = client.get("/internal/db/pool", headers={"X-Internal-Token": "wrong"})
+    assert response.status_code == 403
+
+
+def test_db_pool_status(monkeypatch):
+    monkeypatch.setattr(settings, "internal_token", "internal-secret")
+    response = client.get("/internal/db/pool", headers={"X-Internal-Token": "internal-secret"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["pool_class"] == "InstrumentedAsyncPool"
+    assert "checked_out" in data
+    assert "wait_time_max_ms" in data
+
+
+def test_metrics():
+    client.get("/")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_responses_total{method="GET",route="/",status="200"}' in response.text
+    # counting the /metrics request itself
+    assert "http_requests_in_flight 1" in response.text
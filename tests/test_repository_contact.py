@@ -1,27 +1,31 @@
 import datetime
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock
 from datetime import date
 
-from sqlalchemy import and_, or_, func
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
-from src.database.models import Contact, User
+from src.database.models import Base, Contact, User
 from src.schemas import Contact as ContactModel
 from src.repository.contacts import (
     get_contacts,
+    get_contacts_page,
     search_contact,
     get_contact,
     create_contact,
     update_contact,
     delete_contact,
     search_birthday_contact,
+    full_text_search,
 )
 
 
 class TestContacts(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = AsyncMock(spec=AsyncSession)
+        self.session.add = MagicMock()
         self.user = User(id=1)
         self.contact_test = Contact(
             id=1,
@@ -34,6 +38,12 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
             owner_id=1,
         )
 
+    def mock_scalars(self, result):
+        scalars = MagicMock()
+        scalars.all.return_value = result
+        scalars.first.return_value = result
+        self.session.scalars.return_value = scalars
+
     async def test_get_contacts(self):
         user = self.user
         session = self.session
@@ -45,19 +55,32 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
                     birthday=date.today())
         ]
 
-        session.query(Contact).filter_by(owner_id=user.id).all.return_value = expected_contacts
+        self.mock_scalars(expected_contacts)
 
         contacts = await get_contacts(owner_id=user.id, db=session)
 
         self.assertEqual(contacts, expected_contacts)
+        session.scalars.assert_awaited_once()
+
+    async def test_get_contacts_page(self):
+        session = self.session
+        contacts = [Contact(id=i, owner_id=1, first_name=f'Test{i}') for i in range(1, 4)]
+
+        self.mock_scalars(contacts)
+        page, last_id = await get_contacts_page(db=session, owner_id=1, limit=2)
+        self.assertEqual(page, contacts[:2])
+        self.assertEqual(last_id, 2)
+
+        self.mock_scalars(contacts[2:])
+        page, last_id = await get_contacts_page(db=session, owner_id=1, limit=2, after_id=2)
+        self.assertEqual(page, contacts[2:])
+        self.assertIsNone(last_id)
 
     async def test_get_contact(self):
-        user = self.user
         session = self.session
         expected_contact = self.contact_test
 
-        session.query(Contact).filter(and_(Contact.id == expected_contact.id, Contact.owner_id == user.id)).first. \
-            return_value = expected_contact
+        self.mock_scalars(expected_contact)
 
         contact = await get_contact(contact_id=expected_contact.id, owner_id=expected_contact.owner_id, db=session)
 
@@ -67,30 +90,34 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         user = self.user
         expected_contact = self.contact_test
         session = self.session
-
-        add_mock = session.add
-        commit_mock = session.commit
+        session.bind = MagicMock()
+        session.bind.dialect.name = "sqlite"
+        session.scalar.return_value = expected_contact
 
         contact = await create_contact(body=ContactModel(**expected_contact.__dict__),
                                        db=self.session,
                                        owner_id=user.id)
 
-        self.assertEqual(contact.first_name, expected_contact.first_name)
-        self.assertEqual(contact.last_name, expected_contact.last_name)
-        self.assertEqual(contact.email, expected_contact.email)
-        self.assertEqual(contact.phone, expected_contact.phone)
-        self.assertEqual(str(contact.birthday), str(expected_contact.birthday))
-        self.assertEqual(contact.notes, expected_contact.notes)
-        add_mock.assert_called_once_with(contact)
-        commit_mock.assert_called_once()
+        self.assertEqual(contact, expected_contact)
+        stmt = str(session.scalar.await_args.args[0].compile(dialect=sqlite.dialect()))
+        self.assertIn("ON CONFLICT (owner_id, email) DO NOTHING RETURNING", stmt)
+        session.execute.assert_awaited_once()
+        session.commit.assert_awaited_once()
+
+        # the owner already has this email: nothing is inserted or counted
+        session.reset_mock()
+        session.scalar.return_value = None
+        contact = await create_contact(body=ContactModel(**expected_contact.__dict__), db=session, owner_id=user.id)
+        self.assertIsNone(contact)
+        session.execute.assert_not_awaited()
+        session.commit.assert_not_awaited()
 
     async def test_update_contact(self):
         user = self.user
         expected_contact = self.contact_test
         session = self.session
 
-        session.query(Contact).filter(and_(Contact.id == expected_contact.id, Contact.owner_id == user.id)).first \
-            .return_value = expected_contact
+        self.mock_scalars(expected_contact)
 
         commit_mock = session.commit
 
@@ -106,16 +133,14 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(contact.phone, expected_contact.phone)
         self.assertEqual(contact.birthday, expected_contact.birthday)
         self.assertEqual(contact.notes, expected_contact.notes)
-        commit_mock.assert_called_once()
+        commit_mock.assert_awaited_once()
 
     async def test_delete_contact(self):
         user = self.user
         expected_contact = self.contact_test
         session = self.session
 
-        query_mock = self.session.query.return_value
-        filter_mock = query_mock.filter.return_value
-        filter_mock.first.return_value = self.contact_test
+        self.mock_scalars(self.contact_test)
 
         delete_mock = self.session.delete
         commit_mock = self.session.commit
@@ -125,31 +150,19 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
                                        owner_id=user.id)
 
         self.assertEqual(contact, self.contact_test)
-        delete_mock.assert_called_once_with(contact)
-        commit_mock.assert_called_once()
+        delete_mock.assert_awaited_once_with(contact)
+        commit_mock.assert_awaited_once()
 
     async def test_search_contact(self):
         user = self.user
         expected_contact = self.contact_test
-        session = self.session
-
-        first_name = 'test'
-        last_name = None
-        email = None
 
-        session.query(Contact).filter(
-            and_(
-                or_(Contact.first_name == first_name, first_name is None),
-                or_(Contact.last_name == last_name, last_name is None),
-                or_(Contact.email == email, email is None),
-                Contact.owner_id == user.id,
-            )
-        ).all.return_value = [expected_contact]
+        self.mock_scalars([expected_contact])
 
         contacts = await search_contact(owner_id=user.id,
-                                        first_name=first_name,
-                                        last_name=last_name,
-                                        email=email,
+                                        first_name='test',
+                                        last_name=None,
+                                        email=None,
                                         db=self.session)
 
         self.assertEqual(contacts, [self.contact_test])
@@ -158,28 +171,12 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         user = self.user
         session = self.session
 
-        date_from = date.today()
-        date_to = date.today() + datetime.timedelta(days=7)
-        this_year = date_from.year
-        next_year = date_from.year + 1
         today = date.today()
         contacts = [
             Contact(id=1, first_name='John', last_name='Doe', email='john@example.com', birthday=today),
             Contact(id=2, first_name='Jane', last_name='Smith', email='jane@example.com', birthday=today),
         ]
-        session.query(Contact).filter(
-            and_(
-                Contact.owner_id == user.id,
-            )).filter(
-            or_(
-                func.to_date(func.concat(func.to_char(Contact.birthday, "DDMM"), this_year), "DDMMYYYY").between(
-                    date_from,
-                    date_to),
-                func.to_date(func.concat(func.to_char(Contact.birthday, "DDMM"), next_year), "DDMMYYYY").between(
-                    date_from,
-                    date_to),
-            )
-        ).all.return_value = contacts
+        self.mock_scalars(contacts)
 
         result = await search_birthday_contact(owner_id=user.id, db=session)
 
@@ -193,5 +190,114 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
             self.assertEqual(result[i].birthday, contacts[i].birthday)
 
 
+class TestBirthdayWindow(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False)()
+        birthdays = {
+            'leap': date(2000, 2, 29),
+            'feb28': date(1990, 2, 28),
+            'mar1': date(1985, 3, 1),
+            'dec30': date(1970, 12, 30),
+            'jan2': date(1999, 1, 2),
+            'jun15': date(1995, 6, 15),
+        }
+        self.session.add(User(id=1, username='owner', email='owner@example.com', password='x'))
+        self.session.add(User(id=2, username='other', email='other@example.com', password='x'))
+        self.session.add_all(Contact(first_name=name, last_name='Test', birthday=birthday, owner_id=1)
+                             for name, birthday in birthdays.items())
+        self.session.add(Contact(first_name='other', last_name='Test', birthday=date(2000, 6, 16), owner_id=2))
+        self.session.add(Contact(first_name='no_birthday', last_name='Test', owner_id=1))
+        await self.session.commit()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def names(self, today, days):
+        contacts = await search_birthday_contact(db=self.session, owner_id=1, days=days, today=today)
+        return sorted(contact.first_name for contact in contacts)
+
+    async def test_plain_window(self):
+        self.assertEqual(await self.names(date(2023, 6, 10), 7), ['jun15'])
+        self.assertEqual(await self.names(date(2023, 6, 16), 7), [])
+
+    async def test_december_to_january(self):
+        self.assertEqual(await self.names(date(2023, 12, 28), 7), ['dec30', 'jan2'])
+        self.assertEqual(await self.names(date(2023, 12, 31), 1), [])
+        self.assertEqual(await self.names(date(2024, 1, 1), 1), ['jan2'])
+
+    async def test_leap_year(self):
+        self.assertEqual(await self.names(date(2024, 2, 28), 0), ['feb28'])
+        self.assertEqual(await self.names(date(2024, 2, 29), 0), ['leap'])
+        self.assertEqual(await self.names(date(2024, 3, 1), 0), ['mar1'])
+
+    async def test_non_leap_year(self):
+        self.assertEqual(await self.names(date(2023, 2, 28), 0), ['feb28'])
+        self.assertEqual(await self.names(date(2023, 3, 1), 0), ['leap', 'mar1'])
+        self.assertEqual(await self.names(date(2023, 2, 20), 14), ['feb28', 'leap', 'mar1'])
+        self.assertEqual(await self.names(date(2022, 12, 25), 66), ['dec30', 'feb28', 'jan2', 'leap', 'mar1'])
+
+    async def test_whole_year(self):
+        self.assertEqual(len(await self.names(date(2023, 6, 10), 365)), 6)
+
+    async def test_birthday_md_follows_updates(self):
+        contact = (await self.session.scalars(select(Contact).filter(Contact.first_name == 'jun15'))).first()
+        contact.birthday = date(1995, 1, 3)
+        await self.session.commit()
+        self.assertEqual(contact.birthday_md, 103)
+        self.assertEqual(await self.names(date(2023, 6, 10), 7), [])
+
+
+class TestFullTextSearch(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False)()
+        self.session.add(User(id=1, username='owner', email='owner@example.com', password='x'))
+        self.session.add(User(id=2, username='other', email='other@example.com', password='x'))
+        self.session.add_all([
+            Contact(first_name='Johnny', last_name='Smith', email='johnny@example.com', phone='0501234567', owner_id=1),
+            Contact(first_name='Anna', last_name='Johnson', email='anna@example.com', notes='met john', owner_id=1),
+            Contact(first_name='Peter', last_name='Parker', email='peter@example.com', phone='0671111111', owner_id=1),
+            Contact(first_name='John', last_name='Other', email='john@other.com', owner_id=2),
+        ])
+        await self.session.commit()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def names(self, query, **kwargs):
+        contacts = await full_text_search(db=self.session, owner_id=1, query=query, **kwargs)
+        return [contact.first_name for contact in contacts]
+
+    async def test_prefix_across_fields(self):
+        self.assertEqual(sorted(await self.names('john')), ['Anna', 'Johnny'])
+        self.assertEqual(await self.names('050123'), ['Johnny'])
+        self.assertEqual(await self.names('peter@example'), ['Peter'])
+        self.assertEqual(await self.names('smi jo'), ['Johnny'])
+
+    async def test_owner_scope_and_paging(self):
+        self.assertNotIn('John', await self.names('john'))
+        self.assertEqual(len(await self.names('john', limit=1)), 1)
+        self.assertEqual(len(await self.names('john', limit=1, skip=1)), 1)
+
+    async def test_index_follows_writes(self):
+        contact = (await self.session.scalars(select(Contact).filter(Contact.first_name == 'Peter'))).first()
+        contact.last_name = 'Johansson'
+        await self.session.commit()
+        self.assertIn('Peter', await self.names('johan'))
+        await self.session.delete(contact)
+        await self.session.commit()
+        self.assertEqual(await self.names('johan'), [])
+
+    async def test_empty_query(self):
+        self.assertEqual(await self.names(' ?! '), [])
+
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,165 @@
+import os
+import re
+import unittest
+from datetime import date
+from pathlib import Path
+
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from alembic.script import ScriptDirectory
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.database.models import Base, Contact, User
+from src.repository import contacts as repository_contacts
+from src.schemas import ContactBase, ContactMatch
+from src.services.autocomplete import AutocompleteService
+
+FULL_SCAN = re.compile(r"\bSCAN contacts\b(?!_)")
+POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+POSTGRES_SCHEMA = "query_plans_test"
+# schema objects create_all cannot build: the search_vector column, pg_trgm/btree_gin and the GIN indexes
+POSTGRES_MIGRATIONS = ("b47e91d2c5a8",)
+MIGRATIONS = Path(__file__).resolve().parents[1] / "migrations"
+
+
+def apply_migrations(conn, revisions):
+    """Runs the ``upgrade()`` of each revision on ``conn``, outside of alembic's version tracking."""
+    scripts = ScriptDirectory(str(MIGRATIONS))
+    with Operations.context(MigrationContext.configure(conn)):
+        for revision in revisions:
+            scripts.get_revision(revision).module.upgrade()
+
+
+class TestQueryPlans(unittest.IsolatedAsyncioTestCase):
+    """Every owner-scoped repository query must reach contacts through an index, never a full scan.
+
+    These run against in-memory SQLite, so they are a smoke test for missing indexes rather than proof of the
+    production plans; TestPostgresQueryPlans repeats them against a real PostgreSQL when TEST_POSTGRES_URL is set.
+    """
+
+    explain = "EXPLAIN QUERY PLAN "
+    full_scan = FULL_SCAN
+
+    def create_engine(self):
+        return create_async_engine("sqlite+aiosqlite://")
+
+    async def asyncSetUp(self):
+        self.engine = self.create_engine()
+        async with self.engine.begin() as conn:
+            await self.prepare(conn)
+        self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False)()
+        self.session.add_all([User(id=owner_id, username=f'owner{owner_id}', email=f'owner{owner_id}@example.com',
+                                   password='x') for owner_id in (1, 2)])
+        self.session.add_all(Contact(first_name=f'First{i}', last_name=f'Last{i % 3}', email=f'user{i}@example.com',
+                                     birthday=date(1990, 1 + i % 12, 1 + i % 28), owner_id=1 + i % 2)
+                             for i in range(20))
+        await self.session.commit()
+        self.statements = []
+        event.listen(self.engine.sync_engine, "before_cursor_execute", self.capture)
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        async with self.engine.begin() as conn:
+            await self.cleanup(conn)
+        await self.engine.dispose()
+
+    async def prepare(self, conn):
+        await conn.run_sync(Base.metadata.create_all)
+
+    async def cleanup(self, conn):
+        pass
+
+    def capture(self, conn, cursor, statement, parameters, context, executemany):
+        if not statement.startswith(self.explain):
+            self.statements.append((statement, parameters[0] if executemany else parameters))
+
+    async def plans(self, call) -> list:
+        self.statements.clear()
+        await call
+        connection = await self.session.connection()
+        plans = []
+        for statement, parameters in self.statements:
+            rows = await connection.exec_driver_sql(self.explain + statement, parameters)
+            plans.append((statement, [row[-1] for row in rows]))
+        return plans
+
+    async def assertIndexed(self, call):
+        for statement, plan in await self.plans(call):
+            scans = [step for step in plan if self.full_scan.search(step)]
+            self.assertFalse(scans, f"{statement}\n{plan}")
+
+    async def test_full_scan_is_detected(self):
+        plans = await self.plans(self.session.execute(select(Contact).filter(Contact.notes == 'x')))
+        self.assertTrue(any(self.full_scan.search(step) for _, plan in plans for step in plan))
+
+    async def test_reads(self):
+        db = self.session
+        await self.assertIndexed(repository_contacts.get_contacts(db, 1))
+        await self.assertIndexed(repository_contacts.get_contacts_page(db, 1, limit=5))
+        await self.assertIndexed(repository_contacts.get_contacts_page(db, 1, limit=5, skip=5, as_rows=True))
+        await self.assertIndexed(repository_contacts.get_contacts_page(db, 1, limit=5, after_id=7))
+        await self.assertIndexed(repository_contacts.count_contacts(db, 1))
+        await self.assertIndexed(repository_contacts.get_contacts_version(db, 1))
+        await self.assertIndexed(repository_contacts.get_contact(3, db, 1))
+        await self.assertIndexed(repository_contacts.search_contact(db, 1, email='user3@example.com'))
+        await self.assertIndexed(repository_contacts.search_contact(db, 1, first_name='First3', last_name='Last0'))
+        await self.assertIndexed(repository_contacts.full_text_search(db, 1, 'first'))
+        await self.assertIndexed(AutocompleteService()._get_index(db, 1))
+
+    async def test_birthdays(self):
+        db = self.session
+        await self.assertIndexed(repository_contacts.search_birthday_contact(db, 1, 7, today=date(2023, 6, 1)))
+        await self.assertIndexed(repository_contacts.search_birthday_contact(db, 1, 7, today=date(2023, 12, 28)))
+        await self.assertIndexed(repository_contacts.search_birthday_contact(db, 1, 365, as_rows=True))
+
+    async def test_export(self):
+        async def drain():
+            async for _ in repository_contacts.stream_contacts(self.session, 1, batch_size=5):
+                pass
+        await self.assertIndexed(drain())
+
+    async def test_writes(self):
+        db = self.session
+        body = ContactBase(first_name='New', last_name='Contact', email='new@example.com')
+        await self.assertIndexed(repository_contacts.create_contact(body, db, 1))
+        await self.assertIndexed(repository_contacts.upsert_contact(body, db, 1))
+        await self.assertIndexed(repository_contacts.insert_contacts(
+            [{"first_name": "Bulk", "last_name": "Insert", "email": "bulk@example.com"}], db, 1))
+        await self.assertIndexed(repository_contacts.update_contact(body, 3, db, 2))
+        await self.assertIndexed(repository_contacts.bulk_update_contacts(db, 1, {"notes": "x"}, ids=[1, 3, 5]))
+        await self.assertIndexed(repository_contacts.bulk_update_contacts(db, 1, {"notes": "y"},
+                                                                          match=ContactMatch(last_name='Last1')))
+        await self.assertIndexed(repository_contacts.bulk_delete_contacts(db, 1, match=ContactMatch(email='x@x.com')))
+        await self.assertIndexed(repository_contacts.bulk_delete_contacts(db, 1, ids=[1, 3]))
+        await self.assertIndexed(repository_contacts.delete_contact(5, db, 1))
+
+
+@unittest.skipUnless(POSTGRES_URL, "set TEST_POSTGRES_URL to check the plans on PostgreSQL")
+class TestPostgresQueryPlans(TestQueryPlans):
+    """The same checks against PostgreSQL, in a throwaway schema.
+
+    Sequential scans are disabled for the session, so the planner falls back to one only when no index can serve the
+    query; on a table this small it would otherwise prefer one regardless of the indexes.
+    """
+
+    explain = "EXPLAIN "
+    full_scan = re.compile(r"\bSeq Scan on contacts\b")
+
+    def create_engine(self):
+        return create_async_engine(POSTGRES_URL, connect_args={
+            # public stays on the path so extensions already installed there are found
+            "server_settings": {"search_path": f"{POSTGRES_SCHEMA}, public", "enable_seqscan": "off"}})
+
+    async def prepare(self, conn):
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {POSTGRES_SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {POSTGRES_SCHEMA}"))
+        await super().prepare(conn)
+        await conn.run_sync(apply_migrations, POSTGRES_MIGRATIONS)
+
+    async def cleanup(self, conn):
+        await conn.execute(text(f"DROP SCHEMA {POSTGRES_SCHEMA} CASCADE"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,7 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User
 from src.schemas import UserModel, UserDb
@@ -15,7 +15,8 @@ from src.repository.users import (
 
 class TestUsers(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = AsyncMock(spec=AsyncSession)
+        self.session.add = MagicMock()
         self.user = MagicMock(spec=User)
         self.user_test = User(
             id=1,
@@ -26,20 +27,21 @@ class TestUsers(unittest.IsolatedAsyncioTestCase):
             avatar='https://example.com/avatar.jpg'
         )
 
+    def mock_first(self, result):
+        self.session.scalars.return_value = MagicMock(first=MagicMock(return_value=result))
+
     async def test_get_user_by_email(self):
         db_mock = self.session
 
         # Create some dummy user data
         user1 = User(email='user1@example.com')
-        user2 = User(email='user2@example.com')
-        user3 = User(email='user3@example.com')
 
-        self.session.query().filter().first.return_value = user1
+        self.mock_first(user1)
         result = await get_user_by_email('user1@example.com', db_mock)
         self.assertEqual(result, user1)
 
         # Test case 2: User does not exist in the database
-        self.session.query().filter().first.return_value = None
+        self.mock_first(None)
         result = await get_user_by_email('user4@example.com', db_mock)
         self.assertIsNone(result)
 
@@ -65,37 +67,38 @@ class TestUsers(unittest.IsolatedAsyncioTestCase):
         self.assertNotEqual(new_user.avatar, "gravatar")
         self.assertEqual(new_user.refresh_token, None)
 
-        self.session.add.assert_called_once_with(new_user)
-        self.session.commit.assert_called_once()
-        self.session.refresh.assert_called_once()
         add_mock.assert_called_once_with(new_user)
-        commit_mock.assert_called_once()
-        refresh_mock.assert_called_once()
+        commit_mock.assert_awaited_once()
+        refresh_mock.assert_awaited_once()
 
     async def test_update_token(self):
         user_test = self.user_test
         token = 'new token'
 
-        self.session.commit = MagicMock()
-        await update_token(user_test, token, self.session)
+        with patch("src.repository.users.user_cache_service") as cache_mock:
+            cache_mock.invalidate = AsyncMock()
+            await update_token(user_test, token, self.session)
 
         self.assertEqual(user_test.refresh_token, token)
-        self.session.commit.assert_called_once()
+        self.session.commit.assert_awaited_once()
+        cache_mock.invalidate.assert_awaited_once_with(user_test.email)
 
     async def test_confirmed_email(self):
         email = 'user1@example.com'
 
         user_mock = MagicMock(spec=User)
-        user_mock.confirmed = True
+        user_mock.confirmed = False
 
-        self.session.query().filter().one_or_none.return_value = user_mock
-        self.session.commit = MagicMock()
+        self.mock_first(user_mock)
 
-        await confirmed_email(email, self.session)
+        with patch("src.repository.users.user_cache_service") as cache_mock:
+            cache_mock.invalidate = AsyncMock()
+            await confirmed_email(email, self.session)
 
         self.assertTrue(user_mock.confirmed)
-        self.session.commit.assert_called_once()
+        self.session.commit.assert_awaited_once()
+        cache_mock.invalidate.assert_awaited_once_with(email)
 
 
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
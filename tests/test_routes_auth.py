@@ -1,15 +1,13 @@
-from unittest.mock import MagicMock
 import json as js
 
 import pytest
+from passlib.context import CryptContext
 
-from src.database.models import User
+from src.database.models import EmailOutbox, User
 
 
 @pytest.fixture()
-def token(client, user, session, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+def token(client, user, session):
     client.post("/auth/signup", json=user)
     current_user: User = session.query(User).filter(User.email == user.get('email')).first()
     current_user.confirmed = True
@@ -22,9 +20,7 @@ def token(client, user, session, monkeypatch):
     return data["access_token"]
 
 
-def test_create_user(client, user, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+def test_create_user(client, user, session):
     response = client.post(
         "/auth/signup",
         json=user,
@@ -33,6 +29,9 @@ def test_create_user(client, user, monkeypatch):
     data = response.json()
     assert data["user"]["email"] == user.get("email")
     assert "id" in data["user"]
+    queued = session.query(EmailOutbox).filter(EmailOutbox.recipient == user.get("email")).one()
+    assert queued.context["username"] == user.get("username")
+    assert queued.next_attempt_at is not None
 
 
 def test_repeat_create_user(client, user):
@@ -111,3 +110,32 @@ def test_confirmed_email_is_confirmed(client, token):
     assert data["message"] == "Your email is already confirmed"
 
 
+def test_logout_revokes_access_token(client, token, redis_stub):
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get("/contacts/autocomplete", params={"q": "a"}, headers=headers)
+    assert response.status_code == 200, response.text
+
+    response = client.post("/auth/logout", headers=headers)
+    assert response.status_code == 200, response.text
+    key, _ = redis_stub.set.await_args.args
+    assert key.startswith("revoked:")
+    redis_stub.publish.assert_any_await("token-revoke", key[len("revoked:"):])
+
+    # another worker has not cached the claims and finds the token on the denylist
+    redis_stub.exists.return_value = 1
+    response = client.get("/contacts/autocomplete", params={"q": "a"}, headers=headers)
+    assert response.status_code == 401, response.text
+
+
+def test_login_rehashes_outdated_password(client, session, user, token):
+    current_user: User = session.query(User).filter(User.email == user.get('email')).first()
+    current_user.password = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash(user.get('password'))
+    session.commit()
+    response = client.post(
+        "/auth/login",
+        data={"username": user.get('email'), "password": user.get('password')},
+    )
+    assert response.status_code == 200, response.text
+    session.expire_all()
+    current_user = session.query(User).filter(User.email == user.get('email')).first()
+    assert current_user.password.startswith("$2b$12$")
@@ -1,9 +1,13 @@
-from unittest.mock import MagicMock, patch, AsyncMock
+import json as js
+from datetime import date
+from unittest.mock import patch, AsyncMock
 
 import pytest
 
-from src.database.models import User
-from src.services.auth import auth_service
+from src.conf.config import settings
+from src.database.models import Contact, User
+from src.services.rate_limit import rate_limiter
+from src.services.user_cache import user_cache_service
 
 CONTACT = {
     "id": 1,
@@ -36,10 +40,14 @@ CONTACT_3 = {
 }
 
 
+class FixedDate(date):
+    @classmethod
+    def today(cls):
+        return cls(2023, 6, 1)
+
+
 @pytest.fixture()
-def token(client, user, session, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.services.email.send_email", mock_send_email)
+def token(client, user, session):
     client.post("/auth/signup", json=user)
     current_user: User = session.query(User).filter(User.email == user.get('email')).first()
     current_user.confirmed = True
@@ -53,11 +61,8 @@ def token(client, user, session, monkeypatch):
 
 
 def test_create_contact_success(client, token, monkeypatch):
-    with patch.object(auth_service, 'r') as redis_mock:
+    with patch.object(user_cache_service, 'r', new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.http_callback', AsyncMock())
         response = client.post("/contacts", json=CONTACT, headers={"Authorization": f"Bearer {token}"})
         assert response.status_code == 200, response.text
         data = response.json()
@@ -71,11 +76,8 @@ def test_create_contact_success(client, token, monkeypatch):
 
 
 def test_create_contact_email_exist(client, token, monkeypatch):
-    with patch.object(auth_service, 'r') as redis_mock:
+    with patch.object(user_cache_service, 'r', new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.http_callback', AsyncMock())
         response = client.post("/contacts", json=CONTACT_2, headers={"Authorization": f"Bearer {token}"})
         assert response.status_code == 409, response.text
         data = response.json()
@@ -83,11 +85,8 @@ def test_create_contact_email_exist(client, token, monkeypatch):
 
 
 def test_update_contact_success(client, token, monkeypatch):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(user_cache_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.http_callback', AsyncMock())
         put_response = client.put(f"/contacts/{CONTACT['id']}",
                                   json=CONTACT,
                                   headers={"Authorization": f"Bearer {token}"})
@@ -97,11 +96,8 @@ def test_update_contact_success(client, token, monkeypatch):
 
 
 def test_update_contact_not_found(client, token, monkeypatch):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(user_cache_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.http_callback', AsyncMock())
         put_response = client.put(f"/contacts/{CONTACT_2['id']}",
                                   json=CONTACT_2,
                                   headers={"Authorization": f"Bearer {token}"})
@@ -111,26 +107,32 @@ def test_update_contact_not_found(client, token, monkeypatch):
 
 
 def test_get_contacts(client, token, monkeypatch):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(user_cache_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.http_callback', AsyncMock())
         response = client.get("/contacts", headers={"Authorization": f"Bearer {token}"})
         assert response.status_code == 200, response.text
         data = response.json()
-        assert type(data) == list
-        assert "id" in data[0]
-        assert CONTACT["first_name"] == data[0]["first_name"]
+        assert type(data["contacts"]) == list
+        assert "id" in data["contacts"][0]
+        assert CONTACT["first_name"] == data["contacts"][0]["first_name"]
+        assert data["total"] == 1
+        assert data["next_cursor"] is None
+
+
+def test_get_contacts_invalid_cursor(client, token, monkeypatch):
+    with patch.object(user_cache_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        response = client.get("/contacts", params={"cursor": "not-a-cursor"},
+                              headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 400, response.text
+        data = response.json()
+        assert data["detail"] == "Invalid cursor"
 
 
 def test_get_contact_success(client, token, monkeypatch):
     contact_id = 1
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(user_cache_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.http_callback', AsyncMock())
         get_response = client.get(f"/contacts/{contact_id}", headers={"Authorization": f"Bearer {token}"})
         assert get_response.status_code == 200, get_response.text
         data = get_response.json()
@@ -139,26 +141,71 @@ def test_get_contact_success(client, token, monkeypatch):
         assert CONTACT["first_name"] == data["first_name"]
 
 
+def test_contacts_query_counts(client, token, max_queries):
+    headers = {"Authorization": f"Bearer {token}"}
+    # the current user, the version check, the page and the total: none of them per contact
+    with max_queries(4):
+        response = client.get("/contacts/", headers=headers)
+        assert response.status_code == 200, response.text
+    with max_queries(1):
+        response = client.get("/contacts/1", headers=headers)
+        assert response.status_code == 200, response.text
+
+
 def test_get_contact_not_found(client, token, monkeypatch):
     contact_id = 2
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(user_cache_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.http_callback', AsyncMock())
         response = client.get(f"/contacts/{contact_id}", headers={"Authorization": f"Bearer {token}"})
         assert response.status_code == 404, response.text
         data = response.json()
         assert data["detail"] == "Contact not found!"
 
 
+def test_get_contact_conditional(client, token, monkeypatch):
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get(f"/contacts/{CONTACT['id']}", headers=headers)
+    etag, last_modified = response.headers["ETag"], response.headers["Last-Modified"]
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    response = client.get(f"/contacts/{CONTACT['id']}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304, response.text
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+    response = client.get(f"/contacts/{CONTACT['id']}", headers={**headers, "If-Modified-Since": last_modified})
+    assert response.status_code == 304, response.text
+
+    client.put(f"/contacts/{CONTACT['id']}", json={**CONTACT, "notes": "changed"}, headers=headers)
+    response = client.get(f"/contacts/{CONTACT['id']}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200, response.text
+    assert response.headers["ETag"] != etag
+    assert response.json()["notes"] == "changed"
+
+
+def test_get_contacts_conditional(client, token, monkeypatch):
+    headers = {"Authorization": f"Bearer {token}"}
+    etag = client.get("/contacts", headers=headers).headers["ETag"]
+    assert client.get("/contacts", params={"limit": 10}, headers=headers).headers["ETag"] != etag
+
+    with patch("src.repository.contacts.get_contacts_page") as page_mock:
+        response = client.get("/contacts", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304, response.text
+        page_mock.assert_not_called()
+
+    contact_id = client.post("/contacts", json={**CONTACT_3, "email": "etag@gmail.com"}, headers=headers).json()["id"]
+    response = client.get("/contacts", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200, response.text
+    assert response.headers["ETag"] != etag
+    assert response.json()["total"] == 2
+    client.delete(f"/contacts/{contact_id}", headers=headers)
+
+
 def test_upcoming_birthdays_list_success(client, token, monkeypatch):
-    with patch.object(auth_service, 'r') as redis_mock:
+    monkeypatch.setattr('src.repository.contacts.date', FixedDate)
+    with patch.object(user_cache_service, 'r', new_callable=AsyncMock) as redis_mock:
         days = 30
         redis_mock.get.return_value = None
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.http_callback', AsyncMock())
         response = client.get(f"/contacts/birthdays/{int(days)}", headers={"Authorization": f"Bearer {token}"})
         assert response.status_code == 200, response.text
         data = response.json()
@@ -166,37 +213,260 @@ def test_upcoming_birthdays_list_success(client, token, monkeypatch):
         assert "id" in data[0]
 
 
+def test_fast_list_responses(client, token, monkeypatch):
+    monkeypatch.setattr('src.repository.contacts.date', FixedDate)
+    headers = {"Authorization": f"Bearer {token}"}
+    urls = ["/contacts", "/contacts/birthdays/30"]
+    expected = [client.get(url, headers=headers) for url in urls]
+
+    monkeypatch.setattr(settings, "fast_list_responses", True)
+    for url, slow in zip(urls, expected):
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json() == slow.json()
+    assert response.headers["content-type"] == "application/json"
+    # validators are still sent when the route returns its own response
+    assert client.get("/contacts", headers=headers).headers["ETag"] == expected[0].headers["ETag"]
+
+
 def test_upcoming_birthdays_list_not_found(client, token, monkeypatch):
-    with patch.object(auth_service, 'r') as redis_mock:
+    monkeypatch.setattr('src.repository.contacts.date', FixedDate)
+    with patch.object(user_cache_service, 'r', new_callable=AsyncMock) as redis_mock:
         days = 1
         redis_mock.get.return_value = None
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.http_callback', AsyncMock())
         response = client.get(f"/contacts/birthdays/{int(days)}", headers={"Authorization": f"Bearer {token}"})
         assert response.status_code == 404, response.text
         data = response.json()
         assert data["detail"] == f"There are no birthdays"
 
 
+def test_upcoming_birthdays_negative_days(client, token):
+    response = client.get("/contacts/birthdays/-1", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 422, response.text
+
+
 def test_delete_contact_success(client, token, monkeypatch):
-    with patch.object(auth_service, 'r') as redis_mock:
+    with patch.object(user_cache_service, 'r', new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.http_callback', AsyncMock())
         response = client.delete(f"/contacts/{CONTACT['id']}", headers={"Authorization": f"Bearer {token}"})
         assert response.status_code == 200, response.text
 
 
 def test_delete_contact_not_found(client, token, monkeypatch):
-    with patch.object(auth_service, 'r') as redis_mock:
+    with patch.object(user_cache_service, 'r', new_callable=AsyncMock) as redis_mock:
         contact_id = 3
         redis_mock.get.return_value = None
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
-        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.http_callback', AsyncMock())
         response = client.delete(f"/contacts/{contact_id}", headers={"Authorization": f"Bearer {token}"})
         assert response.status_code == 404, response.text
         data = response.json()
-        assert data["detail"] == "Contact not found!"
\ No newline at end of file
+        assert data["detail"] == "Contact not found!"
+
+def test_import_contacts(client, token, monkeypatch):
+    with patch.object(user_cache_service, 'r', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        body = "\n".join([
+            '{"first_name": "Import1", "last_name": "Last", "email": "import1@gmail.com"}',
+            '{"first_name": "Import2", "last_name": "Last", "email": "import1@gmail.com"}',
+            '{"first_name": "Import3"}',
+            '{"first_name": "Import4", "last_name": "Last", "birthday": "2000-01-01"}',
+        ])
+        response = client.post("/contacts/import", content=body, headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["received"] == 4
+        assert data["inserted"] == 2
+        assert data["duplicates"] == 1
+        assert data["invalid"] == 1
+        assert data["batches"][0]["errors"][0]["line"] == 3
+
+        response = client.get("/contacts", headers={"Authorization": f"Bearer {token}"})
+        assert response.json()["total"] == 2
+
+
+def test_import_contacts_csv(client, token, monkeypatch):
+    with patch.object(user_cache_service, 'r', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        body = "first_name,last_name,email,phone\nCsv1,Last,csv1@gmail.com,\nCsv2,Last,,0991112233\n"
+        response = client.post("/contacts/import", params={"format": "csv"}, content=body,
+                               headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["inserted"] == 2
+        assert data["invalid"] == 0
+
+
+def test_export_contacts(client, token, monkeypatch):
+    with patch.object(user_cache_service, 'r', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        response = client.get("/contacts/export", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        rows = [js.loads(line) for line in response.text.splitlines()]
+        assert [row["first_name"] for row in rows] == ["Import1", "Import4", "Csv1", "Csv2"]
+        assert rows[1]["birthday"] == "2000-01-01"
+
+        response = client.get("/contacts/export", params={"format": "csv"},
+                              headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        lines = response.text.splitlines()
+        assert lines[0] == "id,first_name,last_name,email,phone,birthday,notes"
+        assert len(lines) == 5
+
+
+def test_search_contacts(client, token, monkeypatch):
+    with patch.object(user_cache_service, 'r', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        response = client.get("/contacts/search", params={"search": "csv"},
+                              headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert sorted(contact["first_name"] for contact in data) == ["Csv1", "Csv2"]
+
+        response = client.get("/contacts/search", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 400, response.text
+        assert response.json()["detail"] == "Search query is empty"
+
+
+def test_autocomplete_contacts(client, token, monkeypatch):
+    with patch.object(user_cache_service, 'r', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        response = client.get("/contacts/autocomplete", params={"q": "imp"},
+                              headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        assert [contact["first_name"] for contact in response.json()] == ["Import1", "Import4"]
+
+        client.post("/contacts", json=CONTACT_3, headers={"Authorization": f"Bearer {token}"})
+        response = client.get("/contacts/autocomplete", params={"q": "first"},
+                              headers={"Authorization": f"Bearer {token}"})
+        assert [contact["first_name"] for contact in response.json()] == ["FirstName"]
+
+
+def test_rate_limit(client, token, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "enabled", True)
+    rate_limiter.clear()
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get("/contacts/birthdays/7", headers=headers)
+    assert response.status_code != 429, response.text
+    response = client.get("/contacts/birthdays/7", headers=headers)
+    assert response.status_code == 429, response.text
+    assert response.json()["detail"] == "Too Many Requests"
+    assert int(response.headers["Retry-After"]) >= 1
+    # limits are per route
+    response = client.get("/contacts/search", params={"search": "a"}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert rate_limiter.stats()["rejected"] >= 1
+
+
+def test_bulk_update_contacts(client, token, monkeypatch):
+    headers = {"Authorization": f"Bearer {token}"}
+    listed = client.get("/contacts", headers=headers).json()["contacts"]
+    contacts = {contact["first_name"]: contact for contact in listed}
+    ids = [contacts["Import1"]["id"], contacts["Csv1"]["id"], 9999]
+    response = client.patch("/contacts/bulk", json={"ids": ids, "changes": {"notes": "bulk", "birthday": "1990-03-01"}},
+                            headers=headers)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["matched"] == 2
+    assert [result["status"] for result in data["results"]] == ["updated", "updated", "not_found"]
+    response = client.get(f"/contacts/{contacts['Csv1']['id']}", headers=headers)
+    assert response.json()["notes"] == "bulk"
+    assert response.json()["birthday"] == "1990-03-01"
+
+    response = client.patch("/contacts/bulk",
+                            json={"filter": {"last_name": "Last"}, "changes": {"last_name": "Renamed"}},
+                            headers=headers)
+    assert response.json()["matched"] == 4
+    response = client.get("/contacts/autocomplete", params={"q": "renamed"}, headers=headers)
+    assert len(response.json()) == 4
+
+    for body in ({"ids": ids, "filter": {"last_name": "Last"}, "changes": {"notes": "x"}},
+                 {"ids": ids, "changes": {"email": "same@gmail.com"}}, {"ids": [], "changes": {"notes": "x"}}):
+        response = client.patch("/contacts/bulk", json=body, headers=headers)
+        assert response.status_code == 422, response.text
+
+
+def test_bulk_delete_contacts(client, token, monkeypatch):
+    headers = {"Authorization": f"Bearer {token}"}
+    listed = client.get("/contacts", headers=headers).json()["contacts"]
+    contacts = {contact["first_name"]: contact for contact in listed}
+    ids = [contacts["Import1"]["id"], contacts["Import4"]["id"], contacts["Import1"]["id"]]
+    response = client.post("/contacts/bulk/delete", json={"ids": ids}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json() == {"matched": 2, "results": [{"id": ids[0], "status": "deleted"},
+                                                         {"id": ids[1], "status": "deleted"}]}
+    response = client.post("/contacts/bulk/delete", json={"ids": ids}, headers=headers)
+    assert {result["status"] for result in response.json()["results"]} == {"not_found"}
+
+    response = client.post("/contacts/bulk/delete", json={"filter": {"last_name": "Renamed"}}, headers=headers)
+    assert response.json()["matched"] == 2
+    data = client.get("/contacts", headers=headers).json()
+    assert data["total"] == len(data["contacts"]) == len(contacts) - 4
+
+
+def test_upsert_contact(client, token, session, monkeypatch):
+    headers = {"Authorization": f"Bearer {token}"}
+    total = client.get("/contacts", headers=headers).json()["total"]
+    body = {"first_name": "Up", "last_name": "Sert", "email": "upsert@gmail.com", "phone": "0991112233"}
+    response = client.put("/contacts/upsert", json=body, headers=headers)
+    assert response.status_code == 201, response.text
+    contact_id = response.json()["id"]
+
+    response = client.put("/contacts/upsert", json={**body, "phone": None, "notes": "merged"}, headers=headers)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["id"] == contact_id
+    assert data["phone"] == body["phone"]
+    assert data["notes"] == "merged"
+    assert client.get("/contacts", headers=headers).json()["total"] == total + 1
+
+    response = client.post("/contacts", json=body, headers=headers)
+    assert response.status_code == 409, response.text
+
+    # the same email may live in another user's address book
+    other = User(username="other_user", email="other@example.com", password="x")
+    session.add(other)
+    session.commit()
+    session.add(Contact(first_name="Up", last_name="Sert", email=body["email"], owner_id=other.id))
+    session.commit()
+    response = client.put("/contacts/upsert", json={**body, "notes": "still mine"}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["id"] == contact_id
+
+
+def test_get_contact_of_another_owner(client, token, session):
+    stranger = User(username="stranger", email="stranger@example.com", password="x")
+    session.add(stranger)
+    session.commit()
+    contact = Contact(first_name="Not", last_name="Yours", email="not_yours@example.com", owner_id=stranger.id)
+    session.add(contact)
+    session.commit()
+    headers = {"Authorization": f"Bearer {token}"}
+    # neither the contact nor its validators are visible, and a 304 would reveal that the id exists
+    for extra in ({}, {"If-None-Match": "*"}):
+        response = client.get(f"/contacts/{contact.id}", headers={**headers, **extra})
+        assert response.status_code == 404, response.text
+        assert "ETag" not in response.headers
+    session.delete(contact)
+    session.delete(stranger)
+    session.commit()
+
+
+def test_change_contact_of_another_owner(client, token, session):
+    stranger = User(username="stranger", email="stranger@example.com", password="x", contacts_count=1)
+    session.add(stranger)
+    session.commit()
+    contact = Contact(first_name="Not", last_name="Yours", email="not_yours@example.com", owner_id=stranger.id)
+    session.add(contact)
+    session.commit()
+    headers = {"Authorization": f"Bearer {token}"}
+    body = {"id": contact.id, "first_name": "Mine", "last_name": "Now", "notes": "mine now"}
+    response = client.put(f"/contacts/{contact.id}", json=body, headers=headers)
+    assert response.status_code == 404, response.text
+    response = client.delete(f"/contacts/{contact.id}", headers=headers)
+    assert response.status_code == 404, response.text
+    session.expire_all()
+    assert session.get(Contact, contact.id).notes is None
+    assert (stranger.contacts_count, stranger.contacts_version) == (1, 0)
+    session.delete(contact)
+    session.delete(stranger)
+    session.commit()
@@ -0,0 +1,94 @@
+import io
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+from src.database.models import User
+from src.services.avatar_cache import AvatarCache
+from src.services.upload_avatar import LocalStorage, UploadService
+
+
+@pytest.fixture()
+def token(client, user, session):
+    client.post("/auth/signup", json=user)
+    current_user: User = session.query(User).filter(User.email == user.get('email')).first()
+    current_user.confirmed = True
+    session.commit()
+    response = client.post(
+        "/auth/login",
+        data={"username": user.get('email'), "password": user.get('password')},
+    )
+    data = response.json()
+    return data["access_token"]
+
+
+@pytest.fixture()
+def local_storage(tmp_path):
+    storage = LocalStorage(str(tmp_path / "avatars"), "/media/avatars")
+    with patch.object(UploadService, "storage", storage), \
+            patch("src.routes.users.avatar_cache", AvatarCache(str(tmp_path / "cache"), 1024 * 1024)):
+        yield storage
+
+
+def test_update_avatar(client, token, local_storage):
+    image = io.BytesIO()
+    Image.new("RGB", (1600, 1200), (10, 120, 200)).save(image, "JPEG")
+    response = client.patch(
+        "/api/users/avatar",
+        files={"file": ("avatar.jpg", image.getvalue(), "image/jpeg")},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["user"]["avatar"].startswith("/media/avatars/contacts_base/")
+    stored, = local_storage.root.glob("contacts_base/*.jpg")
+    with Image.open(stored) as avatar:
+        assert avatar.size == (250, 250)
+
+
+def test_update_avatar_invalid_image(client, token):
+    response = client.patch(
+        "/api/users/avatar",
+        files={"file": ("avatar.jpg", b"not an image", "image/jpeg")},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 400, response.text
+    assert response.json()["detail"] == "Invalid image"
+
+
+def test_read_avatar(client, token, local_storage, session, user):
+    image = io.BytesIO()
+    Image.new("RGB", (800, 600), (10, 120, 200)).save(image, "JPEG")
+    client.patch(
+        "/api/users/avatar",
+        files={"file": ("avatar.jpg", image.getvalue(), "image/jpeg")},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    user_id = session.query(User).filter(User.email == user.get('email')).first().id
+
+    response = client.get(f"/api/users/{user_id}/avatar", params={"size": 64})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "image/jpeg"
+    assert response.headers["cache-control"] == "no-cache"
+    with Image.open(io.BytesIO(response.content)) as avatar:
+        assert avatar.size == (64, 64)
+    etag = response.headers["etag"]
+    versioned = response.headers["content-location"]
+
+    response = client.get(f"/api/users/{user_id}/avatar", params={"size": 64}, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    response = client.get(versioned)
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert response.headers["etag"] == etag
+
+
+def test_read_avatar_errors(client, local_storage):
+    response = client.get("/api/users/1/avatar", params={"size": 33})
+    assert response.status_code == 400, response.text
+    response = client.get("/api/users/999/avatar")
+    assert response.status_code == 404, response.text
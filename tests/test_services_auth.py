@@ -0,0 +1,116 @@
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from fastapi import HTTPException
+from jose import jwt
+
+from src.database.models import User
+from src.schemas import UserDb
+from src.services.auth import Auth
+from src.services.token_cache import TokenCache, token_digest
+
+
+class TestGetCurrentUser(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.auth = Auth()
+        self.token = await self.auth.create_access_token(data={"sub": "user@example.com"})
+        self.db_user = User(id=1, username="username", email="user@example.com", avatar="a.png", confirmed=True,
+                            password="hash")
+
+    async def test_cache_miss_loads_and_stores_user(self):
+        cache = AsyncMock()
+        cache.get.return_value = None
+        with patch("src.services.auth.user_cache_service", cache), \
+                patch("src.repository.users.get_user_by_email", AsyncMock(return_value=self.db_user)):
+            user = await self.auth.get_current_user(self.token, db=AsyncMock())
+        self.assertEqual(user, UserDb.from_orm(self.db_user))
+        cache.set.assert_awaited_once_with(user)
+
+    async def test_cache_hit_skips_database(self):
+        cached = UserDb.from_orm(self.db_user)
+        cache = AsyncMock()
+        cache.get.return_value = cached
+        db_mock = AsyncMock()
+        with patch("src.services.auth.user_cache_service", cache), \
+                patch("src.repository.users.get_user_by_email", db_mock):
+            self.assertIs(await self.auth.get_current_user(self.token, db=AsyncMock()), cached)
+        db_mock.assert_not_awaited()
+
+
+class TestDecodeAccessToken(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.auth = Auth()
+        self.cache = TokenCache()
+        self.cache.r = AsyncMock()
+        self.cache.r.exists.return_value = 0
+        patcher = patch("src.services.auth.token_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_verified_claims_are_reused(self):
+        token = await self.auth.create_access_token(data={"sub": "user@example.com"})
+        with patch("src.services.auth.jwt.decode", wraps=jwt.decode) as decode:
+            first = await self.auth.decode_access_token(token)
+            second = await self.auth.decode_access_token(token)
+        self.assertIs(first, second)
+        decode.assert_called_once()
+        self.cache.r.exists.assert_awaited_once()
+        self.assertEqual(self.cache.stats()["claims"]["hits"], 1)
+
+    async def test_refresh_token_is_rejected(self):
+        token = await self.auth.create_refresh_token(data={"sub": "user@example.com"})
+        with self.assertRaises(HTTPException):
+            await self.auth.decode_access_token(token)
+        self.assertEqual(len(self.cache.claims), 0)
+
+    async def test_denylisted_token_is_rejected(self):
+        token = await self.auth.create_access_token(data={"sub": "user@example.com"})
+        self.cache.r.exists.return_value = 1
+        with self.assertRaises(HTTPException):
+            await self.auth.decode_access_token(token)
+        self.assertEqual(len(self.cache.claims), 0)
+
+    async def test_revoke_drops_cached_claims(self):
+        token = await self.auth.create_access_token(data={"sub": "user@example.com"})
+        await self.auth.decode_access_token(token)
+        await self.auth.revoke_access_token(token)
+        digest = token_digest(token)
+        self.assertIsNone(self.cache.get(digest))
+        key, value = self.cache.r.set.await_args.args
+        self.assertEqual(key, f"revoked:{digest.hex()}")
+        self.assertLessEqual(self.cache.r.set.await_args.kwargs["ex"], 3601)
+        self.cache.r.publish.assert_awaited_once_with("token-revoke", digest.hex())
+
+    async def test_redis_down_accepts_without_caching(self):
+        token = await self.auth.create_access_token(data={"sub": "user@example.com"})
+        self.cache.r.exists.side_effect = ConnectionError("redis is down")
+        await self.auth.decode_access_token(token)
+        await self.auth.decode_access_token(token)
+        self.assertEqual(len(self.cache.claims), 0)
+        self.assertEqual(self.cache.r.exists.await_count, 2)
+
+    async def test_redis_down_refuses_locally_revoked(self):
+        token = await self.auth.create_access_token(data={"sub": "user@example.com"})
+        other = await self.auth.create_access_token(data={"sub": "other@example.com"})
+        await self.auth.decode_access_token(other)
+        await self.auth.revoke_access_token(token)
+        # revoked on another worker, announced on the revocation channel
+        self.cache._drop(token_digest(other).hex())
+        self.cache.r.exists.side_effect = ConnectionError("redis is down")
+        for revoked in (token, other):
+            with self.assertRaises(HTTPException):
+                await self.auth.decode_access_token(revoked)
+        self.assertEqual(self.cache.stats()["denied"], 2)
+
+    async def test_malformed_revocation_message_is_skipped(self):
+        token = await self.auth.create_access_token(data={"sub": "user@example.com"})
+        await self.auth.decode_access_token(token)
+        with self.assertLogs("src.services.token_cache", "WARNING"):
+            self.cache._drop("not hex")
+        self.cache._drop(token_digest(token).hex())
+        with self.assertRaises(HTTPException):
+            await self.auth.decode_access_token(token)
+
+
+if __name__ == '__main__':
+    unittest.main()
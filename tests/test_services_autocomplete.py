@@ -0,0 +1,127 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.database.models import Base, Contact, User
+from src.services.autocomplete import AutocompleteService, OwnerNameIndex, normalize
+
+
+class TestOwnerNameIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = OwnerNameIndex()
+        self.index.add(1, "Олександр", "Шевченко")
+        self.index.add(2, "Zoë", "Smith")
+        self.index.add(3, "Anna", "Smithson")
+
+    def ids(self, prefix, limit=10):
+        return [row["id"] for row in self.index.search(prefix, limit)]
+
+    def test_normalize(self):
+        self.assertEqual(normalize("  Zoë   SMITH "), "zoe smith")
+
+    def test_prefix_on_first_last_and_full_name(self):
+        self.assertEqual(self.ids("zo"), [2])
+        self.assertEqual(self.ids("SMITH"), [2, 3])
+        self.assertEqual(self.ids("anna smi"), [3])
+        self.assertEqual(self.ids("олек"), [1])
+        self.assertEqual(self.ids("x"), [])
+        self.assertEqual(self.ids("smith", limit=1), [2])
+
+    def test_update_and_remove(self):
+        self.index.add(2, "Zoe", "Brown")
+        self.assertEqual(self.ids("smith"), [3])
+        self.assertEqual(self.ids("brown"), [2])
+        self.index.remove(3)
+        self.index.remove(42)
+        self.assertEqual(self.ids("smith"), [])
+        self.assertEqual(len(self.index), 6)
+
+    def test_build_matches_incremental_adds(self):
+        rows = [(3, "Anna", "Smithson"), (1, "Олександр", "Шевченко"), (2, "Zoë", "Smith")]
+        index = OwnerNameIndex.build(rows)
+        self.assertEqual(index.keys, self.index.keys)
+        self.assertEqual(index.names, self.index.names)
+
+
+class TestAutocompleteService(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False)()
+        self.session.add_all([User(id=i, username=f"u{i}", email=f"u{i}@example.com", password="x")
+                              for i in (1, 2)])
+        self.session.add_all([
+            Contact(id=1, first_name="John", last_name="Smith", owner_id=1),
+            Contact(id=2, first_name="Joanna", last_name="Doe", owner_id=1),
+            Contact(id=3, first_name="Jack", last_name="Other", owner_id=2),
+        ])
+        await self.session.commit()
+        self.service = AutocompleteService(max_entries=100, ttl=300)
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def test_lazy_build_and_incremental_updates(self):
+        self.assertEqual(self.service.indexes, {})
+        result = await self.service.search(self.session, 1, "jo")
+        self.assertEqual([row["id"] for row in result], [2, 1])
+        self.assertEqual(self.service.entries, 6)
+
+        self.service.contact_saved(Contact(id=4, first_name="Jolene", last_name="Parton", owner_id=1))
+        self.service.contact_deleted(Contact(id=1, owner_id=1))
+        self.service.contact_saved(Contact(id=5, first_name="Jo", owner_id=3))
+        result = await self.service.search(self.session, 1, "jo")
+        self.assertEqual([row["id"] for row in result], [2, 4])
+        self.assertEqual(self.service.entries, 6)
+        self.assertNotIn(3, self.service.indexes)
+
+    async def test_lru_eviction_by_entries(self):
+        self.service.max_entries = 6
+        await self.service.search(self.session, 1, "jo")
+        await self.service.search(self.session, 2, "ja")
+        self.assertEqual(list(self.service.indexes), [2])
+        self.assertEqual(self.service.entries, 3)
+
+    async def test_invalidate_and_ttl(self):
+        await self.service.search(self.session, 1, "jo")
+        self.service.invalidate(1)
+        self.assertEqual(self.service.entries, 0)
+        self.service.ttl = 0
+        await self.service.search(self.session, 1, "jo")
+        first = self.service.indexes[1]
+        await self.service.search(self.session, 1, "jo")
+        self.assertIsNot(self.service.indexes[1], first)
+
+    async def test_large_owner_built_in_executor(self):
+        with patch("src.services.autocomplete.INLINE_BUILD_ROWS", 0), \
+                patch("src.services.autocomplete.OwnerNameIndex.build", wraps=OwnerNameIndex.build) as build:
+            result = await self.service.search(self.session, 1, "jo")
+        self.assertEqual([row["id"] for row in result], [2, 1])
+        build.assert_called_once()
+
+    async def test_concurrent_builds_keep_their_writes(self):
+        execute = self.session.execute
+        loaded = asyncio.Event()
+
+        async def slow_execute(*args, **kwargs):
+            result = await execute(*args, **kwargs)
+            await loaded.wait()
+            return result
+
+        with patch.object(self.session, "execute", slow_execute):
+            builds = [asyncio.create_task(self.service._get_index(self.session, 1)) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            self.service.contact_saved(Contact(id=4, first_name="Jolene", last_name="Parton", owner_id=1))
+            loaded.set()
+            first, second = await asyncio.gather(*builds)
+        self.assertEqual([row["id"] for row in first.search("jol", 10)], [4])
+        self.assertEqual([row["id"] for row in second.search("jol", 10)], [4])
+        self.assertEqual(self.service._building, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+import asyncio
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+from PIL import Image
+
+from src.services.avatar_cache import AvatarCache, variant_version
+from src.services.http_cache import etag_matches
+from src.services.upload_avatar import LocalStorage, UploadService
+
+
+def jpeg(size=(600, 400)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (30, 160, 90)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+class TestAvatarCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        self.requests = []
+        self.image = jpeg()
+
+        def handler(request):
+            self.requests.append(str(request.url))
+            return httpx.Response(200, content=self.image)
+
+        self.transport = httpx.MockTransport(handler)
+        patcher = patch.object(UploadService, "storage", LocalStorage(str(self.root / "avatars"), "/media/avatars"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def cache(self, max_bytes=10 * 1024 * 1024) -> AvatarCache:
+        return AvatarCache(str(self.root / "cache"), max_bytes, transport=self.transport)
+
+    async def test_remote_original_fetched_once(self):
+        cache = self.cache()
+        url = "https://res.cloudinary.com/demo/image/upload/v1/contacts_base/abc"
+        small = await cache.get(url, 32)
+        large = await cache.get(url, 250)
+        self.assertEqual(await cache.get(url, 32), small)
+        self.assertEqual(self.requests, [url])
+        with Image.open(small) as image:
+            self.assertEqual(image.size, (32, 32))
+        with Image.open(large) as image:
+            self.assertEqual(image.size, (250, 250))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 2)
+
+    async def test_sizes_requested_together_share_one_download(self):
+        cache = self.cache()
+        url = "https://res.cloudinary.com/demo/image/upload/v1/contacts_base/abc"
+        await asyncio.gather(*(cache.get(url, size) for size in (32, 64, 128, 250)))
+        self.assertEqual(self.requests, [url])
+        self.assertEqual(cache.total_bytes, sum(cache.files.values()))
+        self.assertEqual(cache._locks, {})
+
+    async def test_readded_file_counted_once(self):
+        cache = self.cache()
+        cache._add("a.src", 100)
+        cache._add("a.src", 70)
+        self.assertEqual(cache.total_bytes, 70)
+        self.assertEqual(cache.files, {"a.src": 70})
+
+    async def test_local_storage_read_directly(self):
+        original = self.root / "avatars" / "contacts_base" / "abc.jpg"
+        original.parent.mkdir(parents=True)
+        original.write_bytes(self.image)
+        cache = self.cache()
+        path = await cache.get("/media/avatars/contacts_base/abc.jpg?v=1", 64)
+        self.assertEqual(path.name, f"{variant_version('/media/avatars/contacts_base/abc.jpg?v=1', 64)}.jpg")
+        self.assertEqual(self.requests, [])
+
+    async def test_least_recently_used_evicted(self):
+        cache = self.cache()
+        first = await cache.get("https://example.com/a.jpg", 250)
+        a_files = set(cache.files)
+        await cache.get("https://example.com/b.jpg", 250)
+        b_files = set(cache.files) - a_files
+        await cache.get("https://example.com/a.jpg", 250)
+        cache.max_bytes = cache.total_bytes
+        await cache.get("https://example.com/a.jpg", 128)
+
+        # b's original and variant were used least recently, so they go first
+        evicted = {name for name in b_files if not (cache.directory / name).exists()}
+        self.assertTrue(evicted)
+        self.assertEqual(evicted, b_files - set(cache.files))
+        self.assertTrue(first.exists())
+        self.assertLessEqual(cache.total_bytes, cache.max_bytes)
+        self.assertEqual(cache.stats()["evictions"], len(evicted))
+
+    async def test_reloads_existing_files(self):
+        cache = self.cache()
+        await cache.get("https://example.com/a.jpg", 250)
+        reloaded = self.cache()
+        self.assertEqual(reloaded.files, cache.files)
+        await reloaded.get("https://example.com/a.jpg", 250)
+        self.assertEqual(reloaded.hits, 1)
+
+    async def test_pinned_variant_survives_eviction(self):
+        cache = self.cache()
+        pinned = await cache.get("https://example.com/a.jpg", 250, pin=True)
+        cache.max_bytes = cache.files[pinned.name]
+        await cache.get("https://example.com/b.jpg", 250)
+        self.assertTrue(pinned.exists())
+        cache.release(pinned)
+        self.assertFalse(pinned.exists())
+        self.assertLessEqual(cache.total_bytes, cache.max_bytes)
+        self.assertEqual(cache.pins, {})
+
+    async def test_waiters_share_one_generation_after_failure(self):
+        in_flight = []
+        peak = []
+
+        async def handler(request):
+            in_flight.append(request)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.05)
+            in_flight.remove(request)
+            # the first attempt fails; the waiters and later callers must not each retry at once
+            return httpx.Response(503 if len(peak) == 1 else 200, content=self.image)
+
+        self.transport = httpx.MockTransport(handler)
+        cache = self.cache()
+        url = "https://example.com/a.jpg"
+        first = asyncio.create_task(cache.get(url, 64))
+        waiters = [asyncio.create_task(cache.get(url, 64)) for _ in range(2)]
+        with self.assertRaises(httpx.HTTPStatusError):
+            await first
+        late = asyncio.create_task(cache.get(url, 64))
+        paths = await asyncio.gather(*waiters, late)
+        self.assertEqual(len(set(paths)), 1)
+        self.assertEqual(len(peak), 2)
+        self.assertEqual(max(peak), 1)
+        self.assertEqual(cache._locks, {})
+
+    async def test_oversized_download_is_rejected(self):
+        cache = self.cache()
+        with patch("src.services.avatar_cache.settings.avatar_max_bytes", 1500):
+            with self.assertRaises(ValueError):
+                await cache.get("https://example.com/declared.jpg", 64)
+
+            sent = []
+
+            async def body():
+                for start in range(0, len(self.image), 1000):
+                    sent.append(start)
+                    yield self.image[start:start + 1000]
+
+            def chunked(request):
+                # no Content-Length: the limit is enforced while reading
+                return httpx.Response(200, content=body())
+
+            cache.transport = httpx.MockTransport(chunked)
+            with self.assertRaises(ValueError):
+                await cache.get("https://example.com/streamed.jpg", 64)
+        self.assertEqual(cache.files, {})
+        self.assertLess(len(sent), len(range(0, len(self.image), 1000)))
+
+
+class TestEtagMatches(unittest.TestCase):
+    def test_weak_comparison(self):
+        self.assertTrue(etag_matches('"a", W/"b"', '"b"'))
+        self.assertTrue(etag_matches("*", '"b"'))
+        self.assertFalse(etag_matches('"a"', '"b"'))
+        self.assertFalse(etag_matches(None, '"b"'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+from src.services.contacts_export import export_contacts
+
+
+ROW = {"id": 1, "first_name": "A", "last_name": "B, C", "email": None, "phone": "099",
+       "birthday": date(2000, 2, 29), "notes": None}
+
+
+async def stream_contacts(db, owner_id, batch_size):
+    yield [ROW]
+    yield [dict(ROW, id=2)]
+
+
+class TestContactsExport(unittest.IsolatedAsyncioTestCase):
+    async def test_ndjson(self):
+        with patch("src.repository.contacts.stream_contacts", stream_contacts):
+            chunks = [chunk async for chunk in export_contacts("ndjson", db=None, owner_id=1)]
+        self.assertEqual(len(chunks), 2)
+        self.assertIn('"birthday": "2000-02-29"', chunks[0])
+        self.assertTrue(chunks[1].endswith("\n"))
+
+    async def test_csv(self):
+        with patch("src.repository.contacts.stream_contacts", stream_contacts):
+            text = "".join([chunk async for chunk in export_contacts("csv", db=None, owner_id=1)])
+        self.assertEqual(text.splitlines(), [
+            "id,first_name,last_name,email,phone,birthday,notes",
+            '1,A,"B, C",,099,2000-02-29,',
+            '2,A,"B, C",,099,2000-02-29,',
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from src.services.contacts_import import iter_records, import_contacts
+
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+
+class TestContactsImport(unittest.IsolatedAsyncioTestCase):
+    async def test_ndjson_split_across_chunks(self):
+        records = [r async for r in iter_records(chunks(b'{"first_name": "A"', b'}\n\n{"first_', b'name": "B"}'),
+                                                  "ndjson")]
+        self.assertEqual(records, [(1, {"first_name": "A"}, None), (3, {"first_name": "B"}, None)])
+
+    async def test_csv_header_and_column_mismatch(self):
+        body = '﻿first_name,last_name\r\nA,B\r\n"C, D",E\r\nF\r\n'.encode()
+        records = [r async for r in iter_records(chunks(body), "csv")]
+        self.assertEqual(records[0], (2, {"first_name": "A", "last_name": "B"}, None))
+        self.assertEqual(records[1], (3, {"first_name": "C, D", "last_name": "E"}, None))
+        self.assertEqual(records[2][0], 4)
+        self.assertIsNone(records[2][1])
+
+    async def test_csv_quoted_newlines(self):
+        body = b'first_name,last_name,notes\r\nA,B,"line1\r\nline2\r\n\r\n""quoted"""\r\n\r\nC,D,\r\nE,F,"open\n'
+        records = [r async for r in iter_records(chunks(*(body[i:i + 7] for i in range(0, len(body), 7))), "csv")]
+        self.assertEqual(records[0], (2, {"first_name": "A", "last_name": "B", "notes": 'line1\nline2\n\n"quoted"'},
+                                      None))
+        self.assertEqual(records[1], (7, {"first_name": "C", "last_name": "D", "notes": None}, None))
+        self.assertEqual(records[2][:2], (8, None))
+        self.assertEqual(len(records), 3)
+
+    async def test_invalid_json(self):
+        records = [r async for r in iter_records(chunks(b'not json\n[1, 2]\n'), "ndjson")]
+        self.assertEqual([r[0] for r in records], [1, 2])
+        self.assertTrue(all(r[1] is None and r[2] for r in records))
+
+    async def test_import_batches(self):
+        body = b"".join(b'{"first_name": "F%d", "last_name": "L"}\n' % i for i in range(5)) + b'{"first_name": 1}\n'
+        insert_mock = AsyncMock(side_effect=lambda rows, db, owner_id: len(rows) - 1)
+        with patch("src.repository.contacts.insert_contacts", insert_mock):
+            summary = await import_contacts(chunks(body), "ndjson", db=AsyncMock(), owner_id=1, batch_size=2)
+
+        self.assertEqual(len(summary["batches"]), 3)
+        self.assertEqual(insert_mock.await_count, 3)
+        self.assertEqual(summary["received"], 6)
+        self.assertEqual(summary["inserted"], 2)
+        self.assertEqual(summary["duplicates"], 3)
+        self.assertEqual(summary["invalid"], 1)
+        self.assertEqual(summary["batches"][2]["errors"][0]["line"], 6)
+
+    async def test_import_rejects_values_longer_than_columns(self):
+        body = ('{"first_name": "%s", "last_name": "L"}\n{"first_name": "F", "last_name": "L", "notes": "%s"}\n'
+                '{"first_name": "F", "last_name": "L"}\n' % ("x" * 51, "n" * 256)).encode()
+        insert_mock = AsyncMock(side_effect=lambda rows, db, owner_id: len(rows))
+        with patch("src.repository.contacts.insert_contacts", insert_mock):
+            summary = await import_contacts(chunks(body), "ndjson", db=AsyncMock(), owner_id=1)
+
+        self.assertEqual(len(insert_mock.await_args.args[0]), 1)
+        self.assertEqual(summary["inserted"], 1)
+        self.assertEqual(summary["invalid"], 2)
+        errors = summary["batches"][0]["errors"]
+        self.assertEqual([e["line"] for e in errors], [1, 2])
+        self.assertIn("first_name", errors[0]["error"])
+        self.assertIn("notes", errors[1]["error"])
+
+
+if __name__ == '__main__':
+    unittest.main()
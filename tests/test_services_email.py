@@ -1,28 +1,179 @@
-import asyncio
+import socket
+import unittest
+from datetime import datetime
 
-from fastapi_mail import FastMail
+import aiosmtplib
+from aiosmtpd.controller import Controller
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
-from src.services.auth import auth_service
-from src.services.email import send_email
+from src.database.models import Base, EmailOutbox
+from src.repository.emails import enqueue_email
+from src.services.email import render_email, send_email
+from src.services.email_dispatcher import EmailDispatcher, SMTPPool
 
 
-def test_send_email(monkeypatch):
-    async def mock_send_message(self, message, template_name):
-        assert message.recipients == ['test@example.com']
-        assert message.subject == 'Confirm your email!'
-        assert message.template_body == {
-            "host": "example.com",
-            "username": "testuser",
-            "token": "mocked_token"
-        }
-        assert template_name == "email_template.html"
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
 
-    monkeypatch.setattr(FastMail, "send_message", mock_send_message)
 
-    monkeypatch.setattr(
-        auth_service,
-        "create_email_token",
-        lambda payload: "mocked_token"
-    )
+class RecordingHandler:
+    def __init__(self):
+        self.connections = 0
+        self.messages = []
+        self.reject = {}
 
-    asyncio.run(send_email("test@example.com", "testuser", "example.com"))
\ No newline at end of file
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.reject:
+            return self.reject[address]
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((envelope.rcpt_tos, envelope.content.decode()))
+        return "250 Message accepted for delivery"
+
+
+class TestEmailOutbox(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session_local = async_sessionmaker(bind=self.engine, class_=AsyncSession, expire_on_commit=False)
+
+        self.handler = RecordingHandler()
+        self.port = free_port()
+        self.start_server()
+        self.pool = SMTPPool(2, lambda: aiosmtplib.SMTP(hostname="127.0.0.1", port=self.port, timeout=5))
+        self.dispatcher = EmailDispatcher(self.session_local, self.pool, batch_size=10, retry_base=30)
+
+    def start_server(self):
+        self.controller = Controller(self.handler, hostname="127.0.0.1", port=self.port)
+        self.controller.start()
+
+    async def asyncTearDown(self):
+        await self.pool.close()
+        if self.controller.loop.is_running():
+            self.controller.stop()
+        await self.engine.dispose()
+
+    async def queue(self, count: int):
+        async with self.session_local() as db:
+            for i in range(count):
+                await send_email(f"user{i}@example.com", f"user{i}", "http://example.com/", db)
+
+    async def outbox(self):
+        async with self.session_local() as db:
+            return (await db.scalars(select(EmailOutbox).order_by(EmailOutbox.id))).all()
+
+    async def test_send_email_renders_confirmation(self):
+        await self.queue(1)
+        email, = await self.outbox()
+        self.assertEqual(email.template, "email_template.html")
+        message = render_email(email)
+        self.assertEqual(message["To"], "user0@example.com")
+        self.assertEqual(message["Subject"], "Confirm your email!")
+        body = message.get_content()
+        self.assertIn("Hi user0,", body)
+        self.assertIn(f"http://example.com/api/auth/confirmed_email/{email.context['token']}", body)
+
+    async def test_batch_shares_pooled_connections(self):
+        await self.queue(5)
+        self.assertEqual(await self.dispatcher.drain_once(), 5)
+        await self.queue(3)
+        self.assertEqual(await self.dispatcher.drain_once(), 3)
+        self.assertEqual(await self.dispatcher.drain_once(), 0)
+
+        self.assertEqual(sorted(rcpt for rcpt, _ in self.handler.messages),
+                         sorted([[f"user{i}@example.com"] for i in range(5)] +
+                                [[f"user{i}@example.com"] for i in range(3)]))
+        self.assertEqual(self.handler.connections, 2)
+        for email in await self.outbox():
+            self.assertEqual(email.attempts, 1)
+            self.assertIsNotNone(email.sent_at)
+            self.assertIsNone(email.next_attempt_at)
+
+    async def test_refused_messages_are_retried_or_dropped(self):
+        self.handler.reject = {"user0@example.com": "451 Try again later",
+                               "user1@example.com": "550 No such user"}
+        await self.queue(3)
+        await self.dispatcher.drain_once()
+
+        temporary, permanent, delivered = await self.outbox()
+        self.assertEqual(temporary.attempts, 1)
+        self.assertIn("451", temporary.last_error)
+        self.assertGreater(temporary.next_attempt_at, datetime.utcnow())
+        self.assertIsNone(temporary.sent_at)
+        self.assertIn("550", permanent.last_error)
+        self.assertIsNone(permanent.next_attempt_at)
+        self.assertIsNone(permanent.sent_at)
+        self.assertIsNotNone(delivered.sent_at)
+        # nothing is due until the backoff runs out
+        self.assertEqual(await self.dispatcher.drain_once(), 0)
+
+    async def test_unrenderable_message_counts_as_attempt(self):
+        async with self.session_local() as db:
+            await enqueue_email("broken@example.com", "Broken", "missing.html", {}, db)
+        await self.queue(1)
+        await self.dispatcher.drain_once()
+
+        broken, delivered = await self.outbox()
+        self.assertEqual(broken.attempts, 1)
+        self.assertIn("KeyError", broken.last_error)
+        self.assertGreater(broken.next_attempt_at, datetime.utcnow())
+        self.assertIsNotNone(delivered.sent_at)
+        self.assertEqual(len(self.handler.messages), 1)
+
+    async def test_uncommitted_email_follows_the_transaction(self):
+        async with self.session_local() as db:
+            await send_email("user0@example.com", "user0", "http://example.com/", db, commit=False)
+            await db.rollback()
+        self.assertEqual(await self.outbox(), [])
+
+    async def test_server_down_backs_off(self):
+        self.controller.stop()
+        await self.queue(2)
+        await self.dispatcher.drain_once()
+        for email in await self.outbox():
+            self.assertEqual(email.attempts, 1)
+            self.assertIsNone(email.sent_at)
+            self.assertGreater(email.next_attempt_at, datetime.utcnow())
+
+        self.start_server()
+        async with self.session_local() as db:
+            for email in (await db.scalars(select(EmailOutbox))).all():
+                email.next_attempt_at = datetime.utcnow()
+            await db.commit()
+        self.assertEqual(await self.dispatcher.drain_once(), 2)
+        self.assertEqual(len(self.handler.messages), 2)
+
+    async def test_dropped_connection_is_reopened(self):
+        await self.queue(2)
+        await self.dispatcher.drain_once()
+        # the server goes away between batches, closing the idle pooled connections
+        self.controller.stop()
+        self.start_server()
+        await self.queue(1)
+        await self.dispatcher.drain_once()
+        self.assertEqual(len(self.handler.messages), 3)
+
+    def test_retry_backoff(self):
+        email = EmailOutbox(attempts=0)
+        error = aiosmtplib.SMTPServerDisconnected("gone")
+        first = self.dispatcher.retry_at(email, error)
+        email.attempts = 3
+        later = self.dispatcher.retry_at(email, error)
+        self.assertAlmostEqual((later - first).total_seconds(), 30 * 8 - 30, delta=5)
+        email.attempts = self.dispatcher.max_attempts - 1
+        self.assertIsNone(self.dispatcher.retry_at(email, error))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.database.redis_client import redis_call
+from src.services.metrics import Histogram, Metrics, MetricsMiddleware
+from src.services.query_log import instrument_engine
+
+
+def samples(body: str) -> dict:
+    return dict(line.rsplit(" ", 1) for line in body.splitlines() if not line.startswith("#"))
+
+
+@pytest.fixture()
+def registry():
+    return Metrics()
+
+
+@pytest.fixture()
+def client(registry):
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=NullPool)
+    instrument_engine(engine.sync_engine)
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, registry=registry)
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: int):
+        if item_id == 0:
+            raise HTTPException(status_code=404)
+        async with engine.connect() as conn:
+            for _ in range(item_id):
+                await conn.execute(text("SELECT 1"))
+        await redis_call(AsyncMock(return_value=b"1")())
+        return {"id": item_id}
+
+    return TestClient(app)
+
+
+def test_histogram_buckets():
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value)
+    # upper bounds are inclusive, as in Prometheus
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.sum == pytest.approx(3.65)
+
+
+def test_requests_are_recorded_per_route_template(client, registry):
+    client.get("/items/2")
+    client.get("/items/3")
+    client.get("/items/0")
+    client.get("/missing")
+    metrics = samples(registry.render())
+    route = 'method="GET",route="/items/{item_id}"'
+    assert metrics[f"http_responses_total{{{route},status=\"200\"}}"] == "2"
+    assert metrics[f"http_responses_total{{{route},status=\"404\"}}"] == "1"
+    assert metrics['http_responses_total{method="GET",route="unmatched",status="404"}'] == "1"
+    assert metrics[f'http_request_duration_seconds_count{{{route}}}'] == "3"
+    assert metrics[f'http_request_duration_seconds_bucket{{{route},le="+Inf"}}'] == "3"
+    assert metrics["http_requests_in_flight"] == "0"
+
+
+def test_db_and_redis_time_is_attributed(client, registry):
+    client.get("/items/2")
+    client.get("/items/3")
+    metrics = samples(registry.render())
+    route = 'method="GET",route="/items/{item_id}"'
+    assert metrics[f"http_request_db_queries_sum{{{route}}}"] == "5.0"
+    assert metrics[f'http_request_db_queries_bucket{{{route},le="2"}}'] == "1"
+    assert float(metrics[f"http_request_db_seconds_sum{{{route}}}"]) > 0
+    assert metrics[f"http_request_redis_calls_total{{{route}}}"] == "2"
+
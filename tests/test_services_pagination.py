@@ -0,0 +1,15 @@
+from unittest import TestCase
+
+from src.services.pagination import encode_cursor, decode_cursor
+
+
+class TestPagination(TestCase):
+    def test_cursor_round_trip(self):
+        cursor = encode_cursor(7, 12345)
+        self.assertNotIn("12345", cursor)
+        self.assertEqual(decode_cursor(cursor), (7, 12345))
+
+    def test_invalid_cursor(self):
+        for cursor in ("not-a-cursor", "", "%%%", encode_cursor(1, 2)[:-2]):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
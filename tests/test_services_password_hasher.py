@@ -0,0 +1,47 @@
+import asyncio
+import threading
+import unittest
+
+from fastapi import HTTPException
+
+from src.services.password_hasher import PasswordHasher
+
+
+class TestPasswordHasher(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.hasher = PasswordHasher(rounds=4, workers=1, queue_size=1)
+        self.addCleanup(self.hasher.shutdown)
+
+    async def test_hash_and_verify(self):
+        hashed = await self.hasher.hash("secret")
+        self.assertTrue(hashed.startswith("$2b$04$"))
+        self.assertEqual(await self.hasher.verify_and_update("secret", hashed), (True, None))
+        self.assertEqual(await self.hasher.verify_and_update("wrong", hashed), (False, None))
+
+    async def test_rehash_when_rounds_change(self):
+        hashed = await self.hasher.hash("secret")
+        stronger = PasswordHasher(rounds=5, workers=1, queue_size=1)
+        self.addCleanup(stronger.shutdown)
+        valid, new_hash = await stronger.verify_and_update("secret", hashed)
+        self.assertTrue(valid)
+        self.assertTrue(new_hash.startswith("$2b$05$"))
+        self.assertEqual(await stronger.verify_and_update("secret", new_hash), (True, None))
+
+    async def test_rejects_when_saturated(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        blocked = [asyncio.create_task(self.hasher._run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        with self.assertRaises(HTTPException) as ctx:
+            await self.hasher.hash("secret")
+        self.assertEqual(ctx.exception.status_code, 503)
+        self.assertEqual(self.hasher.stats(), {"capacity": 2, "pending": 2, "rejected": 1})
+
+        release.set()
+        await asyncio.gather(*blocked)
+        self.assertEqual(self.hasher.stats()["pending"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import logging
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, text
+
+from src.conf.config import settings
+from src.services.metrics import RequestMetrics, current_request
+from src.services.query_log import assert_max_queries, instrument_engine, normalize_sql
+
+
+class Route:
+    path = "/contacts/{contact_id}"
+
+
+@pytest.fixture()
+def engine():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture()
+def request_metrics():
+    request = RequestMetrics({"route": Route})
+    token = current_request.set(request)
+    yield request
+    current_request.reset(token)
+
+
+def test_normalize_sql():
+    assert normalize_sql("SELECT *\n  FROM contacts WHERE id = $1::INTEGER AND name = 'O''Neil' LIMIT 10") == \
+        "SELECT * FROM contacts WHERE id = ? AND name = ? LIMIT ?"
+    assert normalize_sql("SELECT * FROM contacts WHERE id IN (?, ?, ?)") == \
+        normalize_sql("SELECT * FROM contacts WHERE id IN (:id_1, :id_2)")
+    assert normalize_sql("INSERT INTO contacts (a, b) VALUES (?, ?), (?, ?)") == \
+        "INSERT INTO contacts (a, b) VALUES (?...)"
+    assert normalize_sql("SELECT CAST(x AS INTEGER), y::TEXT FROM t") == "SELECT CAST(x AS INTEGER), y::TEXT FROM t"
+
+
+def test_slow_queries_are_logged(engine, request_metrics, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "db_slow_query_ms", 0)
+    with caplog.at_level(logging.WARNING, logger="src.services.query_log"), engine.connect() as conn:
+        conn.execute(text("SELECT 1 WHERE 2 > :n"), {"n": 1})
+    record, = caplog.records
+    assert record.sql == "SELECT ? WHERE ? > ?"
+    assert record.route == "/contacts/{contact_id}"
+    assert record.duration_ms >= 0
+    assert "slow query" in record.getMessage()
+    assert not hasattr(record, "rows")
+    assert request_metrics.db_queries == 1
+
+
+def test_slow_writes_log_affected_rows(engine, request_metrics, monkeypatch, caplog):
+    items = Table("items", MetaData(), Column("id", Integer, primary_key=True))
+    with engine.begin() as conn:
+        items.create(conn)
+        conn.execute(items.insert(), [{"id": n} for n in range(3)])
+    monkeypatch.setattr(settings, "db_slow_query_ms", 0)
+    with caplog.at_level(logging.WARNING, logger="src.services.query_log"), engine.begin() as conn:
+        conn.execute(items.delete().where(items.c.id < 2))
+    record, = caplog.records
+    assert record.rows == 2
+    assert "rows=2" in record.getMessage()
+
+
+def test_fast_queries_are_not_logged(engine, request_metrics, caplog):
+    with caplog.at_level(logging.WARNING, logger="src.services.query_log"), engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert caplog.records == []
+
+
+def test_repeated_queries_are_flagged_once(engine, request_metrics, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "db_repeated_query_threshold", 3)
+    with caplog.at_level(logging.WARNING, logger="src.services.query_log"), engine.connect() as conn:
+        for n in range(6):
+            conn.execute(text("SELECT :n"), {"n": n})
+        conn.execute(text("SELECT 1, 2"))
+    record, = caplog.records
+    assert record.count == 3
+    assert record.sql == "SELECT ?"
+    assert request_metrics.shapes == {"SELECT ?": 6, "SELECT ?, ?": 1}
+
+
+def test_repeated_queries_outside_requests_are_ignored(engine, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "db_repeated_query_threshold", 2)
+    with caplog.at_level(logging.WARNING, logger="src.services.query_log"), engine.connect() as conn:
+        for n in range(3):
+            conn.execute(text("SELECT :n"), {"n": n})
+    assert caplog.records == []
+
+
+def test_assert_max_queries(engine):
+    with engine.connect() as conn:
+        with assert_max_queries(engine, 2) as statements:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+        assert statements == ["SELECT ?", "SELECT ?"]
+        with pytest.raises(AssertionError, match="3 queries executed, at most 2 expected"):
+            with assert_max_queries(engine, 2):
+                for _ in range(3):
+                    conn.execute(text("SELECT 1"))
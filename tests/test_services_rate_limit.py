@@ -0,0 +1,128 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from redis.exceptions import ConnectionError
+
+from src.services.rate_limit import Algorithm, RateLimiter, SlidingWindow
+
+
+def limiter(algorithm: str, limit: str = "2/10") -> RateLimiter:
+    return RateLimiter(algorithm, {"route": limit})
+
+
+def redis_pipeline(totals):
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[value for total in totals for value in (total, True)])
+    return pipe
+
+
+class TestSlidingWindow(unittest.TestCase):
+    def test_limit_and_slide(self):
+        rate_limiter = limiter("sliding_window")
+        self.assertEqual(rate_limiter.check("route", "a", now=100), 0)
+        self.assertEqual(rate_limiter.check("route", "a", now=101), 0)
+        self.assertEqual(rate_limiter.check("route", "a", now=102), 8)
+        # other identities have their own counters
+        self.assertEqual(rate_limiter.check("route", "b", now=102), 0)
+        # at 115 half of the previous window still counts: 2 * 0.5 + 0 < 2
+        self.assertEqual(rate_limiter.check("route", "a", now=115), 0)
+        self.assertGreater(rate_limiter.check("route", "a", now=115), 0)
+        self.assertEqual(rate_limiter.stats(), {"keys": 2, "allowed": 4, "rejected": 2})
+
+
+class TestAlgorithm(unittest.TestCase):
+    def test_incomplete_algorithm_fails_on_creation(self):
+        class AdmitOnly(Algorithm):
+            admit = SlidingWindow.admit
+
+        with self.assertRaises(TypeError):
+            AdmitOnly(2, 10)
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst_and_refill(self):
+        rate_limiter = limiter("token_bucket")
+        self.assertEqual(rate_limiter.check("route", "a", now=100), 0)
+        self.assertEqual(rate_limiter.check("route", "a", now=100), 0)
+        self.assertAlmostEqual(rate_limiter.check("route", "a", now=100), 5)
+        self.assertEqual(rate_limiter.check("route", "a", now=105), 0)
+        self.assertGreater(rate_limiter.check("route", "a", now=105), 0)
+
+    def test_admission_is_cheap(self):
+        rate_limiter = limiter("token_bucket", "1000000/1")
+        start = time.perf_counter()
+        for i in range(10000):
+            rate_limiter.check("route", f"user{i % 100}")
+        self.assertLess((time.perf_counter() - start) / 10000, 0.0001)
+
+
+class TestSync(unittest.IsolatedAsyncioTestCase):
+    async def test_remote_admissions_are_counted(self):
+        rate_limiter = limiter("sliding_window", "3/10")
+        rate_limiter.check("route", "a", now=100)
+        rate_limiter.r = MagicMock()
+        # another worker admitted two requests in the same window
+        rate_limiter.r.pipeline.return_value = pipe = redis_pipeline([3])
+        await rate_limiter.sync(now=101)
+
+        pipe.incrby.assert_called_once_with("rl:route:a:10", 1)
+        pipe.expire.assert_called_once_with("rl:route:a:10", 20)
+        self.assertGreater(rate_limiter.check("route", "a", now=102), 0)
+
+        # nothing new anywhere: the next sync pushes nothing and learns nothing
+        rate_limiter.r.pipeline.return_value = pipe = redis_pipeline([3])
+        await rate_limiter.sync(now=103)
+        pipe.incrby.assert_called_once_with("rl:route:a:10", 0)
+        state = rate_limiter.states.get(("route", "a"))
+        self.assertEqual((state.current, state.pending, state.known), (3, 0, 3))
+
+    async def test_fails_open_without_redis(self):
+        rate_limiter = limiter("sliding_window", "3/10")
+        rate_limiter.check("route", "a", now=100)
+        rate_limiter.r = MagicMock()
+        rate_limiter.r.pipeline.return_value.execute = AsyncMock(side_effect=ConnectionError("down"))
+        await rate_limiter.sync(now=101)
+        self.assertEqual(rate_limiter.check("route", "a", now=102), 0)
+        self.assertEqual(rate_limiter.check("route", "a", now=103), 0)
+        self.assertGreater(rate_limiter.check("route", "a", now=104), 0)
+
+    async def test_timed_out_push_is_not_resent(self):
+        rate_limiter = limiter("sliding_window", "3/10")
+        rate_limiter.check("route", "a", now=100)
+        rate_limiter.r = MagicMock()
+        # Redis applied the INCRBY, but the reply came too late
+        rate_limiter.r.pipeline.return_value.execute = AsyncMock(side_effect=asyncio.TimeoutError)
+        await rate_limiter.sync(now=101)
+
+        rate_limiter.r.pipeline.return_value = pipe = redis_pipeline([1])
+        await rate_limiter.sync(now=102)
+        pipe.incrby.assert_called_once_with("rl:route:a:10", 0)
+        state = rate_limiter.states.get(("route", "a"))
+        self.assertEqual((state.current, state.pending, state.known, state.unconfirmed), (1, 0, 1, 0))
+
+    async def test_rollover_flushes_previous_window(self):
+        rate_limiter = limiter("sliding_window", "3/10")
+        rate_limiter.check("route", "a", now=109)
+        rate_limiter.check("route", "a", now=110)
+        rate_limiter.r = MagicMock()
+        rate_limiter.r.pipeline.return_value = pipe = redis_pipeline([1, 1])
+        await rate_limiter.sync(now=111)
+        self.assertEqual(pipe.incrby.call_args_list, [(("rl:route:a:10", 1),), (("rl:route:a:11", 1),)])
+        state = rate_limiter.states.get(("route", "a"))
+        self.assertEqual((state.current, state.known, state.unsent), (1, 1, None))
+
+    async def test_pipelines_are_batched(self):
+        rate_limiter = limiter("sliding_window", "3/10")
+        for identity in "abc":
+            rate_limiter.check("route", identity, now=100)
+        rate_limiter.r = MagicMock()
+        rate_limiter.r.pipeline.side_effect = lambda transaction: redis_pipeline([1, 1])
+        with patch("src.services.rate_limit.settings.rate_limit_sync_batch", 2):
+            await rate_limiter.sync(now=101)
+        self.assertEqual(rate_limiter.r.pipeline.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,16 @@
+import io
+import tempfile
+from pathlib import Path
+
 import cloudinary.uploader
 
-from unittest import TestCase
-from unittest.mock import patch
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import MagicMock, patch
+
+from fastapi import HTTPException
+from PIL import Image
 
-from src.services.upload_avatar import UploadService
+from src.services.upload_avatar import AvatarStorage, CloudinaryStorage, LocalStorage, UploadService, process_avatar
 
 
 class MockedUploader:
@@ -41,4 +48,64 @@ class TestUploadService(TestCase):
         expected_url = "https://example.com/abc123?w=250&h=250&crop=fill&v=mocked_version"
 
         url = UploadService.get_url_avatar(public_id, version)
-        self.assertEqual(url, expected_url)
\ No newline at end of file
+        self.assertEqual(url, expected_url)
+
+    def test_storage_without_save_fails_on_creation(self):
+        class ReadOnlyStorage(AvatarStorage):
+            pass
+
+        with self.assertRaises(TypeError):
+            ReadOnlyStorage()
+
+def make_image(size=(1200, 800), fmt="JPEG") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+class TestProcessAvatar(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.workdir = Path(tmp.name)
+
+    def test_resizes_to_square_jpeg(self):
+        original = make_image(fmt="PNG")
+        processed = process_avatar(io.BytesIO(original), self.workdir, 250, 10 * 1024 * 1024)
+        with Image.open(processed) as image:
+            self.assertEqual(image.format, "JPEG")
+            self.assertEqual(image.size, (250, 250))
+        self.assertLess(processed.stat().st_size, len(original))
+
+    def test_rejects_oversized_upload(self):
+        with self.assertRaisesRegex(ValueError, "too large"):
+            process_avatar(io.BytesIO(make_image()), self.workdir, 250, 1024)
+
+    def test_rejects_non_image(self):
+        with self.assertRaisesRegex(ValueError, "Invalid image"):
+            process_avatar(io.BytesIO(b"not an image"), self.workdir, 250, 1024)
+
+
+class TestUploadAvatar(IsolatedAsyncioTestCase):
+    async def test_local_storage(self):
+        with tempfile.TemporaryDirectory() as root:
+            storage = LocalStorage(root, "/media/avatars/")
+            upload = MagicMock(file=io.BytesIO(make_image()))
+            with patch.object(UploadService, "storage", storage):
+                url = await UploadService.upload_avatar(upload, "test@example.com")
+
+            self.assertRegex(url, r"^/media/avatars/contacts_base/973dfe463ec8\.jpg\?v=\d+$")
+            with Image.open(storage.path("contacts_base/973dfe463ec8")) as image:
+                self.assertEqual(image.size, (250, 250))
+
+    async def test_invalid_image_is_bad_request(self):
+        upload = MagicMock(file=io.BytesIO(b"not an image"))
+        with self.assertRaises(HTTPException) as ctx:
+            await UploadService.upload_avatar(upload, "test@example.com")
+        self.assertEqual(ctx.exception.status_code, 400)
+
+    @patch.object(cloudinary.uploader, "upload", MockedUploader.upload)
+    @patch.object(cloudinary.CloudinaryImage, "build_url", MockedUploader.build_url)
+    def test_cloudinary_storage_uploads_processed_file(self):
+        url = CloudinaryStorage().save(Path("avatar.jpg"), "abc123")
+        self.assertEqual(url, "https://example.com/abc123?w=250&h=250&crop=fill&v=mocked_version")
@@ -0,0 +1,120 @@
+import asyncio
+import pickle
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from src.schemas import UserDb
+from src.services.cache import TTLCache
+from src.services.user_cache import (
+    INVALIDATION_CHANNEL,
+    UserCacheService,
+    serialize_user,
+    deserialize_user,
+)
+
+
+class TestUserSerialization(unittest.TestCase):
+    def test_round_trip(self):
+        user = UserDb(id=1, username="username", email="user@example.com", avatar=None, confirmed=True)
+        data = serialize_user(user)
+        self.assertTrue(data.startswith(b"u1:"))
+        self.assertLess(len(data), 64)
+        self.assertEqual(deserialize_user(data), user)
+
+    def test_foreign_payload_is_a_miss(self):
+        self.assertIsNone(deserialize_user(pickle.dumps({"id": 1})))
+        self.assertIsNone(deserialize_user(b'u0:[1,"a","b",null,true]'))
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_lru_and_ttl(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        cache.set("d", 4, ttl=-1)
+        self.assertIsNone(cache.get("d"))
+        self.assertEqual(cache.stats(), {"size": 1, "maxsize": 2, "hits": 1, "misses": 2})
+
+
+class TestUserCacheService(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.service = UserCacheService()
+        self.service.r = AsyncMock()
+        self.user = UserDb(id=1, username="username", email="user@example.com", avatar="a.png", confirmed=True)
+
+    async def test_tiers(self):
+        self.service.r.get.return_value = None
+        self.assertIsNone(await self.service.get(self.user.email))
+
+        await self.service.set(self.user)
+        self.service.r.set.assert_awaited_once_with("user:user@example.com", serialize_user(self.user), ex=3600)
+        self.assertIs(await self.service.get(self.user.email), self.user)
+
+        self.service.local.clear()
+        self.service.r.get.return_value = serialize_user(self.user)
+        self.assertEqual(await self.service.get(self.user.email), self.user)
+        self.assertEqual(self.service.stats()["redis"], {"hits": 1, "misses": 1})
+        self.assertEqual(self.service.stats()["local"]["hits"], 1)
+
+    async def test_invalidate(self):
+        await self.service.set(self.user)
+        await self.service.invalidate(self.user.email)
+        self.assertIsNone(self.service.local.get(self.user.email))
+        self.service.r.delete.assert_awaited_once_with("user:user@example.com")
+        self.service.r.publish.assert_awaited_once_with(INVALIDATION_CHANNEL, "user@example.com")
+
+    async def test_invalidate_again_after_delay(self):
+        with patch("src.services.user_cache.settings.user_cache_invalidate_delay", 0.01):
+            await self.service.invalidate(self.user.email)
+            # a request that loaded the user before the change writes it back
+            await self.service.set(self.user)
+            await asyncio.gather(*self.service._delayed)
+        self.assertIsNone(self.service.local.get(self.user.email))
+        self.assertEqual(self.service.r.delete.await_count, 2)
+        self.assertEqual(self.service.r.publish.await_count, 2)
+        self.assertEqual(self.service._delayed, set())
+
+    async def test_redis_failures_degrade_to_miss(self):
+        async def slow_get(key):
+            await asyncio.sleep(1)
+
+        self.service.r.get.side_effect = slow_get
+        self.service.r.set.side_effect = ConnectionError("redis is down")
+        with patch("src.database.redis_client.settings.redis_timeout", 0.01):
+            self.assertIsNone(await self.service.get(self.user.email))
+            await self.service.set(self.user)
+        self.assertIs(self.service.local.get(self.user.email), self.user)
+
+    async def test_listener_drops_local_entries(self):
+        await self.service.set(self.user)
+        other = UserDb(id=2, username="other", email="other@example.com")
+        await self.service.set(other)
+
+        async def listen():
+            yield {"type": "subscribe", "data": 1}
+            yield {"type": "message", "data": b"user@example.com"}
+            raise ConnectionError("connection lost")
+
+        pubsub = MagicMock()
+        pubsub.__aenter__ = AsyncMock(return_value=pubsub)
+        pubsub.__aexit__ = AsyncMock(return_value=False)
+        pubsub.subscribe = AsyncMock()
+        pubsub.listen = listen
+        client = MagicMock(pubsub=MagicMock(return_value=pubsub), close=AsyncMock())
+        sleep = AsyncMock(side_effect=asyncio.CancelledError)
+
+        with patch("src.database.redis_client.pubsub_client", return_value=client), \
+                patch("src.database.redis_client.asyncio.sleep", sleep):
+            with self.assertRaises(asyncio.CancelledError):
+                await self.service.listen()
+
+        pubsub.subscribe.assert_awaited_once_with(INVALIDATION_CHANNEL)
+        self.assertEqual(len(self.service.local), 0)
+        client.close.assert_awaited_once()
+
+
+if __name__ == '__main__':
+    unittest.main()